@@ -0,0 +1,41 @@
+import sys
+import tracemalloc
+
+from synthetic_library import synthetic_tracks
+from track_columns import ColumnarLibrary
+
+
+# The original LibraryItem layout, with a __dict__ per instance
+class DictLibraryItem:
+    def __init__(self, name, artist, rating=0):
+        self.name = name
+        self.artist = artist
+        self.rating = rating
+        self.play_count = 0
+
+
+# Measure the memory held by whatever build() returns
+def measure(build):
+    tracemalloc.start()
+    store = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return store, current, peak
+
+
+def main(count):
+    layouts = [
+        ("dict of objects", lambda: dict(synthetic_tracks(count, item_class=DictLibraryItem))),
+        ("dict of slotted items", lambda: dict(synthetic_tracks(count))),
+        ("ColumnarLibrary", lambda: ColumnarLibrary(synthetic_tracks(count))),
+    ]
+    print(f"{count} tracks")
+    for label, build in layouts:
+        store, current, peak = measure(build)
+        print(f"{label:<22} {current / count:8.1f} bytes/track  "
+              f"{current / 2**20:8.1f} MiB held  {peak / 2**20:8.1f} MiB peak")
+        del store
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
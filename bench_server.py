@@ -0,0 +1,139 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+
+import synthetic_library
+import track_library as lib
+import track_server
+from bench_suite import percentile
+
+
+# One simulated screen or tablet: keeps `depth` requests in flight on its own
+# connection until `deadline`, recording the latency of every answer
+async def run_client(host, port, keys, depth, deadline, bulk, seed, latencies, errors):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port, limit=track_server.MAX_LINE)
+    sent_at = {}
+    next_id = 0
+
+    def request():
+        nonlocal next_id
+        next_id += 1
+        roll = rng.random()
+        if roll < 0.6:
+            message = {"op": "get", "keys": rng.sample(keys, bulk)}
+        elif roll < 0.9:
+            message = {"op": "increment", "keys": [rng.choice(keys)], "source": "loadgen"}
+        elif roll < 0.97:
+            message = {"op": "top", "limit": 20}
+        else:
+            message = {"op": "search", "query": rng.choice(synthetic_library.WORDS)}
+        message["id"] = next_id
+        sent_at[next_id] = time.perf_counter()
+        writer.write(json.dumps(message).encode("utf-8") + b"\n")
+
+    for _ in range(depth):
+        request()
+    await writer.drain()
+    while sent_at:
+        line = await reader.readline()
+        if not line:
+            break
+        response = json.loads(line)
+        latencies.append(time.perf_counter() - sent_at.pop(response["id"]))
+        if "error" in response:
+            errors.append(response["error"])
+        if time.perf_counter() < deadline:
+            request()
+            await writer.drain()  # Returns at once unless the server has stopped reading
+    writer.close()
+    await writer.wait_closed()
+
+
+async def load(host, port, keys, clients, depth, duration, bulk):
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(run_client(host, port, keys, depth, deadline, bulk, seed, latencies, errors)
+                           for seed in range(clients)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "clients": clients,
+        "pipeline_depth": depth,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "requests_per_sec": len(latencies) / elapsed,
+        "p50_us": percentile(latencies, 0.50) * 1e6,
+        "p99_us": percentile(latencies, 0.99) * 1e6,
+        "p999_us": percentile(latencies, 0.999) * 1e6,
+        "max_us": latencies[-1] * 1e6,
+    }
+
+
+# Run a server on a background thread with its own event loop, so the load
+# generator's work does not share a loop with the server it is measuring
+def start_local_server(size):
+    lib.library = synthetic_library.build_library(size)
+    lib.library_changed()
+    ready = threading.Event()
+    server = track_server.TrackServer(port=0)
+
+    def serve():
+        async def main():
+            await server.start()
+            ready.set()
+            await server.serve_forever()
+        asyncio.run(main())
+
+    threading.Thread(target=serve, daemon=True).start()
+    ready.wait()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure requests per second and tail latency of track_server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="server to load; by default one is started on localhost")
+    parser.add_argument("--size", type=int, default=10000, help="tracks in the local server's library")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 16, 64], help="connections to open")
+    parser.add_argument("--depth", type=int, default=8, help="requests each client keeps in flight")
+    parser.add_argument("--bulk", type=int, default=10, help="keys per bulk get")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per run")
+    parser.add_argument("--output", help="also save the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.port is None:
+        server = start_local_server(args.size)
+        host, port = server.host, server.port
+    else:
+        host, port = args.host, args.port
+
+    async def fetch_keys():
+        reader, writer = await asyncio.open_connection(host, port, limit=track_server.MAX_LINE)
+        writer.write(json.dumps({"op": "list", "limit": track_server.MAX_BULK_KEYS}).encode("utf-8") + b"\n")
+        keys = json.loads(await reader.readline())["result"]
+        writer.close()
+        return keys
+
+    keys = asyncio.run(fetch_keys())
+    results = []
+    for clients in args.clients:
+        stats = asyncio.run(load(host, port, keys, clients, args.depth, args.duration, min(args.bulk, len(keys))))
+        results.append(stats)
+        print(f"{clients:>4} clients x {args.depth} deep  {stats['requests_per_sec']:>9.0f} req/s  "
+              f"p50 {stats['p50_us']:>8.0f} us  p99 {stats['p99_us']:>8.0f} us  "
+              f"p99.9 {stats['p999_us']:>8.0f} us  errors {stats['errors']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as results_file:
+            json.dump(results, results_file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# What track_player.py imported before the main window could appear, before and after lazy loading
+EAGER_IMPORTS = ["tkinter", "font_manager", "track_library", "view_tracks", "create_track_list",
+                 "update_track", "PIL.ImageTk"]
+LAZY_IMPORTS = ["tkinter", "font_manager", "track_library"]
+
+
+# Seconds a fresh interpreter spends importing `modules`
+def import_time(modules):
+    code = ("import importlib, time\n"
+            "started = time.perf_counter()\n"
+            f"for name in {modules!r}:\n"
+            "    importlib.import_module(name)\n"
+            "print(time.perf_counter() - started)\n")
+    output = subprocess.run([sys.executable, "-c", code], cwd=HERE, capture_output=True, text=True, check=True)
+    return float(output.stdout)
+
+
+# Seconds from launching track_player.py until its main window has been drawn
+def first_frame_time(timeout=30):
+    env = dict(os.environ, JUKEBOX_REPORT_FIRST_FRAME="1")
+    started = time.time()
+    player = subprocess.Popen([sys.executable, "track_player.py"], cwd=HERE, env=env,
+                              stdout=subprocess.PIPE, text=True)
+    try:
+        deadline = started + timeout
+        for line in player.stdout:
+            if line.startswith("first-frame "):
+                return float(line.split()[1]) - started
+            if time.time() > deadline:
+                break
+        raise RuntimeError("track_player.py exited without drawing a window")
+    finally:
+        player.kill()
+        player.wait()
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {"runs": len(samples), "median_ms": statistics.median(samples) * 1e3,
+            "min_ms": samples[0] * 1e3, "max_ms": samples[-1] * 1e3}
+
+
+def has_display():
+    return sys.platform in ("win32", "darwin") or bool(os.environ.get("DISPLAY"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure jukebox start-up time.")
+    parser.add_argument("--runs", type=int, default=10, help="launches per measurement")
+    parser.add_argument("--output", help="also save the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for label, modules in (("imports before lazy loading", EAGER_IMPORTS),
+                           ("imports with lazy loading", LAZY_IMPORTS)):
+        try:
+            results[label] = summarize([import_time(modules) for _ in range(args.runs)])
+        except subprocess.CalledProcessError as e:
+            print(f"{label}: could not import ({e.stderr.strip().splitlines()[-1]})")
+    if has_display():
+        results["time to first frame"] = summarize([first_frame_time() for _ in range(args.runs)])
+    else:
+        print("No display available; skipping time-to-first-frame")
+
+    for label, stats in results.items():
+        print(f"{label:<30} median {stats['median_ms']:7.1f} ms  "
+              f"(min {stats['min_ms']:.1f}, max {stats['max_ms']:.1f}, {stats['runs']} runs)")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as results_file:
+            json.dump(results, results_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import track_library as lib
+import track_importer
+import synthetic_library
+
+DEFAULT_SIZES = [10, 1000, 100000]
+REGRESSION_THRESHOLD = 1.2  # Flag benchmarks whose median got 20% slower
+
+
+# One benchmark: `setup(size)` returns the callable to time, called `repeats`
+# times. `max_size` skips it for libraries where a single call would take too long.
+# With `scratch`, setup is called as `setup(size, folder)` with a temporary
+# folder for its files, removed once the benchmark has run.
+class Benchmark():
+    def __init__(self, name, setup, repeats=1000, max_size=None, scratch=False):
+        self.name = name
+        self.setup = setup
+        self.repeats = repeats
+        self.max_size = max_size
+        self.scratch = scratch
+
+
+def random_keys(rng):
+    keys = lib.track_keys()
+    return lambda: rng.choice(keys)
+
+
+def bench_get(size):
+    pick = random_keys(random.Random(1))
+    return lambda: (lib.get_name(pick()), lib.get_artist(pick()), lib.get_rating(pick()))
+
+
+def bench_set_rating(size):
+    rng = random.Random(2)
+    pick = random_keys(rng)
+    return lambda: lib.set_rating(pick(), rng.randint(1, 5))
+
+
+def bench_increment(size):
+    pick = random_keys(random.Random(3))
+    return lambda: lib.increment_play_count(pick())
+
+
+def bench_add_tracks(size):
+    batches = iter(range(10**9))
+
+    def add_batch():
+        start = size + 1 + next(batches) * 100
+        lib.add_tracks(synthetic_library.synthetic_tracks(100, seed=start, start=start))
+    return add_batch
+
+
+def bench_list_all(size):
+    return lib.list_all
+
+
+def bench_list_page(size):
+    rng = random.Random(4)
+    return lambda: lib.list_page(rng.randrange(max(1, size - 50)), 50)
+
+
+def bench_sorted_keys(size):
+    return lambda: lib.track_keys("rating", reverse=True)
+
+
+def bench_search(size):
+    rng = random.Random(5)
+    queries = ["love", "midnight dance", "thunde", "golden rivr", "ada band"]
+    lib.search("warm up")  # Build the index outside the timed calls
+    return lambda: lib.search(rng.choice(queries))
+
+
+def bench_index_queries(size):
+    rng = random.Random(9)
+    artists = [lib.get_artist(key) for key in lib.track_keys()[:100]]
+    lib.most_played(1)  # Build the indexes outside the timed calls
+    return lambda: (lib.keys_by_artist(rng.choice(artists)), lib.most_played(50))
+
+
+def bench_smart_playlist(size):
+    import smart_playlist
+    smart_playlist.smart_playlist(1)  # Build the arrays outside the timed calls
+    return lambda: smart_playlist.smart_playlist(50)
+
+
+def bench_import_csv(size, folder):
+    path = os.path.join(folder, "tracks.csv")
+    synthetic_library.write_csv(path, size, seed=6, start=size + 10**7, bad_every=100)
+    return lambda: track_importer.import_csv(path)
+
+
+def bench_open_snapshot(size, folder):
+    import track_snapshot
+    path = os.path.join(folder, "library.snap")
+    track_snapshot.write_snapshot(path, lib.library.items())
+    key = lib.track_keys()[-1]
+
+    def open_and_read():
+        store = track_snapshot.SnapshotLibrary(path)
+        store[key].info()
+        store.close()
+    return open_and_read
+
+
+def bench_export(size, folder, suffix):
+    import track_export
+    path = os.path.join(folder, f"library{suffix}")
+    return lambda: track_export.export_tracks(path)
+
+
+def bench_cover(size, folder, cached):
+    import cover_cache
+    paths = synthetic_library.write_covers(folder, min(size, 20), seed=7)
+    covers = cover_cache.CoverCache(max_items=len(paths))
+    rng = random.Random(8)
+    if cached:
+        return lambda: covers.get(rng.choice(paths))
+    return lambda: covers.decode(rng.choice(paths))
+
+
+def bench_cover_atlas(size, folder):
+    import cover_atlas
+    paths = synthetic_library.write_covers(folder, min(size, 20), seed=7)
+    cover_atlas.build_atlas(folder, workers=0)
+    atlas = cover_atlas.CoverAtlas(folder)
+    names = [os.path.basename(path) for path in paths]
+    rng = random.Random(8)
+    return lambda: atlas.ppm(rng.choice(names))
+
+
+BENCHMARKS = [
+    Benchmark("get_name/artist/rating", bench_get, repeats=10000),
+    Benchmark("set_rating", bench_set_rating, repeats=10000),
+    Benchmark("increment_play_count", bench_increment, repeats=10000),
+    Benchmark("add_tracks x100", bench_add_tracks, repeats=100),
+    Benchmark("list_page x50", bench_list_page, repeats=200),
+    Benchmark("track_keys by rating", bench_sorted_keys, repeats=5, max_size=1000000),
+    Benchmark("list_all", bench_list_all, repeats=5, max_size=1000000),
+    Benchmark("search", bench_search, repeats=200),
+    Benchmark("artist + top 50 query", bench_index_queries, repeats=1000),
+    Benchmark("smart playlist x50", bench_smart_playlist, repeats=100),
+    Benchmark("import_csv", bench_import_csv, repeats=1, max_size=1000000, scratch=True),
+    Benchmark("open snapshot + lookup", bench_open_snapshot, repeats=100, scratch=True),
+    Benchmark("export csv", lambda size, folder: bench_export(size, folder, ".csv"), repeats=3, max_size=1000000,
+              scratch=True),
+    Benchmark("export binary.gz", lambda size, folder: bench_export(size, folder, ".jbx.gz"), repeats=3,
+              max_size=1000000, scratch=True),
+    Benchmark("cover decode", lambda size, folder: bench_cover(size, folder, cached=False), repeats=20,
+              scratch=True),
+    Benchmark("cover cached", lambda size, folder: bench_cover(size, folder, cached=True), repeats=1000,
+              scratch=True),
+    Benchmark("cover from atlas", bench_cover_atlas, repeats=1000, scratch=True),
+]
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+# Time `repeats` calls, then make one more call under tracemalloc for peak memory
+def measure(run, repeats):
+    timings = []
+    started = time.perf_counter()
+    for _ in range(repeats):
+        before = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - before)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "calls": repeats,
+        "mean_us": statistics.fmean(timings) * 1e6,
+        "p50_us": percentile(timings, 0.50) * 1e6,
+        "p95_us": percentile(timings, 0.95) * 1e6,
+        "p99_us": percentile(timings, 0.99) * 1e6,
+        "max_us": timings[-1] * 1e6,
+        "ops_per_sec": repeats / elapsed if elapsed else None,
+        "peak_kib": peak / 1024,
+    }
+
+
+# Run every selected benchmark against a fresh synthetic library of each size
+def run_suite(sizes, selected=None, log=print):
+    results = {}
+    saved = lib.library
+    try:
+        for size in sizes:
+            log(f"--- {size} tracks")
+            results[str(size)] = size_results = {}
+            for benchmark in BENCHMARKS:
+                if selected and benchmark.name not in selected:
+                    continue
+                if benchmark.max_size is not None and size > benchmark.max_size:
+                    continue
+                lib.library = synthetic_library.build_library(size)
+                lib.library_changed()
+                with tempfile.TemporaryDirectory(prefix="jukebox-bench-") as folder:
+                    try:
+                        run = benchmark.setup(size, folder) if benchmark.scratch else benchmark.setup(size)
+                    except ImportError as e:
+                        log(f"{benchmark.name:<24} skipped ({e})")
+                        continue
+                    stats = measure(run, benchmark.repeats)
+                    del run  # Lets go of files the benchmark still has open before the folder is removed
+                size_results[benchmark.name] = stats
+                log(f"{benchmark.name:<24} p50 {stats['p50_us']:>10.1f} us  p99 {stats['p99_us']:>10.1f} us  "
+                    f"{stats['ops_per_sec']:>10.0f} ops/s  peak {stats['peak_kib']:>9.0f} KiB")
+    finally:
+        lib.library = saved
+        lib.library_changed()
+    return results
+
+
+# Compare two result files, returning "size benchmark: old -> new" lines for regressions
+def find_regressions(old_results, new_results, threshold=REGRESSION_THRESHOLD):
+    regressions = []
+    for size, benchmarks in new_results["results"].items():
+        for name, stats in benchmarks.items():
+            old = old_results["results"].get(size, {}).get(name)
+            if old and old["p50_us"] and stats["p50_us"] / old["p50_us"] > threshold:
+                regressions.append(f"{size} {name}: p50 {old['p50_us']:.1f} us -> {stats['p50_us']:.1f} us")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the jukebox core without a display.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="library sizes to test (default: %(default)s)")
+    parser.add_argument("--only", nargs="+", help="benchmark names to run")
+    parser.add_argument("--output", default="bench_results.json", help="where to save the results")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    args = parser.parse_args(argv)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": run_suite(args.sizes, args.only),
+    }
+    with open(args.output, "w", encoding="utf-8") as results_file:
+        json.dump(report, results_file, indent=2)
+    print(f"Saved results to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as old_file:
+            regressions = find_regressions(json.load(old_file), report)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import argparse
+import csv
+import glob
+import hashlib
+import os
+import sys
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+import track_library as lib
+from library_item import LibraryItem
+from track_importer import BATCH_SIZE, ImportResult, RowError, _ProgressReader, parse_row
+from track_search import tokenize
+
+REPORT_FIELDS = ["file", "line", "track_key", "name", "artist", "reason"]
+
+
+# Hash of a track's name and artist with case, accents, punctuation and spacing
+# removed, so "BIRDS OF A FEATHER" and "Birds of a Feather" by Billie Eilish match
+def track_fingerprint(name, artist):
+    text = fingerprint_text(name) + "\x1f" + fingerprint_text(artist)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+
+
+# The words of `text`, or for text without any letters or digits ("!!!", emoji)
+# the whole text casefolded, so such names do not all look alike
+def fingerprint_text(text):
+    words = tokenize(text)
+    if words:
+        return " ".join(words)
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+# A row that was not ingested, and why
+class Reject():
+    def __init__(self, path, line, key, name, artist, reason):
+        self.path = path
+        self.line = line
+        self.key = key
+        self.name = name
+        self.artist = artist
+        self.reason = reason
+
+    def __str__(self):
+        return f"{os.path.basename(self.path)} line {self.line}: {self.reason}"
+
+
+# Summary of a bulk ingestion, with every rejected row
+class IngestResult(ImportResult):
+    def __init__(self):
+        super().__init__()
+        self.files = 0
+        self.rejects = []  # Reject for every bad or duplicate row, in file and line order
+
+    def summary(self):
+        return f"{super().summary()} from {self.files} files"
+
+
+# Parse one CSV file. Runs in a worker process, so it only reads the file and
+# returns plain tuples, which are much cheaper to send back than objects:
+# (path, [(line, key, name, artist, rating, play_count, fingerprint)], [RowError]).
+# A file that cannot be read or decoded keeps the rows before the bad line and
+# reports the rest as one RowError, so the other files are still ingested.
+def parse_file(path):
+    rows = []
+    errors = []
+    line = 0
+    try:
+        with open(path, "rb") as data_file:
+            data = csv.reader(_ProgressReader(data_file))  # Decodes line by line, so errors have a line
+            next(data, None)  # Skip the header row
+            for row in data:
+                line = data.line_num
+                if not row:
+                    continue
+                try:
+                    key, item = parse_row(row)
+                except ValueError as e:
+                    errors.append(RowError(line, row, str(e)))
+                    continue
+                rows.append((line, key, item.name, item.artist, item.rating, item.play_count,
+                             track_fingerprint(item.name, item.artist)))
+    except UnicodeDecodeError as e:  # The line after the last one read
+        errors.append(RowError(line + 1, [], f"file not read past here: {e}"))
+    except csv.Error as e:
+        errors.append(RowError(data.line_num, [], f"file not read past here: {e}"))
+    except OSError as e:
+        errors.append(RowError(0, [], f"file not read: {e}"))
+    return path, rows, errors
+
+
+# Every CSV file in `directory`, in name order so results never depend on the file system
+def catalog_files(directory, pattern="*.csv"):
+    return sorted(glob.glob(os.path.join(directory, pattern)))
+
+
+# Parse every file in `paths` with `workers` processes (default one per CPU; 0 or 1
+# parses in this process) and yield the results in the order of `paths`,
+# whichever worker finishes first
+def parse_files(paths, workers=None):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(paths) < 2:
+        yield from map(parse_file, paths)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(parse_file, paths)
+
+
+# Parse a directory of catalog CSVs in parallel and merge them into the library.
+# Rows are taken in file-name then line order, and a row is rejected if it is
+# malformed, its key is taken, or its name and artist match a track already in
+# the library or earlier in the run. Nothing is added when `dry_run` is set.
+def ingest_directory(directory, workers=None, pattern="*.csv", dry_run=False, batch_size=BATCH_SIZE):
+    result = IngestResult()
+    paths = catalog_files(directory, pattern)
+    result.files = len(paths)
+
+    # Fingerprints of the tracks already in the library -> their key
+    known = {}
+    for key, item in lib.iter_tracks():
+        known.setdefault(track_fingerprint(item.name, item.artist), key)
+    taken_keys = set()
+
+    batch = []
+    for path, rows, errors in parse_files(paths, workers):
+        result.rows += len(rows) + len(errors)
+        result.errors.extend(errors)
+        rejects = [Reject(path, e.line, e.row[0] if e.row else "", "", "", e.message) for e in errors]
+        for line, key, name, artist, rating, play_count, fingerprint in rows:
+            reason = None
+            if key in taken_keys or lib.get_name(key) is not None:
+                reason = f"track {key} already exists"
+            elif fingerprint in known:
+                reason = f"duplicate of track {known[fingerprint]}"
+            if reason is not None:
+                rejects.append(Reject(path, line, key, name, artist, reason))
+                result.duplicates += 1
+                continue
+            known[fingerprint] = key
+            taken_keys.add(key)
+            item = LibraryItem(name, artist, rating)
+            item.play_count = play_count
+            batch.append((key, item))
+            if len(batch) >= batch_size:
+                result.added += len(batch) if dry_run else lib.add_tracks(batch)
+                batch = []
+        rejects.sort(key=lambda reject: reject.line)
+        result.rejects.extend(rejects)
+    if batch:
+        result.added += len(batch) if dry_run else lib.add_tracks(batch)
+    return result
+
+
+# Write the rejected rows as CSV for whoever prepares the catalog files
+def write_report(path, rejects):
+    with open(path, "w", newline="", encoding="utf-8") as report_file:
+        writer = csv.writer(report_file)
+        writer.writerow(REPORT_FIELDS)
+        for reject in rejects:
+            writer.writerow([reject.path, reject.line, reject.key, reject.name, reject.artist, reject.reason])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest a directory of catalog CSV files into the jukebox library.")
+    parser.add_argument("directory", help="folder of CSV files in the new_tracks.csv format")
+    parser.add_argument("--workers", type=int, help="parser processes (default: one per CPU, 0 for none)")
+    parser.add_argument("--report", default="rejects.csv", help="where to write the rejected rows")
+    parser.add_argument("--db", help="SQLite library to add the tracks to")
+    parser.add_argument("--snapshot", help="library snapshot to add the tracks to")
+    parser.add_argument("--dry-run", action="store_true", help="check the files without changing the library")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        lib.use_database(args.db)
+    elif args.snapshot:
+        lib.use_snapshot(args.snapshot)
+    result = ingest_directory(args.directory, args.workers, dry_run=args.dry_run)
+    write_report(args.report, result.rejects)
+    print(result.summary())
+    print(f"{len(result.rejects)} rejected rows written to {args.report}")
+    if hasattr(lib.library, "close"):
+        lib.library.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import threading
+
+import track_library as lib
+import track_importer
+
+CHECKPOINT_SUFFIX = ".checkpoint"  # Checkpoint file kept next to the CSV
+SAMPLE_BYTES = 1 << 16             # Bytes hashed at each end of the already-read prefix
+SCAN_CHUNK = 1 << 20
+
+
+# Hash of the first and last SAMPLE_BYTES before `offset`. An upstream that only
+# appends never changes these bytes, while a rewritten file almost always does,
+# and checking them costs the same however large the file has grown.
+def prefix_hash(data_file, offset):
+    digest = hashlib.blake2b(str(offset).encode("ascii"), digest_size=16)
+    data_file.seek(0)
+    digest.update(data_file.read(min(offset, SAMPLE_BYTES)))
+    tail_start = max(SAMPLE_BYTES, offset - SAMPLE_BYTES)
+    if tail_start < offset:
+        data_file.seek(tail_start)
+        digest.update(data_file.read(offset - tail_start))
+    return digest.hexdigest()
+
+
+# Checkpoints for libraries that only live in memory: a restarted jukebox starts
+# from the built-in tracks again, so it must not skip rows a previous run imported
+_memory_checkpoints = {}  # absolute CSV path -> checkpoint
+
+
+def checkpoint_path(path):
+    return f"{path}{CHECKPOINT_SUFFIX}"
+
+
+# The file a persistent library is stored in, or None for an in-memory library
+def library_file():
+    path = getattr(lib.library, "path", None)
+    return os.path.abspath(path) if path is not None else None
+
+
+# {"offset": bytes already ingested, "lines": lines before that offset, "prefix_hash": ...},
+# or None if the current library has not ingested `path` yet
+def load_checkpoint(path):
+    stored_in = library_file()
+    if stored_in is None:
+        return _memory_checkpoints.get(os.path.abspath(path))
+    try:
+        with open(checkpoint_path(path), encoding="utf-8") as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+    except (OSError, ValueError):
+        return None
+    if checkpoint.get("library") != stored_in or not {"offset", "lines", "prefix_hash"} <= checkpoint.keys():
+        return None  # Written for another library, or damaged
+    return checkpoint
+
+
+# Remember how far the current library has ingested `path`. A persistent
+# library is flushed first, so the checkpoint never gets ahead of the tracks.
+def save_checkpoint(path, checkpoint):
+    stored_in = library_file()
+    if stored_in is None:
+        _memory_checkpoints[os.path.abspath(path)] = checkpoint
+        return
+    flush = getattr(lib.library, "flush", None)
+    if flush is not None:
+        flush()
+    temp_path = checkpoint_path(path) + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as checkpoint_file:
+        json.dump(dict(checkpoint, library=stored_in), checkpoint_file)
+    os.replace(temp_path, checkpoint_path(path))
+
+
+# The part of a catalog CSV that still has to be ingested: bytes start-end,
+# where start follows `first_line` lines. `end` is the end of the last complete
+# line, so a row the upstream is still writing waits for the next run.
+# `resync` means the checkpoint no longer matches the file and everything is read again.
+class IngestPlan():
+    def __init__(self, path, start, end, first_line, end_line, end_hash, resync):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.first_line = first_line
+        self.end_line = end_line
+        self.end_hash = end_hash  # prefix_hash() of the file up to `end`, taken when planning
+        self.resync = resync
+
+    def is_empty(self):
+        return self.start >= self.end
+
+    # The checkpoint to save once every row in the plan has been applied
+    def checkpoint(self):
+        return {"offset": self.end, "lines": self.end_line, "prefix_hash": self.end_hash}
+
+
+# Work out what is new in `path` since its checkpoint
+def plan_ingest(path):
+    checkpoint = load_checkpoint(path)
+    with open(path, "rb") as data_file:
+        size = os.fstat(data_file.fileno()).st_size
+        start, first_line, resync = 0, 0, True
+        if checkpoint is not None and checkpoint["offset"] <= size:
+            if prefix_hash(data_file, checkpoint["offset"]) == checkpoint["prefix_hash"]:
+                start, first_line, resync = checkpoint["offset"], checkpoint["lines"], False
+
+        # Count the new complete lines and find where the last one ends
+        end, end_line = start, first_line
+        data_file.seek(start)
+        position = start
+        while True:
+            chunk = data_file.read(SCAN_CHUNK)
+            if not chunk:
+                break
+            newlines = chunk.count(b"\n")
+            if newlines:
+                end_line += newlines
+                end = position + chunk.rindex(b"\n") + 1
+            position += len(chunk)
+        end_hash = prefix_hash(data_file, end)
+    return IngestPlan(path, start, end, first_line, end_line, end_hash, resync and checkpoint is not None)
+
+
+# Import only the rows appended to `path` since the last call, then move the
+# checkpoint past them. If the file was rewritten, the whole file is imported
+# again; rows whose key is already in the library are skipped, so that re-sync
+# adds exactly the tracks the library is missing. Returns (ImportResult, IngestPlan).
+def ingest_new_rows(path, batch_size=track_importer.BATCH_SIZE, on_progress=None):
+    plan = plan_ingest(path)
+    if plan.is_empty():
+        result = track_importer.ImportResult()
+    else:
+        result = track_importer.import_csv(path, batch_size, on_progress, None, plan.start, plan.end,
+                                           plan.first_line)
+    if result.error is None:  # Otherwise the rows after the error are tried again next time
+        save_checkpoint(path, plan.checkpoint())
+    return result, plan
+
+
+# Background thread that polls a catalog CSV and ingests new rows as they are
+# appended. The library is thread safe and open windows pick the new tracks up
+# from its change events. `on_result(result, plan)` is called after every
+# ingest that found rows, on this thread.
+class CsvWatcher(threading.Thread):
+    def __init__(self, path, interval=1.0, on_result=None, on_error=None):
+        super().__init__(daemon=True)
+        self.path = path
+        self.interval = interval
+        self.on_result = on_result
+        self.on_error = on_error
+        self.stop_event = threading.Event()
+        self._seen = None  # (size, mtime) of the file at the last ingest
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        while True:
+            self.check()
+            if self.stop_event.wait(self.interval):
+                return
+
+    # Ingest new rows if the file changed. Errors go to on_error and the
+    # watcher keeps running; a file that fails is tried again once it changes.
+    def check(self):
+        try:
+            stat = os.stat(self.path)
+            if (stat.st_size, stat.st_mtime_ns) == self._seen:
+                return
+            self._seen = (stat.st_size, stat.st_mtime_ns)
+            result, plan = ingest_new_rows(self.path)
+        except (OSError, ValueError, csv.Error) as e:
+            self.report_error(e)
+            return
+        if result.error is not None:
+            self.report_error(result.error)
+        if self.on_result is not None and not plan.is_empty():
+            self.on_result(result, plan)
+
+    def report_error(self, error):
+        if self.on_error is not None:
+            self.on_error(error)
+
+
+def report(result, plan):
+    mode = "full re-sync" if plan.resync else "new rows"
+    print(f"{result.summary()} ({mode}, lines {plan.first_line + 1}-{plan.end_line})")
+    for error in result.errors:
+        print(f"  {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import rows appended to a catalog CSV since the last run.")
+    parser.add_argument("path", nargs="?", default="new_tracks.csv", help="catalog CSV (default: %(default)s)")
+    parser.add_argument("--watch", action="store_true", help="keep running and import new rows as they land")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between checks when watching")
+    parser.add_argument("--db", help="SQLite library to add the tracks to")
+    parser.add_argument("--snapshot", help="library snapshot to add the tracks to")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        lib.use_database(args.db)
+    elif args.snapshot:
+        lib.use_snapshot(args.snapshot)
+    try:
+        if args.watch:
+            watcher = CsvWatcher(args.path, args.interval, report, lambda e: print(f"Cannot read {args.path}: {e}"))
+            watcher.start()
+            while watcher.is_alive():
+                watcher.join(1.0)
+        else:
+            report(*ingest_new_rows(args.path))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if hasattr(lib.library, "close"):
+            lib.library.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+import argparse
+import glob
+import json
+import mmap
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from cover_cache import COVER_SIZE
+
+ATLAS_NAME = "covers.atlas"   # Thumbnail slots, inside the covers folder
+INDEX_SUFFIX = ".json"        # Index of the atlas, next to it
+ATLAS_VERSION = 1
+
+
+# Every thumbnail is stored as a binary PPM image, which Tk's PhotoImage reads
+# directly, so showing one needs neither PIL nor a JPEG decode
+def ppm_header(size):
+    return f"P6 {size[0]} {size[1]} 255\n".encode("ascii")
+
+
+def slot_bytes(size):
+    return len(ppm_header(size)) + size[0] * size[1] * 3
+
+
+# Turn one cover into a thumbnail of exactly `size`, as PPM bytes. Runs in a worker process.
+def make_thumbnail(path, size):
+    from PIL import Image
+
+    with Image.open(path) as img:
+        img.draft("RGB", size)  # Let the JPEG decoder scale down while decoding
+        thumbnail = img.convert("RGB").resize(size)
+    return ppm_header(size) + thumbnail.tobytes()
+
+
+def atlas_paths(folder):
+    atlas_path = os.path.join(folder, ATLAS_NAME)
+    return atlas_path, atlas_path + INDEX_SUFFIX
+
+
+def load_index(index_path):
+    try:
+        with open(index_path, encoding="utf-8") as index_file:
+            index = json.load(index_file)
+    except (OSError, ValueError):
+        return None
+    return index if index.get("version") == ATLAS_VERSION else None
+
+
+# Identifies one version of the index: every build replaces the file, so its inode changes
+def index_stamp(index_path):
+    try:
+        stat = os.stat(index_path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+# Make thumbnails of `paths` with `workers` processes (default one per CPU; 0 or 1
+# works in this process), yielding (path, thumbnail or error) in order
+def make_thumbnails(paths, size, workers=None):
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    def guarded(path):
+        try:
+            return make_thumbnail(path, size)
+        except OSError as e:
+            return e
+
+    if workers <= 1 or len(paths) < 2:
+        yield from zip(paths, map(guarded, paths))
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(make_thumbnail, path, size) for path in paths]
+        for path, future in zip(paths, futures):
+            try:
+                yield path, future.result()
+            except OSError as e:
+                yield path, e
+
+
+# Bring the atlas for the covers in `folder` up to date. Only covers that are
+# new or whose modification time changed are decoded; their thumbnails are
+# written into their old slot (or a free one) and the index is replaced last,
+# so a reader never sees an index pointing at a slot that was not written.
+# A fresh atlas (first build or a new size) is written to a temporary file and
+# renamed over the old one, which is never truncated under a reader's mapping.
+# Returns {"built": n, "kept": n, "removed": n, "failed": [paths]}.
+def build_atlas(folder="photos", size=COVER_SIZE, workers=None, pattern="*.jpg"):
+    size = tuple(size)
+    atlas_path, index_path = atlas_paths(folder)
+    index = load_index(index_path)
+    fresh_path = None
+    if index is None or tuple(index["size"]) != size or not os.path.exists(atlas_path):
+        index = {"version": ATLAS_VERSION, "size": list(size), "slot_bytes": slot_bytes(size), "slots": 0,
+                 "covers": {}}
+        fresh_path = atlas_path + ".tmp"
+        with open(fresh_path, "wb"):
+            pass  # Start a fresh atlas
+    entries = index["covers"]  # file name -> {"slot": n, "mtime_ns": n}
+
+    mtimes = {os.path.basename(path): os.stat(path).st_mtime_ns
+              for path in sorted(glob.glob(os.path.join(folder, pattern)))}
+    removed = [name for name in entries if name not in mtimes]
+    free_slots = sorted(entries.pop(name)["slot"] for name in removed)
+    stale = [name for name, mtime in mtimes.items()
+             if name not in entries or entries[name]["mtime_ns"] != mtime]
+
+    failed = []
+    with open(fresh_path or atlas_path, "r+b") as atlas_file:
+        paths = [os.path.join(folder, name) for name in stale]
+        for path, thumbnail in make_thumbnails(paths, size, workers):
+            name = os.path.basename(path)
+            if isinstance(thumbnail, Exception):
+                failed.append(path)
+                if name in entries:
+                    free_slots.append(entries.pop(name)["slot"])
+                continue
+            entry = entries.get(name)
+            if entry is not None:
+                slot = entry["slot"]
+            elif free_slots:
+                slot = free_slots.pop(0)
+            else:
+                slot = index["slots"]
+                index["slots"] += 1
+            atlas_file.seek(slot * index["slot_bytes"])
+            atlas_file.write(thumbnail)
+            entries[name] = {"slot": slot, "mtime_ns": mtimes[name]}
+        atlas_file.flush()
+        os.fsync(atlas_file.fileno())
+    if fresh_path is not None:
+        os.replace(fresh_path, atlas_path)
+
+    temp_path = index_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as index_file:
+        json.dump(index, index_file, sort_keys=True)
+    os.replace(temp_path, index_path)
+    return {"built": len(stale) - len(failed), "kept": len(mtimes) - len(stale), "removed": len(removed),
+            "failed": failed}
+
+
+# Read side of the atlas: thumbnails are sliced straight out of the mapped
+# file by slot. A cover that changed since the atlas was built is reported as
+# missing, so callers fall back to decoding the original.
+class CoverAtlas():
+    def __init__(self, folder="photos"):
+        self.folder = folder
+        self._open()
+
+    def _open(self):
+        atlas_path, index_path = atlas_paths(self.folder)
+        self.stamp = index_stamp(index_path)
+        self.index = load_index(index_path) or {"covers": {}, "slot_bytes": 0, "size": list(COVER_SIZE)}
+        self.size = tuple(self.index["size"])
+        self._mmap = None
+        if self.index["covers"]:
+            with open(atlas_path, "rb") as atlas_file:
+                self._mmap = mmap.mmap(atlas_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # Map the atlas again if it was rebuilt since it was opened; returns whether it was
+    def refresh(self):
+        if index_stamp(atlas_paths(self.folder)[1]) == self.stamp:
+            return False
+        self.close()
+        self._open()
+        return True
+
+    def __len__(self):
+        return len(self.index["covers"])
+
+    # PPM bytes of the thumbnail for cover file `name` (e.g. "07.jpg"), or None
+    # if it is not in the atlas or the cover has changed since
+    def ppm(self, name):
+        entry = self.index["covers"].get(name)
+        if entry is None or self._mmap is None:
+            return None
+        try:
+            if os.stat(os.path.join(self.folder, name)).st_mtime_ns != entry["mtime_ns"]:
+                return None
+        except FileNotFoundError:
+            return None
+        start = entry["slot"] * self.index["slot_bytes"]
+        return self._mmap[start:start + self.index["slot_bytes"]]
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the packed cover thumbnail atlas used by the track viewer.")
+    parser.add_argument("folder", nargs="?", default="photos", help="folder of cover JPEGs (default: %(default)s)")
+    parser.add_argument("--workers", type=int, help="decoder processes (default: one per CPU)")
+    parser.add_argument("--size", type=int, nargs=2, default=COVER_SIZE, metavar=("WIDTH", "HEIGHT"),
+                        help="thumbnail size in pixels (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    stats = build_atlas(args.folder, args.size, args.workers)
+    print(f"{stats['built']} thumbnails built, {stats['kept']} unchanged, {stats['removed']} removed")
+    for path in stats["failed"]:
+        print(f"Could not read {path}")
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+COVER_SIZE = (200, 200)
+
+
+# Bounded least-recently-used cache of decoded, resized album covers.
+# Entries are keyed by path and checked against the file's modification time,
+# so a replaced cover is decoded again. Covers can be decoded ahead of time on
+# a background thread with prefetch(). Safe to use from several threads; the
+# cached PIL images still have to be turned into PhotoImages on the Tk thread.
+class CoverCache():
+    def __init__(self, max_items=64, size=COVER_SIZE):
+        self.max_items = max_items
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._covers = OrderedDict()  # path -> (mtime, image), oldest first
+        self._lock = threading.Lock()
+        self._requests = queue.Queue()
+        self._queued = set()          # Paths waiting in self._requests
+        self._worker = None
+
+    # Return the resized cover at `path`, or None if there is no such file
+    def get(self, path):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            entry = self._covers.get(path)
+            if entry is not None and entry[0] == mtime:
+                self._covers.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        try:
+            image = self.decode(path)
+        except FileNotFoundError:
+            return None
+        self._store(path, mtime, image)
+        return image
+
+    # Decode a cover at reduced size. draft() lets the JPEG decoder scale down
+    # by 1/2, 1/4 or 1/8 while decoding instead of producing full-size pixels.
+    def decode(self, path):
+        from PIL import Image  # Imported on first decode to keep window start-up fast
+
+        with Image.open(path) as img:
+            img.draft("RGB", self.size)
+            return img.resize(self.size)
+
+    def _store(self, path, mtime, image):
+        with self._lock:
+            self._covers[path] = (mtime, image)
+            self._covers.move_to_end(path)
+            while len(self._covers) > self.max_items:
+                self._covers.popitem(last=False)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._covers)
+
+    def clear(self):
+        with self._lock:
+            self._covers.clear()
+
+    # Decode the given covers on the background thread so later get() calls hit the cache
+    def prefetch(self, paths):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._prefetch_loop, daemon=True)
+                self._worker.start()
+            for path in paths:
+                if path not in self._queued and path not in self._covers:
+                    self._queued.add(path)
+                    self._requests.put(path)
+
+    # Block until every queued prefetch has been handled
+    def wait_for_prefetch(self):
+        self._requests.join()
+
+    def _prefetch_loop(self):
+        try:
+            while True:
+                path = self._requests.get()
+                try:
+                    self.get(path)
+                except Exception:
+                    pass  # Unreadable cover; the UI will report it if the track is viewed
+                finally:
+                    with self._lock:
+                        self._queued.discard(path)
+                    self._requests.task_done()
+        finally:
+            with self._lock:
+                self._worker = None  # The next prefetch() starts a new thread
+
+
+# Paths of the covers for the tracks numbered just before and after `key`
+def neighbour_cover_paths(key, distance=2, folder="photos"):
+    if not key.isdigit():
+        return []
+    paths = []
+    for step in range(1, distance + 1):
+        for number in (int(key) + step, int(key) - step):
+            if number >= 0:
+                paths.append(os.path.join(folder, f"{number:0{len(key)}d}.jpg"))
+    return paths
@@ -1,8 +1,13 @@
 import tkinter as tk
+import tkinter.filedialog as filedialog
 import tkinter.scrolledtext as tkst
 
 import track_library as lib  # Custom module for track management
 import font_manager as fonts  # Custom module for font configuration
+from track_list_view import TrackListView, SearchBar  # Virtualized track list and search box
+from playlist import Playlist, parse_key_range  # Ordered, duplicate-free playlist model
+from track_events import TkChangeListener  # Delivers library changes once per idle cycle
+import track_export                # Streaming CSV / JSON Lines / binary export
 
 # Utility function to safely set content for a Text or ScrolledText widget
 def set_text(text_area, content):
@@ -11,13 +16,21 @@ def set_text(text_area, content):
     text_area.insert(1.0, content)
     text_area.configure(state=tk.DISABLED)  # Disable editing again
 
+# Utility function to add content to the end of a read-only Text widget
+def append_text(text_area, content):
+    text_area.configure(state=tk.NORMAL)
+    text_area.insert(tk.END, content)
+    text_area.configure(state=tk.DISABLED)
+
 # Main Playlist class
 class TrackPlaylist():
     def __init__(self, window):
         self.window = window
         window.title("Create_Track_List")
         self.current_track_index = 0  # Index of currently selected/playing track
-        self.playlist_keys = []  # List of track keys in the playlist
+        self.playlist_keys = Playlist()  # Track keys in the playlist, in play order
+        self.search_keys = []  # Keys found by the last search
+        self.info_key = None  # Track shown in the information area
 
         # Input field for entering track number
         self.input_entry = tk.Entry(window, width=50)
@@ -65,12 +78,44 @@ class TrackPlaylist():
         reset_btn = tk.Button(window, text="Reset Playlist", command=self.reset_playlist_clicked)
         reset_btn.grid(row=4, column=0, padx=10, pady=10, sticky="w")
 
+        # Buttons to save the playlist to a file and load it back
+        file_frame = tk.Frame(window)
+        file_frame.grid(row=4, column=2, padx=10, pady=10)
+        save_btn = tk.Button(file_frame, text="Save Playlist", command=self.save_playlist_clicked)
+        save_btn.grid(row=0, column=0, padx=(0, 5))
+        load_btn = tk.Button(file_frame, text="Load Playlist", command=self.load_playlist_clicked)
+        load_btn.grid(row=0, column=1)
+        export_btn = tk.Button(file_frame, text="Export...", command=self.export_playlist_clicked)
+        export_btn.grid(row=0, column=2, padx=(5, 0))
+
         # --- Song Library Display ---
         all_tracks_lbl = tk.Label(window, text="Song List:")
         all_tracks_lbl.grid(row=5, column=0, columnspan=3, padx=10, pady=(10,0), sticky="w")
 
-        self.all_tracks_txt = tkst.ScrolledText(window, width=60, height=10, wrap="none", state=tk.DISABLED)
-        self.all_tracks_txt.grid(row=6, column=0, columnspan=3, padx=10, pady=(0,10), sticky="ew")
+        self.all_tracks_view = TrackListView(window, width=60, height=10, empty_text="Library is empty.",
+                                             on_select=self.library_track_selected)
+        self.all_tracks_view.grid(row=6, column=0, columnspan=3, padx=10, pady=(0,10), sticky="ew")
+
+        # Search box that filters the song list by name or artist
+        search_bar = SearchBar(window, on_results=self.search_results)
+        search_bar.grid(row=7, column=0, columnspan=2, padx=10, pady=(0,10), sticky="w")
+
+        # Button to add every search result to the playlist at once
+        add_results_btn = tk.Button(window, text="Add Results to Playlist", command=self.add_results_clicked)
+        add_results_btn.grid(row=7, column=2, padx=10, pady=(0,10), sticky="e")
+
+        # Smart playlist: add well rated, rarely played tracks, or shuffle favouring them
+        smart_frame = tk.Frame(window)
+        smart_frame.grid(row=8, column=0, columnspan=3, padx=10, pady=(0,10), sticky="w")
+        smart_lbl = tk.Label(smart_frame, text="Smart picks:")
+        smart_lbl.grid(row=0, column=0, padx=(0, 5))
+        self.smart_count_entry = tk.Entry(smart_frame, width=5)
+        self.smart_count_entry.insert(0, "20")
+        self.smart_count_entry.grid(row=0, column=1, padx=(0, 5))
+        smart_btn = tk.Button(smart_frame, text="Add Smart Picks", command=self.add_smart_picks_clicked)
+        smart_btn.grid(row=0, column=2, padx=(0, 5))
+        shuffle_btn = tk.Button(smart_frame, text="Weighted Shuffle", command=self.weighted_shuffle_clicked)
+        shuffle_btn.grid(row=0, column=3)
 
         # Load all tracks from the library into the display area
         self.load_all_tracks()
@@ -78,11 +123,15 @@ class TrackPlaylist():
         # Clear any initial error messages
         self.update_error_message("")
 
+        # Patch the song list and track info when the library changes, once per idle cycle
+        TkChangeListener(window, self.library_changed, lib.events)
+
     # Update the red error label message
     def update_error_message(self, message):
         self.error_lbl.config(text=message)
 
-    # Action when 'Add to Playlist' button is clicked
+    # Action when 'Add to Playlist' button is clicked.
+    # Accepts a single track number or a range such as "01-05".
     def add_track_clicked(self):
         track_key = self.input_entry.get().strip()  # Get user input
         self.update_error_message("")  # Clear previous error
@@ -91,27 +140,88 @@ class TrackPlaylist():
             self.update_error_message("Error: Please enter a track number.")
             return
 
+        key_range = parse_key_range(track_key)
+        if key_range is not None and key_range[0] != key_range[1]:
+            added = self.playlist_keys.add_range(*key_range)
+            self.append_to_playlist_display(added)
+            self.input_entry.delete(0, tk.END)
+            self.update_error_message(f"Added {len(added)} tracks to the playlist.")
+            return
+
         track_name = lib.get_name(track_key)
         if track_name:
-            if track_key not in self.playlist_keys:
-                self.playlist_keys.append(track_key)
-                self.update_playlist_display()
+            if self.playlist_keys.add(track_key):
+                self.append_to_playlist_display([track_key])
                 self.input_entry.delete(0, tk.END)  # Clear the input field
             else:
                 self.update_error_message(f"Error: Track {track_key} is already in the playlist.")
         else:
             self.update_error_message(f"Error: Track {track_key} not found in the library.")
 
-    # Update playlist display area with track info
+    # Action when 'Add Results to Playlist' button is clicked
+    def add_results_clicked(self):
+        if not self.search_keys:
+            self.update_error_message("Error: Search for tracks first.")
+            return
+        added = self.playlist_keys.add_many(self.search_keys)
+        self.append_to_playlist_display(added)
+        self.update_error_message(f"Added {len(added)} tracks to the playlist.")
+
+    # Add tracks picked by rating and play count, skipping ones already queued or just played
+    def add_smart_picks_clicked(self):
+        try:
+            count = int(self.smart_count_entry.get())
+        except ValueError:
+            self.update_error_message("Error: Enter how many tracks to pick.")
+            return
+        try:
+            import smart_playlist  # Needs NumPy, so only loaded when asked for
+        except ImportError:
+            self.update_error_message("Error: Smart playlists need NumPy (pip install numpy).")
+            return
+        added = self.playlist_keys.add_many(smart_playlist.smart_playlist(count, exclude=self.playlist_keys))
+        self.append_to_playlist_display(added)
+        self.update_error_message(f"Added {len(added)} tracks to the playlist.")
+
+    # Reorder the playlist so well rated, rarely played tracks tend to come first
+    def weighted_shuffle_clicked(self):
+        if not self.playlist_keys:
+            self.update_error_message("Playlist is empty. Add tracks first.")
+            return
+        try:
+            import smart_playlist
+        except ImportError:
+            self.update_error_message("Error: Shuffling needs NumPy (pip install numpy).")
+            return
+        self.playlist_keys = Playlist(smart_playlist.weighted_shuffle(self.playlist_keys))
+        self.current_track_index = 0
+        self.update_playlist_display()
+        self.update_error_message("Playlist shuffled.")
+
+    # Playlist display line for one track, or None if it is not in the library
+    def playlist_line(self, key):
+        name = lib.get_name(key)
+        artist = lib.get_artist(key)
+        if name and artist:
+            return f"{key}: {name} - {artist}\n"
+        return None
+
+    # Rebuild the whole playlist display area with track info
     def update_playlist_display(self):
-        playlist_content = ""
-        for key in self.playlist_keys:
-            name = lib.get_name(key)
-            artist = lib.get_artist(key)
-            if name and artist:
-                playlist_content += f"{key}: {name} - {artist}\n"
+        lines = [self.playlist_line(key) for key in self.playlist_keys]
+        playlist_content = "".join(line for line in lines if line)
         set_text(self.playlist_txt, playlist_content if playlist_content else "Playlist is empty.")
 
+    # Show newly added tracks by appending their lines instead of redrawing the whole playlist
+    def append_to_playlist_display(self, keys):
+        if not keys:
+            return
+        if len(self.playlist_keys) == len(keys):
+            self.update_playlist_display()  # Replaces the "Playlist is empty." placeholder
+            return
+        lines = [self.playlist_line(key) for key in keys]
+        append_text(self.playlist_txt, "".join(line for line in lines if line))
+
     # Play the current track in playlist and show detailed info
     def play_playlist_clicked(self):
         if not self.playlist_keys:
@@ -119,7 +229,7 @@ class TrackPlaylist():
             return
 
         key = self.playlist_keys[self.current_track_index]
-        lib.increment_play_count(key)
+        lib.increment_play_count(key, source="playlist")
         name = lib.get_name(key)
         artist = lib.get_artist(key)
         play_count = lib.get_play_count(key)
@@ -127,22 +237,85 @@ class TrackPlaylist():
 
         play_info = f" Playing: {name}\n {artist}\n rating: {rating} \n  Plays: {play_count}"
         set_text(self.track_infor_txt, play_info)
-        self.show_track_info(key)
-        self.load_all_tracks()  # Reload library info (if updated)
+        self.show_track_info(key)  # The song list is patched by library_changed()
 
     # Reset/clear the playlist and UI components
     def reset_playlist_clicked(self):
-        self.playlist_keys = []
+        self.playlist_keys.clear()
         self.update_playlist_display()
         self.current_track_index = 0
         set_text(self.track_infor_txt, "")
+        self.info_key = None
         self.update_error_message("Playlist reset.")
         self.input_entry.delete(0, tk.END)
 
+    # Save the playlist to a file chosen by the user
+    def save_playlist_clicked(self):
+        path = filedialog.asksaveasfilename(parent=self.window, defaultextension=".playlist",
+                                            filetypes=[("Playlists", "*.playlist")])
+        if not path:
+            return
+        try:
+            self.playlist_keys.save(path)
+        except OSError as e:
+            self.update_error_message(f"Error: Could not save playlist: {e}")
+            return
+        self.update_error_message(f"Saved {len(self.playlist_keys)} tracks.")
+
+    # Replace the playlist with one loaded from a file chosen by the user
+    def load_playlist_clicked(self):
+        path = filedialog.askopenfilename(parent=self.window, filetypes=[("Playlists", "*.playlist")])
+        if not path:
+            return
+        try:
+            loaded = Playlist.load(path)
+        except (OSError, ValueError) as e:
+            self.update_error_message(f"Error: Could not load playlist: {e}")
+            return
+        self.playlist_keys = Playlist(key for key in loaded if lib.get_name(key) is not None)
+        self.current_track_index = 0
+        self.update_playlist_display()
+        missing = len(loaded) - len(self.playlist_keys)
+        message = f"Loaded {len(self.playlist_keys)} tracks."
+        if missing:
+            message += f" {missing} tracks are not in the library."
+        self.update_error_message(message)
+
+    # Write the playlist's tracks with their ratings and play counts to a file for other tools
+    def export_playlist_clicked(self):
+        if not self.playlist_keys:
+            self.update_error_message("Error: The playlist is empty.")
+            return
+        path = filedialog.asksaveasfilename(parent=self.window, defaultextension=".csv", filetypes=[
+            ("CSV", "*.csv"), ("JSON Lines", "*.jsonl"), ("Binary", "*.jbx"), ("Compressed", "*.gz")])
+        if not path:
+            return
+        try:
+            written = track_export.export_playlist(self.playlist_keys, path)
+        except (OSError, ValueError) as e:
+            self.update_error_message(f"Error: Could not export playlist: {e}")
+            return
+        self.update_error_message(f"Exported {written} tracks.")
+
     # Load and display all tracks from the library
     def load_all_tracks(self):
-        all_tracks_content = lib.list_all()
-        set_text(self.all_tracks_txt, all_tracks_content if all_tracks_content else "Library is empty.")
+        self.all_tracks_view.refresh()
+
+    # Show search results in the song list, or the whole library for an empty search
+    def search_results(self, query, keys):
+        self.search_keys = keys
+        if not query:
+            self.load_all_tracks()
+            self.update_error_message("")
+            return
+        self.all_tracks_view.show_keys(keys)
+        if not keys:
+            self.update_error_message(f"No tracks match \"{query}\".")
+
+    # Clicking a song in the list puts its number in the input field
+    def library_track_selected(self, key):
+        self.input_entry.delete(0, tk.END)
+        self.input_entry.insert(0, key)
 
     # Go to next track in playlist and update the info display
     def play_next_track(self):
@@ -176,6 +349,13 @@ class TrackPlaylist():
         rating = lib.get_rating(key)
         play_info = f"Playing: {name}\n{artist}\nRating: {rating}\nPlays: {play_count}"
         set_text(self.track_infor_txt, play_info)
+        self.info_key = key
+
+    # Called once per idle cycle with the library changes made since the last call
+    def library_changed(self, changes):
+        self.all_tracks_view.apply_changes(changes)
+        if self.info_key is not None and (changes.reset or self.info_key in changes.changed):
+            self.show_track_info(self.info_key)
 
 # --- Main run block ---
 if __name__ == "__main__":
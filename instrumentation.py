@@ -0,0 +1,227 @@
+import atexit
+import bisect
+import functools
+import inspect
+import json
+import sys
+import threading
+import time
+import traceback
+
+# Histogram bucket upper bounds in microseconds: 1us, 2us, 4us ... about 67s
+BUCKET_BOUNDS_US = [2 ** i for i in range(27)]
+
+
+# Call count and latency distribution for one operation, in power-of-two buckets
+class LatencyHistogram():
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS_US) + 1)  # Last bucket is "slower than that"
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS_US, seconds * 1e6)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    # Upper bound, in seconds, of the bucket holding the given fraction of calls
+    def percentile(self, fraction):
+        if not self.count:
+            return 0.0
+        wanted = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= wanted and count:
+                if index >= len(BUCKET_BOUNDS_US):
+                    return self.max
+                return min(BUCKET_BOUNDS_US[index] / 1e6, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1e3,
+            "mean_us": self.total / self.count * 1e6 if self.count else 0.0,
+            "p50_us": self.percentile(0.50) * 1e6,
+            "p99_us": self.percentile(0.99) * 1e6,
+            "max_us": self.max * 1e6,
+            "buckets_us": {str(bound): count for bound, count in zip(BUCKET_BOUNDS_US + ["inf"], self.buckets)
+                           if count},
+        }
+
+
+# Registry of latency histograms and event-loop stalls
+class Metrics():
+    def __init__(self):
+        self.histograms = {}  # name -> LatencyHistogram
+        self.stalls = []      # Callbacks that blocked mainloop, with a stack sample
+        self.max_stalls = 100
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.add(seconds)
+
+    def record_stall(self, name, seconds, stack):
+        with self._lock:
+            if len(self.stalls) < self.max_stalls:
+                self.stalls.append({"callback": name, "blocked_ms": seconds * 1e3, "time": time.time(),
+                                    "stack": stack})
+
+    def clear(self):
+        with self._lock:
+            self.histograms = {}
+            self.stalls = []
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "operations": {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())},
+                "stalls": list(self.stalls),
+            }
+
+    def export(self, path):
+        with open(path, "w", encoding="utf-8") as metrics_file:
+            json.dump(self.to_dict(), metrics_file, indent=2)
+
+    # One line per operation, slowest total time first
+    def summary_lines(self):
+        with self._lock:
+            ranked = sorted(self.histograms.items(), key=lambda entry: -entry[1].total)
+            lines = [f"{'operation':<40} {'calls':>8} {'p50 us':>9} {'p99 us':>9} {'max ms':>8}"]
+            for name, histogram in ranked:
+                lines.append(f"{name:<40} {histogram.count:>8} {histogram.percentile(0.5) * 1e6:>9.0f} "
+                             f"{histogram.percentile(0.99) * 1e6:>9.0f} {histogram.max * 1e3:>8.1f}")
+            lines.append(f"{len(self.stalls)} event loop stalls recorded")
+            return lines
+
+
+metrics = Metrics()  # Shared registry used by everything below
+
+
+# Wrap `func` so every call is timed into `metrics` under `name`
+def timed(name, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            metrics.record(name, time.perf_counter() - started)
+    wrapper.__wrapped_by_instrumentation__ = True
+    return wrapper
+
+
+# Time every public function defined in `module` (e.g. track_library)
+def instrument_module(module, prefix=None):
+    prefix = prefix or module.__name__
+    for name, func in list(vars(module).items()):
+        if (inspect.isfunction(func) and func.__module__ == module.__name__ and not name.startswith("_")
+                and not getattr(func, "__wrapped_by_instrumentation__", False)):
+            setattr(module, name, timed(f"{prefix}.{name}", func))
+
+
+# Background thread that watches Tk callbacks and records any that keep
+# mainloop busy for longer than `threshold` seconds, with a sample of the
+# main thread's stack taken while it is still blocked.
+class Watchdog(threading.Thread):
+    def __init__(self, threshold=0.2):
+        super().__init__(daemon=True)
+        self.threshold = threshold
+        self._current = None      # (name, start time, thread id) of the running callback
+        self._reported = None     # The _current entry already reported as a stall
+        self._stop_event = threading.Event()
+
+    def callback_started(self, name):
+        self._current = (name, time.perf_counter(), threading.get_ident())
+
+    def callback_finished(self):
+        self._current = None
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.threshold / 4):
+            self.check()
+
+    def check(self):
+        current = self._current
+        if current is None or current is self._reported:
+            return
+        name, started, thread_id = current
+        blocked = time.perf_counter() - started
+        if blocked < self.threshold:
+            return
+        frame = sys._current_frames().get(thread_id)
+        stack = traceback.format_stack(frame) if frame is not None else []
+        self._reported = current
+        metrics.record_stall(name, blocked, stack)
+
+
+# Time every Tk callback (button commands, bindings, after() calls) by wrapping
+# tkinter's single callback dispatcher, and report long ones to the watchdog
+def instrument_tk(watchdog=None):
+    import tkinter
+
+    if getattr(tkinter.CallWrapper.__call__, "__wrapped_by_instrumentation__", False):
+        return
+    dispatch = tkinter.CallWrapper.__call__
+    depth = threading.local()
+
+    def instrumented_call(self, *args):
+        name = f"ui.{getattr(self.func, '__qualname__', repr(self.func))}"
+        outermost = not getattr(depth, "value", 0)
+        depth.value = getattr(depth, "value", 0) + 1
+        if outermost and watchdog is not None:
+            watchdog.callback_started(name)
+        started = time.perf_counter()
+        try:
+            return dispatch(self, *args)
+        finally:
+            metrics.record(name, time.perf_counter() - started)
+            depth.value -= 1
+            if outermost and watchdog is not None:
+                watchdog.callback_finished()
+
+    instrumented_call.__wrapped_by_instrumentation__ = True
+    tkinter.CallWrapper.__call__ = instrumented_call
+
+
+# Turn on library and UI instrumentation, writing the metrics to `export_path` at exit
+def enable(threshold=0.2, export_path=None):
+    import track_library
+    instrument_module(track_library, "lib")
+    watchdog = Watchdog(threshold)
+    watchdog.start()
+    instrument_tk(watchdog)
+    if export_path:
+        atexit.register(metrics.export, export_path)
+    return watchdog
+
+
+# Small window listing the collected metrics, refreshed every second
+def show_stats_window(parent):
+    import tkinter as tk
+    import tkinter.scrolledtext as tkst
+
+    window = tk.Toplevel(parent)
+    window.title("Performance Stats")
+    stats_txt = tkst.ScrolledText(window, width=80, height=20, wrap="none", font="TkFixedFont")
+    stats_txt.grid(row=0, column=0, padx=10, pady=10)
+
+    def refresh():
+        if not window.winfo_exists():
+            return
+        stats_txt.delete("1.0", tk.END)
+        stats_txt.insert(1.0, "\n".join(metrics.summary_lines()))
+        window.after(1000, refresh)
+
+    refresh()
+    return window
@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+import time
+
+
+# Append-only log of play events, one JSON object per line:
+#   {"key": "01", "ts": 1718000000.5, "source": "playlist"}
+#
+# Recording a play only appends to an in-memory buffer; the buffer is written
+# and fsynced once `batch_size` events are waiting or `flush_interval` seconds
+# have passed. Plays that are in the log but not yet folded into the stored
+# counts are kept in `pending`, so readers can add them on top of the stored
+# value. compact() hands those counts to `on_compact` and empties the log.
+# `on_compact` returns False when the counts only went into memory; the log is
+# then kept as it is, so the next start rebuilds every play from it.
+#
+# If the process dies between on_compact() and truncating the log, those plays
+# are folded in again on the next start, so counts are at-least-once.
+class PlayLog():
+    def __init__(self, path, on_compact, batch_size=256, flush_interval=1.0,
+                 compact_every=10000, compact_interval=300.0):
+        self.path = path
+        self.on_compact = on_compact          # Called with {key: plays} to fold into stored counts
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval  # Most seconds an event waits in memory
+        self.compact_every = compact_every    # Logged events that trigger a compaction
+        self.compact_interval = compact_interval  # Most seconds between compactions
+        self.pending = {}                     # key -> plays not yet folded into the store
+        self.logged = 0                       # Events in the log file since the last compaction
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._last_compact = self._last_flush
+        self.lock = threading.RLock()
+        self._replay()
+        self._file = open(path, "a", encoding="utf-8")
+
+    # Rebuild the pending counts from events left in the log by a previous run
+    def _replay(self):
+        try:
+            log_file = open(self.path, encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with log_file:
+            for line in log_file:
+                try:
+                    key = json.loads(line)["key"]
+                except (ValueError, KeyError, TypeError):
+                    continue  # Torn last line from a crash
+                self.pending[key] = self.pending.get(key, 0) + 1
+                self.logged += 1
+
+    def record(self, key, source=None, timestamp=None):
+        event = {"key": key, "ts": time.time() if timestamp is None else timestamp, "source": source}
+        with self.lock:
+            self._buffer.append(json.dumps(event, separators=(",", ":")) + "\n")
+            self.pending[key] = self.pending.get(key, 0) + 1
+            if (len(self._buffer) >= self.batch_size
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self.flush()
+
+    # Plays of `key` that are not in the stored count yet
+    def pending_plays(self, key):
+        return self.pending.get(key, 0)
+
+    # Write buffered events and fsync them in one go
+    def flush(self):
+        with self.lock:
+            self._last_flush = time.monotonic()
+            if not self._buffer:
+                return
+            self._write_buffer()
+            if (self.logged >= self.compact_every
+                    or self._last_flush - self._last_compact >= self.compact_interval):
+                self.compact()
+
+    def _write_buffer(self):
+        if self._buffer:
+            self._file.writelines(self._buffer)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.logged += len(self._buffer)
+            self._buffer = []
+
+    # Fold pending plays into the stored counts and start a new, empty log.
+    # Buffered events are written first: if the store turns out not to be
+    # durable, the log is all that keeps them.
+    def compact(self):
+        with self.lock:
+            self._write_buffer()
+            durable = True
+            if self.pending:
+                durable = self.on_compact(self.pending) is not False
+            self.pending = {}
+            self.logged = 0
+            self._last_compact = time.monotonic()
+            if not durable:
+                return  # Nothing else has these plays once the process exits
+            self._file.truncate(0)
+            self._file.seek(0)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self.lock:
+            if self._file.closed:
+                return
+            self.compact()
+            self._file.close()
@@ -0,0 +1,91 @@
+import os
+
+import track_library as lib  # Custom module for track management
+
+FILE_HEADER = "#jukebox-playlist 1"
+
+
+# Ordered collection of track keys with no duplicates.
+# Keys keep the order they were added in and can be read by position, while
+# membership checks use a set, so adding to a long playlist stays O(1).
+class Playlist():
+    def __init__(self, keys=()):
+        self._keys = []
+        self._members = set()
+        self.add_many(keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __getitem__(self, index):
+        return self._keys[index]
+
+    def __contains__(self, key):
+        return key in self._members
+
+    def keys(self):
+        return list(self._keys)
+
+    # Add one key, returning False if it was already in the playlist
+    def add(self, key):
+        if key in self._members:
+            return False
+        self._members.add(key)
+        self._keys.append(key)
+        return True
+
+    # Add several keys, returning the ones that were not in the playlist yet
+    def add_many(self, keys):
+        added = []
+        for key in keys:
+            if self.add(key):
+                added.append(key)
+        return added
+
+    # Add every library track numbered from `first` to `last`, e.g. ("01", "05").
+    # Returns the keys that were added.
+    def add_range(self, first, last):
+        start, stop = int(first), int(last)
+        if start > stop:
+            start, stop = stop, start
+        width = len(first)  # Keep the zero padding of the first key ("01" -> "02")
+        keys = (f"{number:0{width}d}" for number in range(start, stop + 1))
+        return self.add_many(key for key in keys if lib.get_name(key) is not None)
+
+    def remove(self, key):
+        self._members.remove(key)
+        self._keys.remove(key)
+
+    def clear(self):
+        self._keys = []
+        self._members = set()
+
+    # Write the playlist as a header line followed by one key per line.
+    # The file is replaced atomically so a crash never leaves half a playlist.
+    def save(self, path):
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8", newline="\n") as playlist_file:
+            playlist_file.write(FILE_HEADER + "\n")
+            playlist_file.writelines(f"{key}\n" for key in self._keys)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as playlist_file:
+            if playlist_file.readline().rstrip("\n") != FILE_HEADER:
+                raise ValueError(f"{path} is not a jukebox playlist")
+            return cls(line.rstrip("\n") for line in playlist_file if line.strip())
+
+
+# Turn "05" into ("05", "05") and "01-05" into ("01", "05"); None if not a key or range
+def parse_key_range(text):
+    first, dash, last = text.partition("-")
+    first, last = first.strip(), last.strip()
+    if not dash:
+        return (first, first) if first else None
+    if first.isdigit() and last.isdigit():
+        return first, last
+    return None
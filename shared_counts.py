@@ -0,0 +1,530 @@
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+
+from library_item import LibraryItem
+
+try:
+    import fcntl
+except ImportError:  # Windows: attaching processes are not serialized
+    fcntl = None
+
+# Segment layout. Everything after the header is native int64 words, since the
+# segment never leaves this host:
+#   header   magic, zones, ring size, track slots, key table bytes (padded to HEADER_BYTES)
+#   cursors  one per zone: how many changes that zone has written to its ring
+#   owners   one per zone: pid of the process running it, 0 when free
+#   used     track slots in use, then key table bytes in use
+#   rings    per zone, the last RING_SIZE changes as slot * 2 + kind, for other processes to pick up
+#   rows     per track: rating, play count when the track was added, then one play counter per zone
+#   keys     UTF-8 track keys, each followed by a NUL, in slot order
+#
+# Every word is written by one process only: a zone's counters, cursor and ring
+# belong to the process running that zone, so plays are counted without any
+# lock shared between processes, and a read adds the zones' counters up. The
+# rating is a single word where the last writer wins. The segment is created,
+# and its owner words, used words and spare slots changed, only while holding
+# the segment's lock file, when a zone is claimed or freed or a track is added.
+MAGIC = b"JUKESHM\x02"
+HEADER = struct.Struct("=8sIIQQ")
+HEADER_BYTES = 64
+WORD = struct.calcsize("q")
+DEFAULT_ZONES = 6      # rating + base count + 6 counters = 64 bytes, one cache line per track
+RING_SIZE = 4096       # Changes a zone can make between two poll_changes() calls of another zone
+ATTACH_TIMEOUT = 5.0   # Seconds to wait for another process to finish creating the segment
+SPARE_SLOTS = 1024     # Least room for tracks added after the segment was created
+SPARE_KEY_BYTES = 32   # Key table room per spare slot
+PLAYED, RATED = 0, 1
+
+
+def segment_words(zones, ring_size, slots):
+    return 2 * zones + 2 + zones * ring_size + slots * (zones + 2)
+
+
+# Zones this process has claimed, as (segment name, zone)
+_claimed = set()
+
+
+# Whether process `pid` is still running. Other platforms have no check that
+# leaves the process alone, so a zone stays taken until its owner frees it.
+def _alive(pid):
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # Running as another user
+        return True
+    return True
+
+
+def _lock_path(name):
+    return os.path.join(tempfile.gettempdir(), f"jukebox-shm-{name}.lock")
+
+
+# Remove the lock file along with the segment it belongs to
+def _remove_lock(name):
+    try:
+        os.remove(_lock_path(name))
+    except FileNotFoundError:
+        pass
+
+
+# Hold the lock of segment `name` against other processes. It is a file next to
+# the other temporary files, since the shared_memory API has no lock of its
+# own; the system drops it when its holder dies.
+@contextmanager
+def _locked(name):
+    if fcntl is None:
+        yield
+        return
+    with open(_lock_path(name), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+# Named segments outlive the process that created them: the zones come and go
+# independently, so the last one to exit must not take the counts with it.
+# Python would otherwise unlink the segment when its creator exits.
+def _keep_after_exit(segment):
+    if os.name == "posix":
+        resource_tracker.unregister(segment._name, "shared_memory")
+
+
+# Undo _keep_after_exit() before unlinking, which tells the resource tracker again
+def _unlink(segment):
+    if os.name == "posix":
+        resource_tracker.register(segment._name, "shared_memory")
+    segment.unlink()
+
+
+# Create the segment with a slot for each of `items`, plus `spare_slots` (by
+# default a quarter more, at least SPARE_SLOTS) for tracks added later
+def _create(name, items, zones, ring_size, spare_slots=None):
+    with _locked(name):
+        return _create_locked(name, items, zones, ring_size, spare_slots)
+
+
+def _create_locked(name, items, zones, ring_size, spare_slots):
+    keys = []
+    rows = []
+    for key, item in items:
+        keys.append(key)
+        rows.append((item.rating, item.play_count))
+    key_table = "".join(key + "\0" for key in keys).encode("utf-8")
+    if spare_slots is None:
+        spare_slots = max(SPARE_SLOTS, len(keys) // 4)
+    slots = len(keys) + spare_slots
+    key_capacity = len(key_table) + spare_slots * SPARE_KEY_BYTES
+    words_end = HEADER_BYTES + segment_words(zones, ring_size, slots) * WORD
+    segment = shared_memory.SharedMemory(name, create=True, size=words_end + key_capacity)
+    _keep_after_exit(segment)
+    try:
+        segment.buf[words_end:words_end + len(key_table)] = key_table
+        words = segment.buf[HEADER_BYTES:words_end].cast("q")
+        words[2 * zones] = len(keys)
+        words[2 * zones + 1] = len(key_table)
+        start = 2 * zones + 2 + zones * ring_size
+        width = zones + 2
+        for slot, (rating, play_count) in enumerate(rows):
+            words[start + slot * width] = rating
+            words[start + slot * width + 1] = play_count
+        words.release()
+        segment.buf[:HEADER.size] = HEADER.pack(bytes(len(MAGIC)), zones, ring_size, slots, key_capacity)
+    except BaseException:
+        segment.close()
+        _unlink(segment)
+        raise
+    # The magic goes in last: other processes wait for it before reading anything else
+    segment.buf[:len(MAGIC)] = MAGIC
+    return segment
+
+
+# Remove segment `name` if it never got its magic. Segments are created while
+# holding their lock, so once we hold it, one without a magic was left by a
+# creator that died. Returns True if the caller should try again: the segment
+# is gone or has been finished meanwhile. Segments of other programs are left
+# alone, and so are ones too small to map, which only --unlink removes.
+def _remove_unfinished(name):
+    if os.name != "posix":
+        return False  # Elsewhere a segment goes away with the last process that has it open
+    with _locked(name):
+        try:
+            segment = shared_memory.SharedMemory(name)
+        except FileNotFoundError:
+            return True
+        except ValueError:  # Not sized yet
+            return False
+        _keep_after_exit(segment)
+        magic = bytes(segment.buf[:len(MAGIC)])
+        if magic == bytes(len(MAGIC)):
+            segment.close()
+            _unlink(segment)
+            return True
+        segment.close()
+        return magic == MAGIC
+
+
+# Open segment `name` once its creator has written the magic. A segment still
+# without one after ATTACH_TIMEOUT is removed and FileNotFoundError raised, so
+# the caller creates it afresh.
+def _attach(name):
+    deadline = time.monotonic() + ATTACH_TIMEOUT
+    while True:
+        try:
+            segment = shared_memory.SharedMemory(name)
+        except ValueError:
+            segment = None  # Created but not sized yet
+        if segment is not None:
+            _keep_after_exit(segment)
+            if bytes(segment.buf[:len(MAGIC)]) == MAGIC:
+                return segment
+            segment.close()
+        if time.monotonic() > deadline:
+            if _remove_unfinished(name):
+                raise FileNotFoundError(f"shared memory {name!r} was never finished")
+            raise ValueError(f"shared memory {name!r} is not a jukebox play count segment")
+        time.sleep(0.01)
+
+
+# A track whose rating and play count live in the shared segment. Name and
+# artist stay in the wrapped library's item.
+class SharedTrack(LibraryItem):
+    def __init__(self, store, slot, item):
+        self._store = store
+        self._slot = slot
+        self._item = item
+
+    @property
+    def name(self):
+        return self._item.name
+
+    @name.setter
+    def name(self, value):
+        self._item.name = value
+
+    @property
+    def artist(self):
+        return self._item.artist
+
+    @artist.setter
+    def artist(self, value):
+        self._item.artist = value
+
+    @property
+    def rating(self):
+        return self._store.shared_rating(self._slot)
+
+    @rating.setter
+    def rating(self, value):
+        self._store.set_shared_rating(self._slot, value)
+
+    @property
+    def play_count(self):
+        return self._store.shared_play_count(self._slot)
+
+    # Setting a count adds the difference to this zone's counter. Plays made in
+    # other zones between reading and setting it are not lost, but can be
+    # counted twice; increment() has no such window.
+    @play_count.setter
+    def play_count(self, value):
+        self._store.add_plays(self._slot, value - self._store.shared_play_count(self._slot))
+
+
+# Wraps a library so ratings and play counts are shared by every jukebox
+# process on this host that opens the same segment `name`, each as its own
+# `zone` (0 to zones - 1, or None for the first free one). A zone belongs to
+# one process at a time: claiming one that a running process holds raises
+# ValueError, and close() frees it again. The first process creates the segment
+# from its library with room for more tracks, and tracks any process has that
+# are not in the segment yet, at attach or when added later, take one of the
+# spare slots. Once those run out, further tracks keep their counts in the
+# wrapped library only, with a RuntimeWarning and their keys in `unshared`.
+# The segment stays until unlink(), so close() copies the shared counts into
+# the wrapped library for persistent backends.
+class SharedCountsLibrary(MutableMapping):
+    zone = None
+
+    def __init__(self, base, name, zone=None, zones=DEFAULT_ZONES, ring_size=RING_SIZE, spare_slots=None):
+        self.base = base
+        self.name = name
+        while True:
+            try:
+                self.segment = _attach(name)
+                break
+            except FileNotFoundError:
+                try:
+                    self.segment = _create(name, base.items(), zones, ring_size, spare_slots)
+                    break
+                except FileExistsError:  # Another zone created it first
+                    continue
+        _, self.zones, self.ring_size, self.capacity, self.key_capacity = HEADER.unpack_from(self.segment.buf)
+        if zone is not None and not 0 <= zone < self.zones:
+            self.segment.close()
+            raise ValueError(f"zone must be between 0 and {self.zones - 1}")
+        self.keys_start = HEADER_BYTES + segment_words(self.zones, self.ring_size, self.capacity) * WORD
+        self.words = self.segment.buf[HEADER_BYTES:self.keys_start].cast("q")
+        self.owners_start = self.zones
+        self.used = 2 * self.zones  # Slots in use; the next word is key table bytes in use
+        self.rings_start = self.used + 2
+        self.rows_start = self.rings_start + self.zones * self.ring_size
+        self.width = self.zones + 2
+        self.keys = []
+        self.slots = {}
+        self.key_end = 0  # Key table bytes read into self.keys
+        self.unshared = set()
+        self.lock = threading.Lock()  # Threads of this process share the zone's words
+        try:
+            self.zone = self._claim(zone)
+            self._share(base)
+        except BaseException:
+            if self.zone is not None:
+                self._release()
+            self.words.release()
+            self.segment.close()
+            raise
+        self.seen = list(self.words[:self.zones])  # Cursor of each zone at the last poll_changes()
+
+    # Write this process's pid into the owner word of `zone`, or of the first
+    # free zone if it is None. A zone whose owner has exited is free again.
+    def _claim(self, zone):
+        pid = os.getpid()
+        with _locked(self.name):
+            for candidate in range(self.zones) if zone is None else [zone]:
+                owner = self.words[self.owners_start + candidate]
+                if owner == pid:
+                    taken = (self.name, candidate) in _claimed
+                else:
+                    taken = owner != 0 and _alive(owner)
+                if not taken:
+                    self.words[self.owners_start + candidate] = pid
+                    _claimed.add((self.name, candidate))
+                    return candidate
+        if zone is None:
+            raise ValueError(f"all {self.zones} zones of {self.name!r} are in use")
+        raise ValueError(f"zone {zone} of {self.name!r} is in use by process {owner}")
+
+    # Read the keys of tracks other processes have added since the last call
+    def _load_keys(self):
+        added = self.words[self.used] - len(self.keys)
+        if added <= 0:
+            return
+        # Key bytes are written before the slot count, so all `added` keys are there
+        table = bytes(self.segment.buf[self.keys_start + self.key_end:self.keys_start + self.words[self.used + 1]])
+        for key in table.split(b"\0")[:added]:
+            self.slots[key.decode("utf-8")] = len(self.keys)
+            self.keys.append(key.decode("utf-8"))
+            self.key_end += len(key) + 1
+
+    # Give the tracks among `keys` that are in the wrapped library but not in
+    # the segment a spare slot, starting from their current rating and play count
+    def _share(self, keys):
+        with self.lock, _locked(self.name):
+            self._load_keys()
+            for key in keys:
+                if key in self.slots or key in self.unshared:
+                    continue
+                try:
+                    item = self.base[key]
+                except KeyError:
+                    continue
+                encoded = key.encode("utf-8") + b"\0"
+                slot = len(self.keys)
+                if slot == self.capacity or self.key_end + len(encoded) > self.key_capacity:
+                    if not self.unshared:
+                        warnings.warn(f"shared counts {self.name!r} are full; new tracks are counted by this "
+                                      "process only", RuntimeWarning, stacklevel=3)
+                    self.unshared.add(key)
+                    continue
+                self.words[self.rows_start + slot * self.width] = item.rating
+                self.words[self.rows_start + slot * self.width + 1] = item.play_count
+                self.segment.buf[self.keys_start + self.key_end:self.keys_start + self.key_end + len(encoded)] = encoded
+                self.key_end += len(encoded)
+                self.words[self.used + 1] = self.key_end
+                self.words[self.used] = slot + 1  # Publishes the slot
+                self.slots[key] = slot
+                self.keys.append(key)
+
+    def _release(self):
+        with _locked(self.name):
+            if self.words[self.owners_start + self.zone] == os.getpid():
+                self.words[self.owners_start + self.zone] = 0
+        _claimed.discard((self.name, self.zone))
+
+    def __getitem__(self, key):
+        item = self.base[key]
+        slot = self.slots.get(key)
+        return item if slot is None else SharedTrack(self, slot, item)
+
+    def __setitem__(self, key, item):
+        self.base[key] = item
+        slot = self.slots.get(key)
+        if slot is None:
+            self._share([key])
+        else:
+            self.set_shared_rating(slot, item.rating)
+            self.add_plays(slot, item.play_count - self.shared_play_count(slot))
+
+    def __delitem__(self, key):
+        del self.base[key]
+
+    def __contains__(self, key):
+        return key in self.base
+
+    def __iter__(self):
+        return iter(self.base)
+
+    def __len__(self):
+        return len(self.base)
+
+    # Insert (key, item) pairs whose key is not stored yet, returning how many were added
+    def add_many(self, items):
+        items = list(items)
+        add_many = getattr(self.base, "add_many", None)
+        if add_many is not None:
+            added = add_many(items)
+        else:
+            added = 0
+            for key, item in items:
+                if key not in self.base:
+                    self.base[key] = item
+                    added += 1
+        self._share(key for key, _ in items)
+        return added
+
+    def shared_rating(self, slot):
+        return self.words[self.rows_start + slot * self.width]
+
+    def set_shared_rating(self, slot, rating):
+        with self.lock:
+            self.words[self.rows_start + slot * self.width] = rating
+            self._log(slot, RATED)
+
+    def shared_play_count(self, slot):
+        start = self.rows_start + slot * self.width + 1
+        return sum(self.words[start:start + self.zones + 1])
+
+    def add_plays(self, slot, plays):
+        with self.lock:
+            self.words[self.rows_start + slot * self.width + 2 + self.zone] += plays
+            self._log(slot, PLAYED)
+
+    # Count one play of `key` in the segment; used by track_library.increment_play_count().
+    # Returns False if the track is not in the library or has no shared slot,
+    # which track_library then counts in the wrapped library's item.
+    def increment(self, key):
+        slot = self.slots.get(key)
+        if slot is None or key not in self.base:
+            return False
+        self.add_plays(slot, 1)
+        return True
+
+    # Append a change to this zone's ring. The entry is written before the cursor
+    # moves past it, so a reader that sees the new cursor finds the entry too.
+    def _log(self, slot, kind):
+        cursor = self.words[self.zone]
+        self.words[self.rings_start + self.zone * self.ring_size + cursor % self.ring_size] = slot * 2 + kind
+        self.words[self.zone] = cursor + 1
+
+    # Changes other zones made since the last call: (played keys, rated keys,
+    # overflowed). Overflowed means a zone made more than ring_size changes in
+    # between, so some are missing and everything should be re-read.
+    def poll_changes(self):
+        played, rated = set(), set()
+        overflowed = False
+        for zone in range(self.zones):
+            if zone == self.zone:
+                continue
+            seen = self.seen[zone]
+            cursor = self.words[zone]
+            if cursor == seen:
+                continue
+            ring_start = self.rings_start + zone * self.ring_size
+            for position in range(max(seen, cursor - self.ring_size), cursor):
+                entry = self.words[ring_start + position % self.ring_size]
+                if entry >> 1 >= len(self.keys):  # A track another zone has added since
+                    with self.lock:
+                        self._load_keys()
+                (rated if entry & 1 else played).add(self.keys[entry >> 1])
+            if self.words[zone] - seen > self.ring_size:  # Lapped, possibly while we were reading
+                overflowed = True
+            self.seen[zone] = cursor
+        return played, rated, overflowed
+
+    # Copy the shared ratings and play counts into the wrapped library's items
+    def save(self):
+        for key, slot in self.slots.items():
+            try:
+                item = self.base[key]
+            except KeyError:
+                continue
+            rating, play_count = self.shared_rating(slot), self.shared_play_count(slot)
+            if item.rating != rating:
+                item.rating = rating
+            if item.play_count != play_count:
+                item.play_count = play_count
+
+    # Returns True: the segment outlives this process, so counts in it are kept
+    # even when the wrapped library only lives in memory
+    def flush(self):
+        flush = getattr(self.base, "flush", None)
+        if flush is not None:
+            flush()
+        return True
+
+    # Save the counts into a persistent wrapped library, free the zone and
+    # detach from the segment
+    def close(self):
+        if self.words is None:
+            return
+        if hasattr(self.base, "path"):
+            self.save()
+            self.flush()
+        self._release()
+        self.words.release()
+        self.words = None
+        self.segment.close()
+
+    # Remove the segment; processes still attached keep their mapping until they close
+    def unlink(self):
+        _unlink(self.segment)
+        _remove_lock(self.name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or remove a shared play count segment.")
+    parser.add_argument("name", help="segment name, as given in JUKEBOX_SHARED_COUNTS")
+    parser.add_argument("--unlink", action="store_true", help="remove the segment")
+    args = parser.parse_args(argv)
+
+    try:
+        segment = _attach(args.name)
+    except FileNotFoundError:
+        print(f"No shared play counts named {args.name}")
+        return 1
+    magic, zones, ring_size, slots, _ = HEADER.unpack_from(segment.buf)
+    words = segment.buf[HEADER_BYTES:HEADER_BYTES + segment_words(zones, ring_size, slots) * WORD].cast("q")
+    print(f"{words[2 * zones]} of {slots} track slots used, {zones} zones")
+    for zone in range(zones):
+        owner = words[zones + zone]
+        print(f"  zone {zone}: {words[zone]} changes, " + (f"process {owner}" if owner else "free"))
+    words.release()
+    segment.close()
+    if args.unlink:
+        _unlink(segment)
+        _remove_lock(args.name)
+        print(f"Removed {args.name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
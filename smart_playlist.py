@@ -0,0 +1,138 @@
+import threading
+
+import numpy as np
+
+import track_events
+import track_library as lib
+
+# Default scoring: weight = (rating + 1) ** RATING_POWER / (play_count + 1) ** PLAY_PENALTY,
+# so a 5-star track is picked far more often than a 1-star one, and a track
+# that has been played a lot gives way to ones that have not
+RATING_POWER = 2.0
+PLAY_PENALTY = 0.5
+
+
+# Ratings and play counts of every track as NumPy arrays, in library order.
+# Built on first use and patched in place by the library's change events,
+# so generating a playlist never has to walk the library again.
+class TrackArrays():
+    def __init__(self):
+        self.keys = []
+        self.positions = {}  # key -> index into the arrays
+        self.ratings = np.zeros(0, dtype=np.int16)
+        self.play_counts = np.zeros(0, dtype=np.int64)
+        self.built = False
+        self.lock = threading.Lock()
+
+    # track_events listener
+    def event(self, kind, keys):
+        if not self.built:
+            return
+        with self.lock:
+            if kind in (track_events.TRACKS_ADDED, track_events.LIBRARY_RESET):
+                self.built = False  # Rebuilt by the next current() call
+                return
+            for key in keys:
+                position = self.positions.get(key)
+                if position is not None:
+                    self.ratings[position] = lib.get_rating(key)
+                    self.play_counts[position] = lib.get_play_count(key)
+
+    # (keys, positions, ratings, play_counts), building them if needed. Callers must not modify them.
+    def current(self):
+        with self.lock:
+            if not self.built:
+                self.build()
+            return self.keys, self.positions, self.ratings, self.play_counts
+
+    def build(self):
+        self.built = True  # Changes made while reading the library are applied after the lock is released
+        library = lib.library
+        if hasattr(library, "keys_by_row") and hasattr(library, "ratings"):
+            # ColumnarLibrary keeps typed arrays already; copy them without touching any track
+            keys_by_row = list(library.keys_by_row)  # Columns are appended first, so they cover these rows
+            # Copied at once: an array exporting its buffer cannot grow, which would fail add_tracks()
+            ratings = np.frombuffer(library.ratings, dtype=np.int8)[:len(keys_by_row)].astype(np.int16)
+            play_counts = np.frombuffer(library.play_counts, dtype=np.int64)[:len(keys_by_row)].copy()
+            if None not in keys_by_row:  # No deleted rows, so row numbers are positions
+                self.keys = keys_by_row
+                self.positions = {key: position for position, key in enumerate(keys_by_row)}
+                self.ratings = ratings
+                self.play_counts = play_counts
+            else:
+                live = np.fromiter((key is not None for key in keys_by_row), dtype=bool, count=len(keys_by_row))
+                self.keys = [key for key in keys_by_row if key is not None]
+                self.positions = {key: position for position, key in enumerate(self.keys)}
+                self.ratings = ratings[live]
+                self.play_counts = play_counts[live]
+        else:
+            self.keys = list(lib.snapshot_keys())
+            items = [library.get(key) for key in self.keys]
+            self.ratings = np.fromiter((item.rating if item is not None else 0 for item in items),
+                                       dtype=np.int16, count=len(items))
+            self.play_counts = np.fromiter((item.play_count if item is not None else 0 for item in items),
+                                           dtype=np.int64, count=len(items))
+            self.positions = {key: position for position, key in enumerate(self.keys)}
+        if lib.play_log is not None:  # Plays still in the log are not in the stored counts yet
+            with lib.play_log.lock:
+                for key, plays in lib.play_log.pending.items():
+                    position = self.positions.get(key)
+                    if position is not None:
+                        self.play_counts[position] += plays
+
+
+arrays = TrackArrays()
+lib.subscribe(arrays.event)
+
+
+# Sampling weight of every track; tracks rated below `min_rating` get 0 and are never picked
+def track_weights(ratings, play_counts, rating_power=RATING_POWER, play_penalty=PLAY_PENALTY, min_rating=0):
+    weights = (ratings.clip(0) + 1.0) ** rating_power / (play_counts.clip(0) + 1.0) ** play_penalty
+    weights[ratings < min_rating] = 0.0
+    return weights
+
+
+# Positions of `count` items drawn without replacement with probability
+# proportional to `weights`, in the order they were drawn. Each item gets the
+# key log(u) / weight for a uniform u (Efraimidis-Spirakis), and the largest
+# keys win, which is one vectorized pass instead of `count` dependent draws.
+def weighted_sample(weights, count, rng):
+    candidates = np.flatnonzero(weights > 0)
+    count = min(count, len(candidates))
+    if count <= 0:
+        return candidates[:0]
+    every_item = len(candidates) == len(weights)
+    if not every_item:
+        weights = weights[candidates]
+    scores = np.log(rng.random(len(weights))) / weights
+    best = np.argpartition(scores, len(scores) - count)[len(scores) - count:]
+    best = best[np.argsort(scores[best])[::-1]]
+    return best if every_item else candidates[best]
+
+
+# Keys of `count` tracks favouring high ratings and few plays, leaving out
+# `exclude` and, unless told otherwise, the most recently played tracks
+def smart_playlist(count, rating_power=RATING_POWER, play_penalty=PLAY_PENALTY, min_rating=0, exclude=(),
+                   exclude_recent=True, seed=None):
+    keys, positions, ratings, play_counts = arrays.current()
+    weights = track_weights(ratings, play_counts, rating_power, play_penalty, min_rating)
+    excluded = set(exclude)
+    if exclude_recent:
+        excluded.update(lib.recently_played())
+    excluded_positions = [positions[key] for key in excluded if key in positions]
+    weights[excluded_positions] = 0.0
+    return [keys[position] for position in weighted_sample(weights, count, np.random.default_rng(seed))]
+
+
+# `keys` in a random order where well rated, rarely played tracks tend to come first.
+# Keys that are not in the library go last.
+def weighted_shuffle(keys, rating_power=RATING_POWER, play_penalty=PLAY_PENALTY, seed=None):
+    _, positions, ratings, play_counts = arrays.current()
+    keys = list(keys)
+    found = [key for key in keys if key in positions]
+    missing = [key for key in keys if key not in positions]
+    rows = np.fromiter((positions[key] for key in found), dtype=np.int64, count=len(found))
+    weights = track_weights(ratings[rows], play_counts[rows], rating_power, play_penalty)
+    weights[weights <= 0] = np.finfo(float).tiny  # Shuffle everything, however low its weight
+    order = weighted_sample(weights, len(found), np.random.default_rng(seed))
+    return [found[position] for position in order] + missing
@@ -0,0 +1,18 @@
+import threading
+
+
+# A fixed set of locks shared out by key hash. Operations on different keys
+# rarely contend, while the lock count stays bounded however many keys exist.
+class StripedLock():
+    def __init__(self, stripes=64):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    # The lock guarding `key`; use it as `with stripes.lock_for(key): ...`
+    def lock_for(self, key):
+        return self._locks[hash(key) % len(self._locks)]
+
+    # Every lock guarding any of `keys`, in a fixed order, so bulk updates that
+    # take them all can never deadlock with each other or with single-key updates
+    def locks_for(self, keys):
+        stripes = sorted({hash(key) % len(self._locks) for key in keys})
+        return [self._locks[stripe] for stripe in stripes]
@@ -0,0 +1,83 @@
+import csv
+import os
+import random
+
+from library_item import LibraryItem
+
+WORDS = ["love", "night", "fire", "heart", "blue", "dance", "rain", "golden", "wild", "dream",
+         "summer", "city", "lights", "river", "shadow", "midnight", "electric", "sweet", "lonely",
+         "paradise", "thunder", "velvet", "echo", "storm", "silver", "highway", "ocean", "glass"]
+FIRST_NAMES = ["Ada", "Ben", "Cleo", "Dev", "Eli", "Fay", "Gus", "Hana", "Ivo", "Jun", "Kai", "Lena"]
+BANDS = ["Band", "Collective", "Orchestra", "Trio", "Crew", "Project", "Sound System"]
+
+
+# Width of the zero-padded keys for a library of `count` tracks ("01".."10" for 10)
+def key_width(count):
+    return max(2, len(str(count)))
+
+
+def track_key(number, width):
+    return f"{number:0{width}d}"
+
+
+# Yield (key, name, artist, rating, play_count) rows that look like a real catalogue.
+# The same seed always gives the same rows. About one artist per 20 tracks, so
+# artist lookups and interning behave like a real library.
+def synthetic_rows(count, seed=0, start=1):
+    rng = random.Random(seed)
+    width = key_width(start + count - 1)
+    artist_count = max(1, count // 20)
+    for number in range(start, start + count):
+        name = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title()
+        artist_id = rng.randrange(artist_count)
+        artist = f"{FIRST_NAMES[artist_id % len(FIRST_NAMES)]} {BANDS[artist_id % len(BANDS)]} {artist_id}"
+        yield track_key(number, width), name, artist, rng.randint(1, 5), rng.randint(0, 500)
+
+
+# Yield (key, LibraryItem) pairs, ready for track_library.add_tracks()
+def synthetic_tracks(count, seed=0, start=1, item_class=LibraryItem):
+    for key, name, artist, rating, play_count in synthetic_rows(count, seed, start):
+        item = item_class(name, artist, rating)
+        item.play_count = play_count
+        yield key, item
+
+
+def build_library(count, seed=0):
+    return dict(synthetic_tracks(count, seed))
+
+
+# Write a CSV in the same format as new_tracks.csv, streaming so any size fits in memory.
+# Every `bad_every`-th row gets an unquoted comma in its name, like the
+# "Good Luck, Babe" row, so importers see realistic malformed rows.
+def write_csv(path, count, seed=0, start=1, bad_every=0):
+    with open(path, "w", newline="", encoding="utf-8") as data_file:
+        data_file.write("track_key,name,artist,rating,play_count\r\n")
+        writer = csv.writer(data_file)
+        for n, (key, name, artist, rating, play_count) in enumerate(synthetic_rows(count, seed, start), 1):
+            if bad_every and n % bad_every == 0:
+                data_file.write(f"{key},{name}, {artist},{rating},{play_count}\r\n")
+            else:
+                writer.writerow([key, name, artist, rating, play_count])
+    return path
+
+
+# Write `count` JPEG covers named like photos/01.jpg, with sizes varying between
+# min_size and max_size pixels square like the real covers do
+def write_covers(folder, count, seed=0, min_size=300, max_size=1500):
+    from PIL import Image, ImageDraw  # Only needed when generating covers
+
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    width = key_width(count)
+    paths = []
+    for number in range(1, count + 1):
+        size = rng.randint(min_size, max_size)
+        img = Image.new("RGB", (size, size), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(img)
+        for _ in range(20):  # Some shapes so the JPEG is not trivially compressible
+            x, y = rng.randrange(size), rng.randrange(size)
+            draw.ellipse((x, y, x + size // 4, y + size // 4), fill=tuple(rng.randrange(256) for _ in range(3)))
+        path = os.path.join(folder, f"{track_key(number, width)}.jpg")
+        img.save(path, "JPEG", quality=90)
+        paths.append(path)
+    return paths
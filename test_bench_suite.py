@@ -0,0 +1,62 @@
+import csv
+
+import pytest
+
+import bench_suite
+import synthetic_library
+import track_library as lib
+import track_importer
+
+
+@pytest.fixture(autouse=True)
+def restore_library():
+    saved = dict(lib.library)
+    yield
+    lib.library.clear()
+    lib.library.update(saved)
+    lib.library_changed()
+
+
+def test_synthetic_library_is_reproducible(tmp_path, capsys):
+    first = synthetic_library.build_library(50, seed=3)
+    second = synthetic_library.build_library(50, seed=3)
+
+    assert list(first) == [f"{n:02d}" for n in range(1, 51)]
+    assert [item.info() for item in first.values()] == [item.info() for item in second.values()]
+    assert all(1 <= item.rating <= 5 for item in first.values())
+
+    path = synthetic_library.write_csv(tmp_path / "tracks.csv", 20, start=1001, bad_every=5)
+    with open(path, newline="") as data_file:
+        assert len(list(csv.reader(data_file))) == 21
+    result = track_importer.import_csv(path)
+    assert (result.added, len(result.errors)) == (16, 4)
+
+    with capsys.disabled():
+        print(" tested synthetic_library successfully")
+
+
+def test_bench_suite_reports_stats_and_regressions(capsys):
+    saved = lib.library
+    results = bench_suite.run_suite([10], selected={"set_rating", "list_all"}, log=lambda line: None)
+
+    assert lib.library is saved
+    assert set(results["10"]) == {"set_rating", "list_all"}
+    stats = results["10"]["set_rating"]
+    assert stats["p50_us"] <= stats["p95_us"] <= stats["p99_us"] <= stats["max_us"]
+    assert stats["ops_per_sec"] > 0
+
+    old = {"results": {"10": {"list_all": {"p50_us": 1.0}}}}
+    new = {"results": {"10": {"list_all": {"p50_us": 2.0}, "search": {"p50_us": 5.0}}}}
+    assert bench_suite.find_regressions(old, new) == ["10 list_all: p50 1.0 us -> 2.0 us"]
+
+    with capsys.disabled():
+        print(" tested bench_suite successfully")
+
+
+def test_benchmark_files_are_removed(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(bench_suite.tempfile, "tempdir", str(tmp_path))
+    selected = {benchmark.name for benchmark in bench_suite.BENCHMARKS if benchmark.scratch}
+    bench_suite.run_suite([10], selected=selected, log=lambda line: None)
+    assert list(tmp_path.iterdir()) == []
+    with capsys.disabled():
+        print(" tested bench_suite cleanup successfully")
@@ -0,0 +1,92 @@
+import pytest
+
+import catalog_ingest
+import track_library as lib
+from library_item import LibraryItem
+
+HEADER = "track_key,name,artist,rating,play_count\r\n"
+
+
+@pytest.fixture(autouse=True)
+def restore_library():
+    saved = lib.library
+    lib.library = {key: LibraryItem(item.name, item.artist, item.rating) for key, item in saved.items()}
+    lib.library_changed()
+    yield
+    lib.library = saved
+    lib.library_changed()
+
+
+def write_catalog(folder):
+    (folder / "b_week2.csv").write_text(HEADER + "".join(f"{line}\r\n" for line in [
+        "20,Birds of a Feather,Billie Eilish,1,0",
+        "21,Stayin Alive,BEE GEES,5,0",
+        "17,Good Luck, Babe Chappell Roan,1,0",
+        "22,Pink Pony Club,Chappell Roan,4,0",
+    ]))
+    (folder / "a_week1.csv").write_text(HEADER + "".join(f"{line}\r\n" for line in [
+        "11,Espresso,Sabrina Carpenter,1,0",
+        "13,BIRDS OF A FEATHER,Billie Eilish,2,0",
+        "01,Taken Key,Someone,3,0",
+    ]))
+    (folder / "notes.txt").write_text("not a catalog")
+
+
+def test_unreadable_file_is_rejected_and_the_rest_ingested(tmp_path, capsys):
+    (tmp_path / "a_bad.csv").write_bytes((HEADER + "30,Good Row,Band,3,0\r\n").encode() + b"31,Bad \xff,Band,3,0\r\n")
+    (tmp_path / "b_good.csv").write_text(HEADER + "32,Other File,Band,4,0\r\n")
+    result = catalog_ingest.ingest_directory(tmp_path, workers=0)
+    assert (lib.get_name("30"), lib.get_name("32"), lib.get_name("31")) == ("Good Row", "Other File", None)
+    assert [(reject.path.endswith("a_bad.csv"), reject.line) for reject in result.rejects] == [(True, 3)]
+    assert "not read past here" in result.rejects[0].reason
+    with capsys.disabled():
+        print(" tested ingesting an undecodable file successfully")
+
+
+def test_fingerprint_ignores_case_accents_and_punctuation(capsys):
+    fingerprint = catalog_ingest.track_fingerprint
+    assert fingerprint("BIRDS OF A FEATHER", "Billie Eilish") == fingerprint("Birds of a Feather ", "billie  eilish")
+    assert fingerprint("Stayin' Alive", "Bee Gees") == fingerprint("Stayin Alive", "BEE GEES")
+    assert fingerprint("Hello", "Adele") != fingerprint("Hello", "Lionel Richie")
+    assert fingerprint("Группа крови", "Кино") != fingerprint("Звезда по имени Солнце", "Кино")
+    assert fingerprint("アイドル", "YOASOBI") != fingerprint("夜に駆ける", "YOASOBI")
+    assert fingerprint("ГРУППА КРОВИ", "кино") == fingerprint("Группа крови", "Кино")
+    assert fingerprint("!!!", "Chk Chk Chk") != fingerprint("???", "Chk Chk Chk")
+
+    with capsys.disabled():
+        print(" tested track_fingerprint() successfully")
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_ingest_directory_merges_files_in_order(tmp_path, workers, capsys):
+    write_catalog(tmp_path)
+    result = catalog_ingest.ingest_directory(tmp_path, workers=workers)
+
+    assert (result.files, result.rows, result.added, result.duplicates) == (2, 7, 3, 3)
+    assert [str(reject) for reject in result.rejects[:3]] == [
+        "a_week1.csv line 4: track 01 already exists",
+        "b_week2.csv line 2: duplicate of track 13",
+        "b_week2.csv line 3: duplicate of track 02",
+    ]
+    assert (result.rejects[3].line, result.rejects[3].key) == (4, "17")
+    assert "starts with a space" in result.rejects[3].reason
+    assert lib.get_name("13") == "BIRDS OF A FEATHER"
+    assert lib.get_name("20") is None and lib.get_name("22") == "Pink Pony Club"
+
+    report = tmp_path / "rejects.csv"
+    catalog_ingest.write_report(report, result.rejects)
+    assert len(report.read_text().splitlines()) == 5
+
+    with capsys.disabled():
+        print(f" tested ingest_directory() with {workers} workers successfully")
+
+
+def test_dry_run_leaves_library_alone(tmp_path, capsys):
+    write_catalog(tmp_path)
+    result = catalog_ingest.ingest_directory(tmp_path, workers=0, dry_run=True)
+
+    assert result.added == 3
+    assert lib.get_name("11") is None
+
+    with capsys.disabled():
+        print(" tested ingest_directory() dry run successfully")
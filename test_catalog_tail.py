@@ -0,0 +1,134 @@
+import pytest
+
+import track_library as lib
+import catalog_tail
+
+HEADER = "track_key,name,artist,rating,play_count\r\n"
+
+
+@pytest.fixture(autouse=True)
+def restore_library():
+    saved_library = lib.library
+    saved_tracks = dict(lib.library)
+    yield
+    if hasattr(lib.library, "close"):
+        lib.library.close()
+    lib.library = saved_library
+    lib.library.clear()
+    lib.library.update(saved_tracks)
+    lib.library_changed()
+    catalog_tail._memory_checkpoints.clear()
+
+
+def rows(first, last):
+    return "".join(f"{key},Song {key},Band {key},3,0\r\n" for key in range(first, last + 1))
+
+
+def test_only_appended_rows_are_parsed(tmp_path, capsys):
+    path = tmp_path / "tracks.csv"
+    path.write_text(HEADER + rows(100, 104))
+    result, plan = catalog_tail.ingest_new_rows(path)
+    assert (result.rows, result.added, plan.resync) == (5, 5, False)
+
+    with open(path, "a") as data_file:
+        data_file.write(rows(105, 106) + "107,Bad,Band,nine,0\r\n")
+    result, plan = catalog_tail.ingest_new_rows(path)
+    assert (result.rows, result.added, result.duplicates) == (3, 2, 0)  # Rows 100-104 were not read again
+    assert [error.line for error in result.errors] == [9]  # Line numbers count the rows skipped over
+    assert lib.get_name("106") == "Song 106"
+
+    result, plan = catalog_tail.ingest_new_rows(path)
+    assert plan.is_empty() and result.rows == 0
+    with capsys.disabled():
+        print(" tested incremental ingest successfully")
+
+
+def test_partial_last_row_waits_for_its_newline(tmp_path, capsys):
+    path = tmp_path / "tracks.csv"
+    path.write_text(HEADER + rows(100, 101) + "102,Half")
+    result, _ = catalog_tail.ingest_new_rows(path)
+    assert (result.rows, result.added, result.errors) == (2, 2, [])
+
+    with open(path, "a") as data_file:
+        data_file.write(" Written,Band,4,0\r\n")
+    result, _ = catalog_tail.ingest_new_rows(path)
+    assert (result.rows, result.added) == (1, 1)
+    assert lib.get_name("102") == "Half Written"
+    with capsys.disabled():
+        print(" tested partial row handling successfully")
+
+
+def test_rewritten_file_is_synced_again(tmp_path, capsys):
+    path = tmp_path / "tracks.csv"
+    path.write_text(HEADER + rows(100, 103))
+    catalog_tail.ingest_new_rows(path)
+
+    path.write_text(HEADER + "099,New First,Band,2,0\r\n" + rows(100, 104))  # Upstream regenerated the file
+    result, plan = catalog_tail.ingest_new_rows(path)
+    assert plan.resync
+    assert (result.rows, result.added, result.duplicates) == (6, 2, 4)
+    assert lib.get_name("099") == "New First" and lib.get_name("104") == "Song 104"
+
+    path.write_text(HEADER + rows(100, 101))  # Shorter than the checkpoint
+    assert catalog_tail.plan_ingest(path).resync
+    with capsys.disabled():
+        print(" tested re-sync of a rewritten file successfully")
+
+
+def test_database_library_keeps_its_checkpoint_on_disk(tmp_path, capsys):
+    path = tmp_path / "tracks.csv"
+    path.write_text(HEADER + rows(100, 102))
+    built_in = lib.library
+    lib.use_database(str(tmp_path / "library.db"))
+    catalog_tail.ingest_new_rows(path)
+    lib.library.close()
+
+    assert (tmp_path / "tracks.csv.checkpoint").exists()
+    lib.library = built_in
+    lib.use_database(str(tmp_path / "library.db"))  # A restarted jukebox picks up where it left off
+    with open(path, "a") as data_file:
+        data_file.write(rows(103, 103))
+    result, plan = catalog_tail.ingest_new_rows(path)
+    assert (plan.first_line, result.rows, result.added) == (4, 1, 1)
+
+    lib.library.close()
+    lib.library = built_in
+    lib.use_database(str(tmp_path / "other.db"))  # Another library has not seen the file yet
+    assert catalog_tail.plan_ingest(path).start == 0
+    with capsys.disabled():
+        print(" tested persistent checkpoints successfully")
+
+
+def test_watcher_ingests_new_rows(tmp_path, capsys):
+    path = tmp_path / "tracks.csv"
+    path.write_text(HEADER + rows(100, 100))
+    seen = []
+    watcher = catalog_tail.CsvWatcher(path, on_result=lambda result, plan: seen.append(result.added))
+    watcher.check()
+    watcher.check()  # Unchanged file: nothing to do
+    with open(path, "a") as data_file:
+        data_file.write(rows(101, 102))
+    watcher.check()
+    assert seen == [1, 2]
+    assert lib.get_name("102") == "Song 102"
+    with capsys.disabled():
+        print(" tested CSV watcher successfully")
+
+
+def test_watcher_survives_undecodable_rows(tmp_path, capsys):
+    path = tmp_path / "tracks.csv"
+    path.write_text(HEADER + rows(100, 100))
+    errors = []
+    watcher = catalog_tail.CsvWatcher(path, on_error=errors.append)
+    watcher.check()
+    with open(path, "ab") as data_file:
+        data_file.write(b"101,Bad \xff,Band,3,0\r\n")
+    watcher.check()
+    assert [type(error) for error in errors] == [UnicodeDecodeError]
+
+    with open(path, "ab") as data_file:  # The upstream fixes nothing, but more rows arrive
+        data_file.write(rows(102, 102).encode("ascii"))
+    watcher.check()
+    assert len(errors) == 2 and lib.get_name("102") is None  # Still stuck at the bad row, not skipping it
+    with capsys.disabled():
+        print(" tested CSV watcher error handling successfully")
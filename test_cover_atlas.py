@@ -0,0 +1,71 @@
+import io
+import os
+
+import pytest
+
+pytest.importorskip("PIL")
+from PIL import Image
+
+import synthetic_library
+from cover_atlas import CoverAtlas, build_atlas
+
+
+def test_build_atlas_and_read_thumbnails(tmp_path, capsys):
+    synthetic_library.write_covers(tmp_path, 6, seed=1, min_size=100, max_size=600)
+
+    assert build_atlas(tmp_path, size=(40, 30), workers=2) == {"built": 6, "kept": 0, "removed": 0, "failed": []}
+    atlas = CoverAtlas(tmp_path)
+    assert len(atlas) == 6
+    with Image.open(io.BytesIO(atlas.ppm("03.jpg"))) as thumbnail:
+        assert thumbnail.size == (40, 30)
+        expected = Image.open(tmp_path / "03.jpg").convert("RGB").resize((40, 30))
+        assert abs(thumbnail.getpixel((20, 15))[0] - expected.getpixel((20, 15))[0]) < 40
+    assert atlas.ppm("99.jpg") is None
+    atlas.close()
+
+    with capsys.disabled():
+        print(" tested build_atlas() and CoverAtlas successfully")
+
+
+def test_atlas_rebuilds_only_changed_covers(tmp_path, capsys):
+    synthetic_library.write_covers(tmp_path, 4, seed=2, min_size=100, max_size=300)
+    build_atlas(tmp_path, size=(32, 32), workers=0)
+    atlas_size = os.path.getsize(tmp_path / "covers.atlas")
+
+    stat = os.stat(tmp_path / "02.jpg")
+    os.utime(tmp_path / "02.jpg", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert CoverAtlas(tmp_path).ppm("02.jpg") is None  # Stale until rebuilt
+    os.remove(tmp_path / "04.jpg")
+    (tmp_path / "05.jpg").write_bytes((tmp_path / "01.jpg").read_bytes())
+    (tmp_path / "06.jpg").write_bytes(b"not a jpeg")
+
+    stats = build_atlas(tmp_path, size=(32, 32), workers=0)
+    assert (stats["built"], stats["kept"], stats["removed"]) == (2, 2, 1)
+    assert stats["failed"] == [os.path.join(tmp_path, "06.jpg")]
+    assert os.path.getsize(tmp_path / "covers.atlas") == atlas_size  # 05 reused the slot 04 left
+    atlas = CoverAtlas(tmp_path)
+    assert atlas.ppm("02.jpg") is not None and atlas.ppm("04.jpg") is None and atlas.ppm("06.jpg") is None
+    assert atlas.ppm("05.jpg") == atlas.ppm("01.jpg")
+    atlas.close()
+
+    with capsys.disabled():
+        print(" tested incremental atlas rebuilds successfully")
+
+
+def test_open_atlas_survives_a_rebuild_at_a_new_size(tmp_path, capsys):
+    synthetic_library.write_covers(tmp_path, 3, seed=3, min_size=100, max_size=300)
+    build_atlas(tmp_path, size=(32, 32), workers=0)
+    atlas = CoverAtlas(tmp_path)
+    old = atlas.ppm("01.jpg")
+    assert atlas.refresh() is False
+
+    build_atlas(tmp_path, size=(16, 8), workers=0)
+    assert atlas.ppm("01.jpg") == old  # Still reads the old mapping, not a truncated file
+    assert not os.path.exists(tmp_path / "covers.atlas.tmp")
+    assert atlas.refresh() is True
+    with Image.open(io.BytesIO(atlas.ppm("01.jpg"))) as thumbnail:
+        assert thumbnail.size == (16, 8)
+    atlas.close()
+
+    with capsys.disabled():
+        print(" tested remapping a rebuilt atlas successfully")
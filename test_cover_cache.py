@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+pytest.importorskip("PIL")
+from PIL import Image
+
+from cover_cache import CoverCache, neighbour_cover_paths
+
+
+def make_cover(path, colour, size=(800, 600)):
+    Image.new("RGB", size, colour).save(path, "JPEG")
+    return str(path)
+
+
+def test_cover_cache_resizes_and_evicts_least_recently_used(tmp_path, capsys):
+    paths = [make_cover(tmp_path / f"{n}.jpg", "red") for n in range(3)]
+    cache = CoverCache(max_items=2)
+
+    assert cache.get(paths[0]).size == (200, 200)
+    assert cache.get(paths[0]) is cache.get(paths[0])
+    cache.get(paths[1])
+    cache.get(paths[0])
+    cache.get(paths[2])  # Evicts paths[1], the least recently used
+
+    assert len(cache) == 2
+    misses = cache.misses
+    cache.get(paths[1])
+    assert cache.misses == misses + 1
+    assert cache.get(str(tmp_path / "missing.jpg")) is None
+
+    with capsys.disabled():
+        print(" tested CoverCache LRU eviction successfully")
+
+
+def test_cover_cache_reloads_changed_files_and_prefetches(tmp_path, capsys):
+    path = make_cover(tmp_path / "01.jpg", "red")
+    cache = CoverCache()
+    first = cache.get(path)
+
+    make_cover(path, "blue")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert cache.get(path) is not first
+
+    other = make_cover(tmp_path / "02.jpg", "green")
+    cache.prefetch([other])
+    cache.wait_for_prefetch()
+    hits = cache.hits
+    cache.get(other)
+    assert cache.hits == hits + 1
+
+    with capsys.disabled():
+        print(" tested CoverCache prefetch successfully")
+
+
+def test_prefetch_keeps_running_after_a_decode_error(tmp_path, capsys):
+    bad = tmp_path / "bad.jpg"
+    bad.write_bytes(b"")
+    good = make_cover(tmp_path / "good.jpg", "red")
+
+    class FussyCache(CoverCache):
+        def decode(self, path):
+            if path == str(bad):
+                raise ValueError("not a cover")
+            return super().decode(path)
+
+    cache = FussyCache()
+    cache.prefetch([str(bad)])
+    cache.wait_for_prefetch()
+    cache.prefetch([good])
+    cache.wait_for_prefetch()
+    assert cache._worker.is_alive()
+    hits = cache.hits
+    cache.get(good)
+    assert cache.hits == hits + 1
+
+    with capsys.disabled():
+        print(" tested CoverCache prefetch after errors successfully")
+
+
+def test_neighbour_cover_paths(capsys):
+    assert neighbour_cover_paths("01", distance=1, folder="photos") == [
+        os.path.join("photos", "02.jpg"), os.path.join("photos", "00.jpg")]
+    assert neighbour_cover_paths("abc") == []
+
+    with capsys.disabled():
+        print(" tested neighbour_cover_paths() successfully")
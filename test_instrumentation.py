@@ -0,0 +1,67 @@
+import json
+import threading
+import time
+import types
+
+import instrumentation
+from instrumentation import LatencyHistogram, Watchdog
+
+
+def test_latency_histogram_buckets_and_percentiles(capsys):
+    histogram = LatencyHistogram()
+    for seconds in [3e-6] * 98 + [0.001, 0.5]:
+        histogram.add(seconds)
+
+    assert histogram.count == 100
+    assert histogram.percentile(0.5) == 4e-6   # 3us falls in the <=4us bucket
+    assert histogram.percentile(0.99) == 1024e-6
+    assert histogram.percentile(1.0) == 0.5
+    assert histogram.to_dict()["buckets_us"] == {"4": 98, "1024": 1, "524288": 1}
+
+    with capsys.disabled():
+        print(" tested LatencyHistogram successfully")
+
+
+def test_instrument_module_times_public_functions(tmp_path, capsys):
+    module = types.ModuleType("fake_library")
+    exec("def get_name(key):\n    return key.upper()\n\ndef _private():\n    return 1\n", module.__dict__)
+    instrumentation.metrics.clear()
+    instrumentation.instrument_module(module, "fake")
+    instrumentation.instrument_module(module, "fake")  # Wrapping twice is harmless
+
+    assert module.get_name("a") == "A"
+    module._private()
+    assert list(instrumentation.metrics.histograms) == ["fake.get_name"]
+    assert instrumentation.metrics.histograms["fake.get_name"].count == 1
+
+    path = tmp_path / "metrics.json"
+    instrumentation.metrics.export(path)
+    assert json.loads(path.read_text())["operations"]["fake.get_name"]["count"] == 1
+
+    with capsys.disabled():
+        print(" tested instrument_module() successfully")
+
+
+def test_watchdog_samples_the_stack_of_a_blocked_callback(capsys):
+    instrumentation.metrics.clear()
+    watchdog = Watchdog(threshold=0.05)
+    watchdog.start()
+
+    def slow_button_callback():
+        watchdog.callback_started("ui.slow_button_callback")
+        time.sleep(0.2)
+        watchdog.callback_finished()
+
+    worker = threading.Thread(target=slow_button_callback)
+    worker.start()
+    worker.join()
+    watchdog.stop()
+
+    stalls = instrumentation.metrics.stalls
+    assert len(stalls) == 1
+    assert stalls[0]["callback"] == "ui.slow_button_callback"
+    assert stalls[0]["blocked_ms"] >= 50
+    assert any("slow_button_callback" in line for line in stalls[0]["stack"])
+
+    with capsys.disabled():
+        print(" tested Watchdog successfully")
@@ -0,0 +1,134 @@
+import json
+
+import pytest
+
+import track_library as lib
+from play_log import PlayLog
+
+
+@pytest.fixture(autouse=True)
+def restore_library():
+    saved = {key: lib.library[key].play_count for key in lib.library}
+    yield
+    if lib.play_log is not None:
+        lib.play_log.close()
+        lib.play_log = None
+    for key, play_count in saved.items():
+        lib.library[key].play_count = play_count
+
+
+def test_plays_are_logged_and_merged_into_get_play_count(tmp_path, capsys):
+    path = tmp_path / "plays.jsonl"
+    lib.use_play_log(path, batch_size=2)
+
+    lib.increment_play_count("01", source="playlist")
+    lib.increment_play_count("01")
+    lib.increment_play_count("99")  # Unknown tracks are not logged
+
+    assert lib.library["01"].play_count == 0  # Stored count untouched until compaction
+    assert lib.get_play_count("01") == 2
+    events = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(e["key"], e["source"]) for e in events] == [("01", "playlist"), ("01", None)]
+
+    lib.play_log.compact()
+    assert lib.library["01"].play_count == 2
+    assert lib.get_play_count("01") == 2
+    assert len(path.read_text().splitlines()) == 2  # Kept: the in-memory counts die with the process
+
+    with capsys.disabled():
+        print(" tested use_play_log() successfully")
+
+
+def test_play_log_replays_unfolded_events_after_restart(tmp_path, capsys):
+    path = tmp_path / "plays.jsonl"
+    path.write_text('{"key":"02","ts":1,"source":null}\n{"key":"02","ts":2,"source":null}\n{"key":')
+    folded = {}
+
+    log = PlayLog(path, folded.update, batch_size=100, flush_interval=60)
+    assert log.pending_plays("02") == 2  # The torn last line is ignored
+    log.record("03")
+    assert log.pending_plays("03") == 1
+    log.close()
+
+    assert folded == {"02": 2, "03": 1}
+    assert path.read_text() == ""
+
+    with capsys.disabled():
+        print(" tested PlayLog replay successfully")
+
+
+def test_play_log_compacts_after_enough_events(tmp_path, capsys):
+    folded = []
+    log = PlayLog(tmp_path / "plays.jsonl", lambda counts: folded.append(dict(counts)),
+                  batch_size=1, compact_every=3)
+    for key in ["a", "b", "a"]:
+        log.record(key)
+
+    assert folded == [{"a": 2, "b": 1}]
+    assert log.pending == {}
+    log.close()
+
+    with capsys.disabled():
+        print(" tested PlayLog compaction successfully")
+
+
+def test_plays_survive_a_restart_of_an_in_memory_library(tmp_path, capsys):
+    path = tmp_path / "plays.jsonl"
+    lib.use_play_log(path, batch_size=1)
+    for _ in range(5):
+        lib.increment_play_count("01")
+    lib.play_log.close()
+    lib.library["01"].play_count = 0  # What a restarted jukebox starts from
+
+    lib.use_play_log(path)
+    assert lib.get_play_count("01") == 5
+    with capsys.disabled():
+        print(" tested play log restart with an in-memory library successfully")
+
+
+def test_buffered_plays_survive_close(tmp_path, capsys):
+    path = tmp_path / "plays.jsonl"
+    lib.use_play_log(path)  # Default batch size and flush interval: nothing written yet
+    for _ in range(5):
+        lib.increment_play_count("01")
+    lib.play_log.close()
+    assert len(path.read_text().splitlines()) == 5
+    lib.library["01"].play_count = 0  # What a restarted jukebox starts from
+
+    lib.use_play_log(path)
+    assert lib.get_play_count("01") == 5
+    with capsys.disabled():
+        print(" tested closing a play log with buffered plays successfully")
+
+
+def test_only_durable_backends_let_the_log_be_emptied(tmp_path, capsys):
+    saved_library = lib.library
+    assert lib.fold_play_counts({}) is False  # Plain dictionary
+    lib.use_snapshot(str(tmp_path / "library.snap"))
+    try:
+        assert lib.fold_play_counts({"01": 1}) is True
+    finally:
+        lib.library.close()
+        lib.library = saved_library
+        lib.library_changed()
+    with capsys.disabled():
+        print(" tested play log durability checks successfully")
+
+
+def test_log_is_emptied_once_a_database_has_the_plays(tmp_path, capsys):
+    saved_library = lib.library
+    path = tmp_path / "plays.jsonl"
+    lib.use_database(str(tmp_path / "library.db"))
+    try:
+        lib.use_play_log(path, batch_size=1)
+        lib.increment_play_count("01")
+        lib.play_log.close()
+        lib.play_log = None
+        assert path.read_text() == ""
+        assert lib.library["01"].play_count == saved_library["01"].play_count + 1
+    finally:
+        lib.library.close()
+        lib.library = saved_library
+        lib.library_changed()
+    with capsys.disabled():
+        print(" tested play log compaction into a database successfully")
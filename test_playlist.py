@@ -0,0 +1,48 @@
+import pytest
+
+from playlist import Playlist, parse_key_range
+
+
+def test_playlist_keeps_order_and_rejects_duplicates(capsys):
+    playlist = Playlist(["03", "01"])
+
+    assert playlist.add("02")
+    assert not playlist.add("01")
+    assert playlist.add_many(["01", "04", "04", "05"]) == ["04", "05"]
+    assert list(playlist) == ["03", "01", "02", "04", "05"]
+    assert playlist[2] == "02"
+    assert "04" in playlist and "06" not in playlist
+
+    playlist.remove("01")
+    assert playlist.keys() == ["03", "02", "04", "05"]
+    playlist.clear()
+    assert len(playlist) == 0 and "03" not in playlist
+
+    with capsys.disabled():
+        print(" tested Playlist ordered-set behaviour successfully")
+
+
+def test_playlist_add_range_only_adds_library_tracks(capsys):
+    playlist = Playlist(["03"])
+
+    assert playlist.add_range("01", "05") == ["01", "02", "04", "05"]
+    assert playlist.add_range("12", "09") == ["09", "10"]
+    assert parse_key_range("01-05") == ("01", "05")
+    assert parse_key_range(" 07 ") == ("07", "07")
+    assert parse_key_range("a-b") is None
+
+    with capsys.disabled():
+        print(" tested Playlist.add_range() successfully")
+
+
+def test_playlist_save_and_load(tmp_path, capsys):
+    path = tmp_path / "party.playlist"
+    Playlist(["05", "01", "10"]).save(path)
+
+    assert Playlist.load(path).keys() == ["05", "01", "10"]
+    (tmp_path / "other.txt").write_text("05\n")
+    with pytest.raises(ValueError):
+        Playlist.load(tmp_path / "other.txt")
+
+    with capsys.disabled():
+        print(" tested Playlist save() and load() successfully")
@@ -0,0 +1,238 @@
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import time
+
+import pytest
+from multiprocessing import shared_memory
+
+import track_library as lib
+import shared_counts
+from library_item import LibraryItem
+
+PROCESSES = 4
+PLAYS_PER_PROCESS = 20000
+
+
+@pytest.fixture
+def segment_name():
+    name = f"jukebox-test-{os.getpid()}-{time.monotonic_ns()}"
+    yield name
+    if isinstance(lib.library, shared_counts.SharedCountsLibrary):
+        lib.library.close()  # Frees its zone now, not after the segment and its lock file are gone
+    try:
+        store = shared_counts.SharedCountsLibrary({}, name)
+    except ValueError:
+        return
+    store.close()
+    store.unlink()
+
+
+@pytest.fixture(autouse=True)
+def restore_library():
+    saved_library = lib.library
+    saved_tracks = dict(lib.library)
+    yield
+    if hasattr(lib.library, "close"):
+        lib.library.close()
+    lib.library = saved_library
+    lib.library.clear()
+    lib.library.update(saved_tracks)
+    lib.library_changed()
+
+
+def test_zones_share_ratings_and_counts(segment_name, capsys):
+    lib.increment_play_count("01")
+    lib.use_shared_counts(segment_name, zone=0)
+    other = shared_counts.SharedCountsLibrary(dict(lib.library.base), segment_name, zone=1)
+
+    lib.increment_play_count("01")
+    other.increment("01")
+    other["02"].rating = 1
+    assert lib.get_play_count("01") == 3  # One from before, one from each zone
+    assert lib.get_rating("02") == 1
+
+    seen = []
+    lib.subscribe(lambda kind, keys: seen.append((kind, set(keys))))
+    lib.poll_shared_counts()
+    assert seen == [("played", {"01"}), ("rating", {"02"})]
+    seen.clear()
+    lib.poll_shared_counts()  # Nothing new
+    assert seen == []
+
+    lib.add_track("20", LibraryItem("Added Later", "Local", 3))  # Takes a spare slot
+    lib.increment_play_count("20")
+    assert other.add_many([("20", LibraryItem("Added Later", "Local", 3))]) == 1
+    other.increment("20")
+    assert lib.get_play_count("20") == 2
+    seen.clear()
+    lib.poll_shared_counts()
+    assert seen == [("played", {"20"})]
+    with pytest.raises(ValueError):
+        shared_counts.SharedCountsLibrary({}, segment_name, zone=shared_counts.DEFAULT_ZONES)
+    other.close()
+    with capsys.disabled():
+        print(" tested shared counts between zones successfully")
+
+
+def test_ring_overflow_asks_for_a_full_refresh(segment_name, capsys):
+    lib.use_shared_counts(segment_name, zone=0, ring_size=8)
+    other = shared_counts.SharedCountsLibrary(dict(lib.library.base), segment_name, zone=1)
+    for _ in range(20):
+        other.increment("03")
+    seen = []
+    lib.subscribe(lambda kind, keys: seen.append(kind))
+    lib.poll_shared_counts()
+    assert seen == ["reset"]
+    assert lib.get_play_count("03") == 20
+    other.close()
+    with capsys.disabled():
+        print(" tested shared change ring overflow successfully")
+
+
+def test_counts_are_saved_to_a_database(segment_name, tmp_path, capsys):
+    lib.use_database(str(tmp_path / "library.db"))
+    lib.use_shared_counts(segment_name, zone=2)
+    lib.increment_play_count("04")
+    lib.set_rating("04", 5)
+    store = lib.library
+    lib.library = store.base
+    store.close()
+    assert (lib.library["04"].play_count, lib.library["04"].rating) == (1, 5)
+    with capsys.disabled():
+        print(" tested saving shared counts successfully")
+
+
+
+
+def test_tracks_past_the_spare_slots_are_counted_locally(segment_name, capsys):
+    store = shared_counts.SharedCountsLibrary(dict(lib.library), segment_name, zone=0, spare_slots=1)
+    store["20"] = LibraryItem("First Added", "Local", 2)
+    with pytest.warns(RuntimeWarning):
+        store["21"] = LibraryItem("Second Added", "Local", 2)
+    assert store.unshared == {"21"}
+    with pytest.warns(RuntimeWarning):  # Another process with the same tracks finds the segment full too
+        other = shared_counts.SharedCountsLibrary({"20": LibraryItem("First Added", "Local", 2),
+                                                   "21": LibraryItem("Second Added", "Local", 2)}, segment_name)
+    assert other.unshared == {"21"}
+    other.increment("20")
+    other.increment("21")
+    assert (store["20"].play_count, store["21"].play_count) == (1, 0)
+    other.close()
+    store.close()
+    with capsys.disabled():
+        print(" tested a full shared count segment successfully")
+
+def test_unshared_tracks_and_play_logs(segment_name, tmp_path, capsys):
+    lib.use_shared_counts(segment_name, zone=0, spare_slots=0)
+    with pytest.warns(RuntimeWarning):
+        lib.add_track("20", LibraryItem("No Room", "Local", 3))
+    lib.increment_play_count("20")  # Counted in the item, under the track's lock
+    assert lib.get_play_count("20") == 1
+    with pytest.raises(ValueError):  # Other zones would only see logged plays after compaction
+        lib.use_play_log(str(tmp_path / "plays.log"))
+    assert lib.play_log is None
+    with capsys.disabled():
+        print(" tested unshared tracks successfully")
+
+
+def test_a_zone_has_one_owner(segment_name, capsys):
+    store = shared_counts.SharedCountsLibrary(dict(lib.library), segment_name, zone=0)
+    with pytest.raises(ValueError):
+        shared_counts.SharedCountsLibrary({}, segment_name, zone=0)
+    other = shared_counts.SharedCountsLibrary({}, segment_name)
+    assert other.zone == 1  # The first free zone
+    other.close()
+    again = shared_counts.SharedCountsLibrary({}, segment_name, zone=1)  # Freed by close()
+    again.close()
+
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    store.words[store.owners_start + 2] = exited.pid  # Left behind by a jukebox that crashed
+    crashed = shared_counts.SharedCountsLibrary({}, segment_name, zone=2)
+    crashed.close()
+
+    taken = [shared_counts.SharedCountsLibrary({}, segment_name) for _ in range(store.zones - 1)]
+    with pytest.raises(ValueError):
+        shared_counts.SharedCountsLibrary({}, segment_name)
+    for zone in taken:
+        zone.close()
+    store.close()
+    with capsys.disabled():
+        print(" tested claiming zones successfully")
+
+
+@pytest.mark.skipif(os.name != "posix", reason="an unfinished segment goes away with its creator elsewhere")
+def test_segment_left_unfinished_is_created_again(segment_name, monkeypatch, capsys):
+    monkeypatch.setattr(shared_counts, "ATTACH_TIMEOUT", 0.05)
+    unfinished = shared_memory.SharedMemory(segment_name, create=True, size=4096)
+    shared_counts._keep_after_exit(unfinished)
+    unfinished.close()  # The creator died before writing the magic
+    store = shared_counts.SharedCountsLibrary(dict(lib.library), segment_name)
+    store.increment("01")
+    assert store["01"].play_count == lib.library["01"].play_count + 1
+    store.close()
+
+    foreign_name = f"{segment_name}-foreign"
+    foreign = shared_memory.SharedMemory(foreign_name, create=True, size=4096)
+    foreign.buf[:4] = b"\x7fELF"
+    try:
+        with pytest.raises(ValueError):
+            shared_counts.SharedCountsLibrary({}, foreign_name)
+        still_there = shared_memory.SharedMemory(foreign_name)  # Not removed
+        assert bytes(still_there.buf[:4]) == b"\x7fELF"
+        still_there.close()
+    finally:
+        foreign.close()
+        foreign.unlink()
+        shared_counts._remove_lock(foreign_name)
+    with capsys.disabled():
+        print(" tested recreating an unfinished segment successfully")
+
+# Runs in its own process: attach as `zone` and play random tracks
+def play_in_zone(name, zone, keys, plays, results):
+    store = shared_counts.SharedCountsLibrary({key: LibraryItem(key, "Zone") for key in keys}, name, zone)
+    rng = random.Random(zone)
+    played = {}
+    started = time.perf_counter()
+    for _ in range(plays):
+        key = rng.choice(keys)
+        store.increment(key)
+        played[key] = played.get(key, 0) + 1
+    results.put((played, plays / (time.perf_counter() - started)))
+    store.close()
+
+
+def test_processes_count_every_play(segment_name, capsys):
+    keys = [f"{number:03d}" for number in range(200)]
+    base = {key: LibraryItem(key, "Zone") for key in keys}
+    base["007"].play_count = 5
+    store = shared_counts.SharedCountsLibrary(base, segment_name, zone=0)
+
+    context = multiprocessing.get_context("spawn")  # Nothing inherited: each process attaches by name
+    results = context.Queue()
+    processes = [context.Process(target=play_in_zone, args=(segment_name, zone, keys, PLAYS_PER_PROCESS, results))
+                 for zone in range(1, PROCESSES + 1)]
+    for process in processes:
+        process.start()
+    outcomes = [results.get(timeout=60) for _ in processes]
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    expected = {key: 0 for key in keys}
+    expected["007"] = 5
+    for played, _ in outcomes:
+        for key, plays in played.items():
+            expected[key] += plays
+    assert {key: store[key].play_count for key in keys} == expected
+    assert sum(expected.values()) == PROCESSES * PLAYS_PER_PROCESS + 5
+    played, _, overflowed = store.poll_changes()
+    assert overflowed  # Each zone made more changes than its ring holds
+
+    rate = sum(rate for _, rate in outcomes)
+    store.close()
+    with capsys.disabled():
+        print(f" tested {PROCESSES} processes sharing play counts successfully ({rate:,.0f} plays/s)")
@@ -0,0 +1,63 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import synthetic_library
+import track_library as lib
+import smart_playlist
+from library_item import LibraryItem
+
+
+@pytest.fixture(autouse=True)
+def restore_library():
+    saved = lib.library
+    lib.library = {key: LibraryItem(item.name, item.artist, item.rating) for key, item in saved.items()}
+    lib.library_changed()
+    lib.recent_plays.clear()
+    yield
+    lib.recent_plays.clear()
+    lib.library = saved
+    lib.library_changed()
+
+
+def test_weighted_sample_favours_heavy_items_without_repeats(capsys):
+    rng = np.random.default_rng(1)
+    weights = np.array([1.0, 0.0, 8.0, 1.0])
+    firsts = [int(smart_playlist.weighted_sample(weights, 3, rng)[0]) for _ in range(2000)]
+
+    assert sorted(smart_playlist.weighted_sample(weights, 10, rng)) == [0, 2, 3]  # Never the 0-weight item
+    assert 0.7 < firsts.count(2) / len(firsts) < 0.9  # 8 / 10 expected
+    assert len(smart_playlist.weighted_sample(np.zeros(3), 2, rng)) == 0
+
+    with capsys.disabled():
+        print(" tested weighted_sample() successfully")
+
+
+def test_smart_playlist_filters_and_follows_library_changes(capsys):
+    picks = smart_playlist.smart_playlist(20, min_rating=5, seed=3)
+    assert sorted(picks) == ["02", "06", "10"]
+
+    lib.set_rating("04", 5)
+    lib.increment_play_count("06")
+    picks = smart_playlist.smart_playlist(20, min_rating=5, exclude=["10"], seed=3)
+    assert sorted(picks) == ["02", "04"]  # 06 was just played, 10 is excluded
+
+    lib.add_track("11", LibraryItem("Hello", "Adele", 5))
+    assert "11" in smart_playlist.smart_playlist(20, min_rating=5, seed=3)
+    assert smart_playlist.smart_playlist(3, seed=5) == smart_playlist.smart_playlist(3, seed=5)
+
+    with capsys.disabled():
+        print(" tested smart_playlist() successfully")
+
+
+def test_weighted_shuffle_keeps_every_key(capsys):
+    lib.library = synthetic_library.build_library(500, seed=2)
+    lib.use_columnar_storage()
+    keys = lib.track_keys()[:100] + ["missing"]
+
+    shuffled = smart_playlist.weighted_shuffle(keys, seed=4)
+    assert sorted(shuffled) == sorted(keys) and shuffled != keys
+    assert shuffled[-1] == "missing"
+
+    with capsys.disabled():
+        print(" tested weighted_shuffle() successfully")
@@ -0,0 +1,75 @@
+import pytest
+
+import track_library as lib
+from library_item import LibraryItem
+from track_columns import ColumnarLibrary
+
+
+@pytest.fixture(autouse=True)
+def restore_library():
+    saved = lib.library
+    yield
+    lib.library = saved
+
+
+def test_columnar_library_keeps_accessor_api(capsys):
+    original = {key: lib.library[key].info() for key in lib.library}
+    lib.use_columnar_storage()
+
+    assert isinstance(lib.library, ColumnarLibrary)
+    assert {key: lib.library[key].info() for key in lib.library} == original
+    assert lib.list_all().startswith("01 Another Brick in the Wall - Pink Floyd ****\n")
+
+    lib.set_rating("05", 1)
+    lib.increment_play_count("05")
+    assert lib.get_rating("05") == 1
+    assert lib.library["05"].stars() == "*"
+    assert lib.get_play_count("05") == 1
+    assert lib.get_play_count("99") == -1
+
+    with capsys.disabled():
+        print(" tested use_columnar_storage() successfully")
+
+
+def test_columnar_library_interns_artists(capsys):
+    store = ColumnarLibrary([("a", LibraryItem("One", "Adele", 3)), ("b", LibraryItem("Two", "Adele", 4))])
+    store["c"] = LibraryItem("Three", "Queen", 5)
+    store["a"].artist = "Queen"
+
+    assert store.artist_names == ["Adele", "Queen"]
+    assert store["a"].info() == "One - Queen ***"
+
+    del store["b"]
+    assert list(store) == ["a", "c"]
+    assert store.add_many([("a", LibraryItem("X", "Y")), ("b", LibraryItem("Two", "Adele"))]) == 1
+
+    for number in range(100):  # Churn reuses the freed rows instead of growing the columns
+        del store["b"]
+        store["b"] = LibraryItem(f"Take {number}", "Adele", 2)
+    assert len(store.names) == len(store.ratings) == 3
+    assert store["b"].info() == "Take 99 - Adele **"
+
+    with capsys.disabled():
+        print(" tested ColumnarLibrary artist interning successfully")
+
+
+def test_reader_never_sees_a_half_added_row(capsys):
+    store = ColumnarLibrary()
+    seen_early = []
+
+    # An item that looks at the library while it is being copied in, as another thread could
+    class Probe(LibraryItem):
+        @property
+        def play_count(self):  # The last field read by the library
+            seen_early.append("new" in store)
+            return 0
+
+        @play_count.setter
+        def play_count(self, value):
+            pass
+
+    store["new"] = Probe("Name", "Artist", 3)
+    assert seen_early == [False]
+    assert store["new"].info() == "Name - Artist ***"
+    with capsys.disabled():
+        print(" tested ColumnarLibrary append order successfully")
@@ -0,0 +1,60 @@
+import pytest
+
+import track_events
+import track_library as lib
+from library_item import LibraryItem
+from track_events import ChangeSet, EventBus
+
+
+@pytest.fixture
+def recorded_events():
+    saved = lib.library
+    lib.library = {key: LibraryItem(item.name, item.artist, item.rating) for key, item in saved.items()}
+    lib.library_changed()
+    events = []
+    listener = lambda kind, keys: events.append((kind, tuple(keys)))
+    lib.subscribe(listener)
+    yield events
+    lib.unsubscribe(listener)
+    lib.library = saved
+    lib.library_changed()
+
+
+def test_event_bus_and_change_set(capsys):
+    bus = EventBus()
+    changes = ChangeSet()
+    assert not changes
+
+    bus.subscribe(changes.add)
+    bus.publish(track_events.TRACKS_ADDED, ("20", "21"))
+    bus.publish(track_events.RATING_CHANGED, ("01",))
+    bus.publish(track_events.PLAY_COUNTED, ("01",))
+    bus.unsubscribe(changes.add)
+    bus.publish(track_events.LIBRARY_RESET)
+
+    assert changes.added == ["20", "21"]
+    assert changes.changed == {"01"}
+    assert not changes.reset and changes
+
+    with capsys.disabled():
+        print(" tested EventBus and ChangeSet successfully")
+
+
+def test_library_publishes_changes(recorded_events, capsys):
+    lib.set_rating("01", 2)
+    lib.update_rating("02", lambda rating: rating + 1)
+    lib.increment_play_count("03")
+    lib.add_tracks([("20", LibraryItem("New Song", "New Artist")), ("01", LibraryItem("Dup", "Dup"))])
+    assert lib.add_track("20", LibraryItem("New Song", "New Artist")) is False  # Nothing new, no event
+    lib.library_changed()
+
+    assert recorded_events == [
+        (track_events.RATING_CHANGED, ("01",)),
+        (track_events.RATING_CHANGED, ("02",)),
+        (track_events.PLAY_COUNTED, ("03",)),
+        (track_events.TRACKS_ADDED, ("20",)),
+        (track_events.LIBRARY_RESET, ()),
+    ]
+
+    with capsys.disabled():
+        print(" tested track_library change events successfully")
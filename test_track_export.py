@@ -0,0 +1,119 @@
+import gzip
+import tracemalloc
+
+import pytest
+
+from library_item import LibraryItem
+import synthetic_library
+import track_library as lib
+import track_export
+import track_importer
+
+
+@pytest.fixture(autouse=True)
+def restore_library():
+    saved_library = lib.library
+    saved_tracks = dict(lib.library)
+    yield
+    if lib.play_log is not None:
+        lib.play_log.close()
+        lib.play_log = None
+    if hasattr(lib.library, "close"):
+        lib.library.close()
+    lib.library = saved_library
+    lib.library.clear()
+    lib.library.update(saved_tracks)
+    lib.library_changed()
+
+
+def expected_rows(keys=None):
+    return [(key, lib.get_name(key), lib.get_artist(key), lib.get_rating(key), lib.get_play_count(key))
+            for key in (keys if keys is not None else lib.track_keys())]
+
+
+@pytest.mark.parametrize("name", ["library.csv", "library.jsonl", "library.jbx", "library.csv.gz",
+                                  "library.jsonl.gz", "library.jbx.gz"])
+def test_every_format_reads_back(tmp_path, name, capsys):
+    lib.add_track("20", LibraryItem('Quote " and, comma', "Ünïcode Artist", 2))
+    lib.increment_play_count("20")
+    path = tmp_path / name
+    assert track_export.export_tracks(path) == len(lib.library)
+    assert list(track_export.read_export(path)) == expected_rows()
+    assert (path.read_bytes()[:2] == track_export.GZIP_MAGIC) == name.endswith(".gz")
+    assert not (tmp_path / f"{name}.tmp").exists()
+    with capsys.disabled():
+        print(f" tested export to {name} successfully")
+
+
+def test_csv_export_can_be_imported_again(tmp_path, capsys):
+    path = tmp_path / "library.csv"
+    track_export.export_tracks(path)
+    expected = expected_rows()
+    lib.library.clear()
+    lib.library_changed()
+    result = track_importer.import_csv(path)
+    assert (result.added, result.errors) == (len(expected), [])
+    assert expected_rows() == expected
+    with capsys.disabled():
+        print(" tested importing a CSV export successfully")
+
+
+def test_playlist_export_keeps_play_order(tmp_path, capsys):
+    path = tmp_path / "playlist.jsonl"
+    assert track_export.export_playlist(["05", "01", "99", "03"], path) == 3  # 99 is not in the library
+    assert [row[0] for row in track_export.read_export(path)] == ["05", "01", "03"]
+    with capsys.disabled():
+        print(" tested playlist export successfully")
+
+
+def test_memory_stays_flat_and_progress_is_reported(tmp_path, capsys):
+    lib.library = synthetic_library.build_library(50000, seed=3)
+    lib.library_changed()
+    lib.snapshot_keys()  # Shared with every other reader, so not counted against the export
+    progress = []
+    tracemalloc.start()
+    written = track_export.export_tracks(tmp_path / "big.jbx.gz", on_progress=lambda *args: progress.append(args),
+                                         buffer_size=1 << 16)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert written == 50000
+    assert peak < 1 << 20  # The output is several MiB before compression
+    assert len(progress) > 10
+    assert progress[-1] == (50000, 50000)
+    assert all(earlier[0] <= later[0] for earlier, later in zip(progress, progress[1:]))
+    with capsys.disabled():
+        print(" tested bounded memory export successfully")
+
+
+def test_database_and_play_log_counts(tmp_path, capsys):
+    lib.use_database(str(tmp_path / "library.db"))
+    lib.library.page_size = 3  # Several pages for ten tracks
+    lib.use_play_log(str(tmp_path / "plays.log"))
+    lib.increment_play_count("02")
+    lib.increment_play_count("02")
+    path = tmp_path / "library.csv"
+    track_export.export_tracks(path)
+    rows = list(track_export.read_export(path))
+    assert rows == expected_rows()
+    assert dict((row[0], row[4]) for row in rows)["02"] == 2  # Still in the log, not folded into the store
+    with capsys.disabled():
+        print(" tested exporting a database library successfully")
+
+
+def test_failed_export_leaves_old_file(tmp_path, capsys):
+    path = tmp_path / "library.jbx"
+    track_export.export_tracks(path)
+    before = path.read_bytes()
+    lib.add_track("20", LibraryItem("x" * 70000, "Long", 1))
+    with pytest.raises(ValueError):
+        track_export.export_tracks(path)
+    assert path.read_bytes() == before
+    assert not (tmp_path / "library.jbx.tmp").exists()
+
+    with gzip.open(tmp_path / "cut.jbx.gz", "wb") as cut_file:
+        cut_file.write(before[:-3])
+    with pytest.raises(ValueError):
+        list(track_export.read_export(tmp_path / "cut.jbx.gz"))
+    with capsys.disabled():
+        print(" tested failed exports successfully")
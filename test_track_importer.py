@@ -0,0 +1,120 @@
+import threading
+
+import pytest
+
+import track_library as lib
+import track_importer
+
+
+@pytest.fixture(autouse=True)
+def restore_library():
+    saved = dict(lib.library)
+    yield
+    lib.library.clear()
+    lib.library.update(saved)
+    lib.library_changed()
+
+
+def write_csv(tmp_path, lines):
+    path = tmp_path / "tracks.csv"
+    path.write_text("track_key,name,artist,rating,play_count\r\n" + "".join(f"{line}\r\n" for line in lines))
+    return path
+
+
+def test_import_csv_adds_tracks_and_reports_bad_rows(tmp_path, capsys):
+    path = write_csv(tmp_path, [
+        "11,Espresso,Sabrina Carpenter,1,0",
+        "17,Good Luck, Babe Chappell Roan,1,0",
+        "18,APT,Rose vs Bruno Mars,five,0",
+        "19,Fortnight,Taylor Swift vs Post Malone,4,7",
+        "01,Duplicate,Someone,3,0",
+    ])
+    result = track_importer.import_csv(path, batch_size=2)
+
+    assert result.rows == 5
+    assert result.added == 2
+    assert result.duplicates == 1
+    assert [e.line for e in result.errors] == [3, 4]
+    assert "starts with a space" in result.errors[0].message
+    assert lib.get_name("11") == "Espresso"
+    assert lib.get_play_count("19") == 7
+    assert lib.get_name("01") == "Another Brick in the Wall"
+    assert lib.get_name("17") is None
+
+    with capsys.disabled():
+        print(" tested track_importer import_csv() successfully")
+
+
+def test_import_csv_reports_progress_and_can_be_cancelled(tmp_path, capsys):
+    path = write_csv(tmp_path, [f"{n},Song {n},Artist,3,0" for n in range(100, 200)])
+    cancel = threading.Event()
+    progress = []
+
+    def on_progress(result, bytes_read, total_bytes):
+        progress.append(bytes_read / total_bytes)
+        if result.added >= 30:
+            cancel.set()
+
+    result = track_importer.import_csv(path, batch_size=10, on_progress=on_progress, cancel_event=cancel)
+
+    assert result.cancelled
+    assert result.added == 30
+    assert progress == sorted(progress)
+    assert lib.get_name("129") == "Song 129"
+    assert lib.get_name("130") is None
+
+    with capsys.disabled():
+        print(" tested track_importer cancellation successfully")
+
+
+def test_csv_import_worker_posts_batches_errors_and_done(tmp_path, capsys):
+    path = write_csv(tmp_path, ["11,Espresso,Sabrina Carpenter,1,0", "12,Bad,Row", "13,Song,Artist,2,0"])
+    worker = track_importer.CsvImportWorker(path, batch_size=1)
+    worker.start()
+
+    kinds = []
+    while not kinds or kinds[-1] != "done":
+        kinds.append(worker.messages.get(timeout=5)[0])
+    worker.join(timeout=5)
+
+    assert kinds == ["batch", "error", "batch", "done"]
+    assert lib.get_name("11") is None  # The worker never touches the library itself
+
+    with capsys.disabled():
+        print(" tested CsvImportWorker successfully")
+
+
+def test_undecodable_file_is_reported_not_raised(tmp_path, capsys):
+    path = write_csv(tmp_path, ["11,Espresso,Sabrina Carpenter,1,0"])
+    with open(path, "ab") as data_file:
+        data_file.write(b"12,Bad \xff Byte,Artist,1,0\r\n")
+
+    result = track_importer.import_csv(path, batch_size=1)
+    assert isinstance(result.error, UnicodeDecodeError)
+    assert result.added == 1
+    assert "stopped" in result.summary()
+
+    worker = track_importer.CsvImportWorker(path, batch_size=1)
+    worker.start()
+    messages = []
+    while not messages or messages[-1][0] != "done":
+        messages.append(worker.messages.get(timeout=5))
+    worker.join(timeout=5)
+    assert isinstance(messages[-1][1], UnicodeDecodeError)
+    with capsys.disabled():
+        print(" tested import of an undecodable file successfully")
+
+
+def test_parse_rating_lines(capsys):
+    ratings, errors = track_importer.parse_rating_lines([
+        "track_key,rating", "01,5", "02\t3", "", "03 four", "04", "05 , 1",
+    ])
+
+    assert ratings == [(2, "01", 5), (3, "02", 3), (7, "05", 1)]
+    assert [str(error) for error in errors] == [
+        "line 5: rating 'four' is not a whole number",
+        "line 6: expected a track number and a rating",
+    ]
+
+    with capsys.disabled():
+        print(" tested parse_rating_lines() successfully")
@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+import synthetic_library
+import track_library as lib
+from library_item import LibraryItem
+
+
+@pytest.fixture(autouse=True)
+def restore_library():
+    saved = lib.library
+    lib.library = {key: LibraryItem(item.name, item.artist, item.rating) for key, item in saved.items()}
+    lib.library_changed()
+    yield
+    lib.library = saved
+    lib.library_changed()
+
+
+def test_lookups_by_artist_and_rating(capsys):
+    assert lib.keys_by_artist("Adele") == ["05", "08"]
+    assert lib.keys_by_artist(" adele ") == ["05", "08"]
+    assert lib.keys_by_artist("Nobody") == []
+    assert lib.keys_by_rating(5) == ["02", "06", "10"]
+
+    with capsys.disabled():
+        print(" tested keys_by_artist() and keys_by_rating() successfully")
+
+
+def test_indexes_follow_library_changes(capsys):
+    assert lib.keys_by_rating(1) == ["04"]  # Builds the indexes
+
+    lib.set_rating("04", 5)
+    lib.update_rating("06", lambda rating: rating - 4)
+    lib.add_tracks([("11", LibraryItem("Hello", "Adele", 5))])
+    for _ in range(3):
+        lib.increment_play_count("09")
+    lib.increment_play_count("02")
+
+    assert lib.keys_by_rating(1) == ["06"]
+    assert lib.keys_by_rating(5) == ["02", "04", "10", "11"]
+    assert lib.keys_by_artist("Adele") == ["05", "08", "11"]
+    assert lib.most_played(2) == ["09", "02"]
+    assert len(lib.most_played(100)) == 11
+
+    lib.library = {"01": LibraryItem("Only Track", "Adele", 2)}
+    lib.library_changed()
+    assert lib.keys_by_artist("Adele") == ["01"]
+    assert lib.most_played() == ["01"]
+
+    with capsys.disabled():
+        print(" tested index updates through library changes successfully")
+
+
+def test_indexes_match_a_full_scan_after_concurrent_updates(capsys):
+    lib.library = synthetic_library.build_library(2000, seed=3)
+    lib.library_changed()
+    lib.most_played(10)
+    keys = lib.track_keys()
+
+    def worker(seed):
+        for n in range(500):
+            key = keys[(seed * 7919 + n * 31) % len(keys)]
+            if n % 2:
+                lib.set_rating(key, n % 5 + 1)
+            else:
+                lib.increment_play_count(key)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert lib.keys_by_rating(3) == sorted(key for key in keys if lib.get_rating(key) == 3)
+    top = lib.most_played(20)
+    assert [lib.get_play_count(key) for key in top] == sorted((lib.get_play_count(key) for key in keys),
+                                                                reverse=True)[:20]
+
+    with capsys.disabled():
+        print(" tested indexes against a full scan successfully")
@@ -0,0 +1,163 @@
+import sqlite3
+import sys
+import threading
+import time
+
+import pytest
+
+import track_library as lib
+from library_item import LibraryItem
+
+
+@pytest.fixture
+def restore_library():
+    saved = lib.library
+    lib.library = {key: LibraryItem(item.name, item.artist, item.rating) for key, item in saved.items()}
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # Switch threads as often as possible to shake out races
+    yield
+    sys.setswitchinterval(switch_interval)
+    if hasattr(lib.library, "close"):
+        lib.library.close()
+    lib.library = saved
+    lib.library_changed()
+
+
+def run_threads(*targets, repeat=1):
+    errors = []
+
+    def guarded(target):
+        try:
+            target()
+        except Exception as e:  # Reported by the assertion below
+            errors.append(e)
+
+    threads = [threading.Thread(target=guarded, args=(target,)) for target in targets * repeat]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_list_all_lists_every_track_in_order(capsys):
+    lines = lib.list_all().splitlines()
+
+    assert len(lines) == len(lib.library)
+    assert lines[0] == "01 Another Brick in the Wall - Pink Floyd ****"
+    assert lines[-1] == "10 Lose Yourself - Eminem *****"
+
+    with capsys.disabled():
+        print(" tested track_library list_all() successfully")
+
+
+def test_list_page_supports_offset_limit_and_sorting(capsys):
+    assert lib.list_page(1, 2) == ["02 Stayin' Alive - Bee Gees *****", "03 Highway to Hell  - AC/DC **"]
+    assert lib.list_page(0, 1, sort_by="rating") == ["04 Shape of You - Ed Sheeran *"]
+    assert [key for key, item in lib.iter_tracks(0, 3, sort_by="rating", reverse=True)] == ["02", "06", "10"]
+    assert lib.track_keys(reverse=True)[0] == "10"
+    assert lib.list_page(100, 5) == []
+    assert lib.describe("05") == "05 Someone Like You - Adele ***"
+    assert lib.describe("99") is None
+
+    with capsys.disabled():
+        print(" tested track_library list_page() successfully")
+
+
+def hammer_library(plays_per_thread=500, adds_per_thread=200):
+    keys = lib.track_keys()
+    stop = threading.Event()
+
+    def play():
+        for n in range(plays_per_thread):
+            lib.increment_play_count(keys[n % len(keys)])
+
+    def next_rating(rating):
+        time.sleep(0)  # Give other threads a chance to interleave with the update
+        return rating % 5 + 1
+
+    def rate():
+        for n in range(plays_per_thread):
+            lib.update_rating(keys[n % len(keys)], next_rating)
+
+    def add():
+        for n in range(adds_per_thread):
+            lib.add_track(f"new{n}", LibraryItem(f"New song {n}", "Stress Test", 3))
+
+    def read():
+        while not stop.is_set():
+            lib.list_all()
+            lib.track_keys("rating")
+            lib.search("stress new")
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    for reader in readers:
+        reader.start()
+    try:
+        run_threads(play, rate, add, repeat=4)
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+    return keys
+
+
+def test_concurrent_updates_are_not_lost(restore_library, capsys):
+    ratings = {key: lib.get_rating(key) for key in lib.library}
+    keys = hammer_library()
+
+    # 4 threads x 500 plays spread evenly over 10 tracks
+    assert all(lib.get_play_count(key) == 200 for key in keys)
+    # Each track gets 200 rating updates, cycling 1..5 back to where it started
+    assert {key: lib.get_rating(key) for key in keys} == ratings
+    assert len(lib.library) == 10 + 200
+    assert len(lib.search("stress", limit=1000)) == 200
+
+    with capsys.disabled():
+        print(" tested track_library under concurrent access successfully")
+
+
+def test_concurrent_updates_with_sqlite_backend(restore_library, tmp_path, capsys):
+    lib.use_database(tmp_path / "library.db")
+    keys = hammer_library(plays_per_thread=100, adds_per_thread=50)
+
+    assert all(lib.get_play_count(key) == 40 for key in keys)
+    assert len(lib.library) == 10 + 50
+
+    with capsys.disabled():
+        print(" tested SqliteLibrary under concurrent access successfully")
+
+
+def test_set_ratings_applies_valid_pairs_and_reports_the_rest(restore_library, capsys):
+    changed = []
+    listener = lambda kind, keys: changed.append(keys)
+    lib.subscribe(listener)
+    failures = lib.set_ratings([("01", 1), ("99", 3), ("02", 7), ("03", "4"), ("04", 5), ("01", 2)])
+    lib.unsubscribe(listener)
+
+    assert [(position, key) for position, key, _ in failures] == [(1, "99"), (2, "02"), (3, "03")]
+    assert "not found" in failures[0][2] and "between 1 and 5" in failures[1][2]
+    assert [lib.get_rating(key) for key in ("01", "02", "03", "04")] == [2, 5, 2, 5]
+    assert changed == [("01", "04")]  # One event for the whole batch
+
+    assert lib.set_ratings([("05", 1), ("06", 0)], all_or_nothing=True)
+    assert lib.get_rating("05") == 3
+    assert lib.get_track("05") == ("Someone Like You", "Adele", 3, 0)
+    assert lib.get_track("99") is None
+
+    with capsys.disabled():
+        print(" tested set_ratings() successfully")
+
+
+def test_set_ratings_is_one_database_transaction(restore_library, tmp_path, capsys):
+    store = lib.use_database(str(tmp_path / "library.db"))
+    assert lib.set_ratings([("01", 1), ("02", 2)]) == []
+    assert (lib.get_rating("01"), lib.get_rating("02")) == (1, 2)
+
+    store._conn.execute("CREATE TRIGGER fail BEFORE UPDATE OF rating ON tracks WHEN NEW.key = '05' "
+                        "BEGIN SELECT RAISE(ABORT, 'disk trouble'); END")
+    with pytest.raises(sqlite3.Error):
+        lib.set_ratings([("01", 5), ("03", 5), ("05", 5)])
+    assert [lib.get_rating(key) for key in ("01", "03", "05")] == [1, 2, 3]  # None of the batch was kept
+    with capsys.disabled():
+        print(" tested set_ratings() on a database successfully")
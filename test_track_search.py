@@ -0,0 +1,69 @@
+import pytest
+
+import track_library as lib
+from library_item import LibraryItem
+from track_search import SearchIndex, tokenize
+
+
+@pytest.fixture(autouse=True)
+def restore_library():
+    saved = dict(lib.library)
+    lib.library_changed()
+    yield
+    lib.library.clear()
+    lib.library.update(saved)
+    lib.library_changed()
+
+
+def test_tokenize_normalizes_case_accents_and_punctuation(capsys):
+    assert tokenize("Beyoncé's HALO!") == ["beyonce", "s", "halo"]
+    assert tokenize("AC/DC") == ["ac", "dc"]
+
+    with capsys.disabled():
+        print(" tested tokenize() successfully")
+
+
+def test_search_ranks_exact_prefix_and_fuzzy_matches(capsys):
+    assert lib.search("adele") == ["05", "08"]
+    assert lib.search("rolling adele") == ["08"]
+    assert lib.search("adel") == ["05", "08"]
+    assert lib.search("bohem") == ["06"]
+    assert lib.search("bohemian rapsody") == ["06"]
+    assert lib.search("zzzz") == []
+    assert lib.search("") == []
+
+    with capsys.disabled():
+        print(" tested track_library search() successfully")
+
+
+def test_search_index_updates_incrementally(capsys):
+    lib.search("adele")
+    lib.add_tracks([("11", LibraryItem("Hello", "Adele", 4)), ("05", LibraryItem("Ignored", "Nobody"))])
+    assert lib.search("adele") == ["05", "08", "11"]
+    assert lib.search("nobody") == []
+
+    index = SearchIndex()
+    index.add("a", "Blue Monday", "New Order")
+    index.add("a", "Bizarre Love Triangle", "New Order")
+    assert index.search("monday") == []
+    assert index.prefix_words("bi") == ["bizarre"]
+    index.remove("a")
+    assert len(index) == 0 and index.vocabulary == []
+
+    with capsys.disabled():
+        print(" tested SearchIndex incremental updates successfully")
+
+
+def test_non_latin_names_are_searchable(capsys):
+    assert tokenize("Группа крови") == ["группа", "крови"]
+    assert tokenize("Straße_Mix") == ["strasse", "mix"]
+    lib.add_tracks([("11", LibraryItem("Группа крови", "Кино", 5)),
+                    ("12", LibraryItem("Σαν τρελό φορτηγό", "Μαρινέλλα", 4)),
+                    ("13", LibraryItem("夜に駆ける", "YOASOBI", 5))])
+    assert lib.search("Кино") == ["11"]
+    assert lib.search("КРОВИ") == ["11"]
+    assert lib.search("μαρινελλα") == ["12"]  # Accents and case ignored in Greek too
+    assert lib.search("夜に駆ける") == ["13"]
+    assert lib.search("夜に") == ["13"]  # Prefix of an unspaced CJK title
+    with capsys.disabled():
+        print(" tested search of non-Latin names successfully")
@@ -0,0 +1,109 @@
+import asyncio
+import json
+
+import pytest
+
+import track_library as lib
+import track_server
+from library_item import LibraryItem
+
+
+@pytest.fixture(autouse=True)
+def restore_library():
+    saved = lib.library
+    lib.library = {key: LibraryItem(item.name, item.artist, item.rating) for key, item in saved.items()}
+    lib.library_changed()
+    yield
+    lib.library = saved
+    lib.library_changed()
+
+
+# Start a server, send `requests` pipelined on one connection and return the answers in order
+def exchange(requests, **options):
+    async def run():
+        server = await track_server.TrackServer(port=0, **options).start()
+        reader, writer = await asyncio.open_connection(server.host, server.port)
+        writer.write(b"".join(line if isinstance(line, bytes) else json.dumps(line).encode() + b"\n"
+                              for line in requests))
+        await writer.drain()
+        writer.write_eof()
+        responses = [json.loads(line) async for line in reader]
+        writer.close()
+        await server.stop()
+        return responses
+    return asyncio.run(run())
+
+
+def test_pipelined_requests_are_answered_in_order(capsys):
+    responses = exchange([
+        {"id": 1, "op": "get", "keys": ["05", "99"]},
+        {"id": 2, "op": "increment", "keys": ["05", "05", "09"], "source": "tablet"},
+        {"id": 3, "op": "search", "query": "adele"},
+        {"id": 4, "op": "set_rating", "key": "09", "rating": 5},
+        {"id": 5, "op": "top", "limit": 2},
+        {"id": 6, "op": "list", "sort_by": "rating", "reverse": True, "limit": 3},
+        {"id": 7, "op": "by_artist", "artist": "adele"},
+        {"id": 8, "op": "count"},
+    ], max_in_flight=2, pipeline_depth=2)
+
+    assert [response["id"] for response in responses] == list(range(1, 9))
+    assert responses[0]["result"] == [
+        {"key": "05", "name": "Someone Like You", "artist": "Adele", "rating": 3, "play_count": 0}, None]
+    assert responses[1]["result"] == [1, 2, 1]
+    assert responses[2]["result"] == ["05", "08"]
+    assert responses[3]["result"] == [5]
+    assert responses[4]["result"] == ["05", "09"]
+    assert responses[5]["result"] == ["02", "06", "09"]
+    assert responses[6]["result"] == ["05", "08"]
+    assert responses[7]["result"] == 10
+
+    with capsys.disabled():
+        print(" tested TrackServer pipelining successfully")
+
+
+def test_bad_requests_get_errors_and_keep_the_connection(capsys):
+    responses = exchange([
+        b"not json\n",
+        {"id": 2, "op": "explode"},
+        {"id": 3, "op": "set_rating", "keys": ["01"], "rating": 9},
+        {"id": 4, "op": "get", "keys": "01"},
+        {"id": 5, "op": "count"},
+    ])
+
+    assert [response.get("id") for response in responses] == [None, 2, 3, 4, 5]
+    assert all("error" in response for response in responses[:4])
+    assert responses[4]["result"] == 10
+    assert lib.get_rating("01") == 4
+
+    with capsys.disabled():
+        print(" tested TrackServer error handling successfully")
+
+
+def test_set_rating_rates_all_keys_in_one_batch(capsys):
+    events = []
+    listener = lambda kind, keys: events.append((kind, keys))
+    lib.events.subscribe(listener)
+    try:
+        responses = exchange([{"id": 1, "op": "set_rating", "keys": ["01", "02", "zz"], "rating": 2}])
+    finally:
+        lib.events.unsubscribe(listener)
+
+    assert responses[0]["result"] == [2, 2, -1]
+    assert events == [("rating", ("01", "02"))]
+
+    with capsys.disabled():
+        print(" tested TrackServer bulk ratings successfully")
+
+
+def test_failing_op_gets_an_error_and_keeps_the_connection(monkeypatch, capsys):
+    def broken(artist):
+        raise RuntimeError("index is broken")
+    monkeypatch.setattr(lib, "keys_by_artist", broken)
+    responses = exchange([
+        {"id": 1, "op": "by_artist", "artist": "adele"},
+        {"id": 2, "op": "count"},
+    ])
+
+    assert responses == [{"id": 1, "error": "RuntimeError: index is broken"}, {"id": 2, "result": 10}]
+    with capsys.disabled():
+        print(" tested TrackServer op failures successfully")
@@ -0,0 +1,136 @@
+import pytest
+
+import synthetic_library
+import track_library as lib
+import track_snapshot
+from library_item import LibraryItem
+from track_snapshot import SnapshotLibrary, delta_path, write_snapshot
+
+
+@pytest.fixture
+def restore_library():
+    saved = lib.library
+    lib.library = {key: LibraryItem(item.name, item.artist, item.rating) for key, item in saved.items()}
+    yield
+    if hasattr(lib.library, "close"):
+        lib.library.close()
+    lib.library = saved
+    lib.library_changed()
+
+
+def test_snapshot_reads_tracks_in_order(tmp_path, capsys):
+    tracks = list(synthetic_library.synthetic_tracks(500, seed=4))
+    write_snapshot(tmp_path / "library.snap", tracks)
+    store = SnapshotLibrary(tmp_path / "library.snap")
+
+    assert len(store) == 500
+    assert list(store) == [key for key, _ in tracks]
+    for key, item in tracks[::37]:
+        assert (store[key].name, store[key].artist, store[key].rating, store[key].play_count) == \
+            (item.name, item.artist, item.rating, item.play_count)
+    assert "999" not in store
+    with pytest.raises(KeyError):
+        store["999"]
+    store.close()
+
+    with capsys.disabled():
+        print(" tested SnapshotLibrary lookups successfully")
+
+
+def test_snapshot_keeps_edits_until_saved(tmp_path, capsys):
+    path = tmp_path / "library.snap"
+    write_snapshot(path, [("01", LibraryItem("Hello", "Adele", 4)), ("02", LibraryItem("Café Olé", "Zoë", 2))])
+    store = SnapshotLibrary(path)
+
+    view = store["01"]
+    view.rating = 5
+    view.play_count += 2
+    store["03"] = LibraryItem("New", "Band", 1)
+    del store["02"]
+    assert (view.rating, store["01"].play_count) == (5, 2)
+    assert list(store) == ["01", "03"] and "02" not in store
+    assert SnapshotLibrary(path)["01"].rating == 4  # Nothing written yet
+
+    store.close()
+    reopened = SnapshotLibrary(path)
+    assert list(reopened) == ["01", "03"]
+    assert (reopened["01"].rating, reopened["01"].play_count) == (5, 2)
+    assert not reopened.dirty()
+    reopened.close()
+
+    with capsys.disabled():
+        print(" tested SnapshotLibrary edits and save() successfully")
+
+
+def test_flush_writes_a_delta_not_the_snapshot(tmp_path, capsys):
+    path = tmp_path / "library.snap"
+    write_snapshot(path, [("01", LibraryItem("Hello", "Adele", 4)), ("02", LibraryItem("Café Olé", "Zoë", 2))])
+    before = path.read_bytes()
+    store = SnapshotLibrary(path)
+    store["01"].play_count += 3
+    store["03"] = LibraryItem("New", "Band", 1)
+    del store["02"]
+    store.flush()
+    assert path.read_bytes() == before
+
+    crashed = SnapshotLibrary(path)  # Opened again without close(): the delta is read back
+    assert list(crashed) == ["01", "03"]
+    assert (crashed["01"].play_count, crashed["03"].name) == (3, "New")
+    crashed._unmap()
+
+    store.close()
+    assert path.read_bytes() != before
+    assert not (tmp_path / "library.snap.delta").exists() and delta_path(path) == f"{path}.delta"
+    reopened = SnapshotLibrary(path)
+    assert (list(reopened), reopened["01"].play_count, reopened.dirty()) == (["01", "03"], 3, False)
+    reopened.close()
+    with capsys.disabled():
+        print(" tested SnapshotLibrary.flush() successfully")
+
+
+def test_deleted_track_view_raises_key_error(tmp_path, capsys):
+    path = tmp_path / "library.snap"
+    write_snapshot(path, [("01", LibraryItem("Hello", "Adele", 4))])
+    store = SnapshotLibrary(path)
+    view = store["01"]
+    del store["01"]
+    with pytest.raises(KeyError):
+        view.rating
+    with pytest.raises(KeyError):
+        view.play_count = 1
+    assert "01" not in store.edited
+    store.close()
+    with capsys.disabled():
+        print(" tested deleted SnapshotLibrary tracks successfully")
+
+
+def test_long_text_and_lookup_cache(tmp_path, monkeypatch, capsys):
+    with pytest.raises(ValueError, match="track 01"):
+        write_snapshot(tmp_path / "long.snap", [("01", LibraryItem("x" * 70000, "Long", 1))])
+
+    monkeypatch.setattr(track_snapshot, "ROW_CACHE_SIZE", 10)
+    write_snapshot(tmp_path / "library.snap", synthetic_library.synthetic_tracks(100, seed=5))
+    store = SnapshotLibrary(tmp_path / "library.snap")
+    assert sum(store[key].rating for key in store) > 0  # A full walk
+    assert len(store._rows) <= 10
+    store.close()
+    with capsys.disabled():
+        print(" tested SnapshotLibrary limits successfully")
+
+
+def test_use_snapshot(tmp_path, restore_library, capsys):
+    path = tmp_path / "library.snap"
+    lib.use_snapshot(path)
+    assert lib.get_name("06") == "Bohemian Rhapsody"
+
+    lib.set_rating("06", 1)
+    lib.increment_play_count("06")
+    lib.add_track("11", LibraryItem("Hello", "Adele", 5))
+    assert lib.keys_by_artist("adele") == ["05", "08", "11"]
+    lib.library.close()
+
+    lib.use_snapshot(path)
+    assert (lib.get_rating("06"), lib.get_play_count("06"), lib.get_name("11")) == (1, 1, "Hello")
+
+    with capsys.disabled():
+        print(" tested track_library.use_snapshot() successfully")
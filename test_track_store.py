@@ -0,0 +1,55 @@
+import pytest
+
+import track_library as lib
+from library_item import LibraryItem
+from track_store import SqliteLibrary
+
+
+@pytest.fixture(autouse=True)
+def restore_library():
+    saved = lib.library
+    yield
+    if saved is not lib.library:
+        lib.library.close()
+    lib.library = saved
+
+
+def test_use_database_seeds_and_persists_changes(tmp_path, capsys):
+    path = tmp_path / "library.db"
+    lib.use_database(path)
+
+    assert lib.get_name("06") == "Bohemian Rhapsody"
+    lib.set_rating("06", 2)
+    lib.increment_play_count("06")
+    lib.increment_play_count("06")
+    lib.library.close()
+
+    lib.library = {}  # Make sure nothing is served from memory
+    lib.use_database(path)
+    assert lib.get_rating("06") == 2
+    assert lib.get_play_count("06") == 2
+    assert lib.get_artist("99") is None
+    assert lib.get_rating("99") == -1
+
+    with capsys.disabled():
+        print(" tested use_database() persistence successfully")
+
+
+def test_sqlite_library_behaves_like_a_dict(tmp_path, capsys):
+    store = SqliteLibrary(tmp_path / "library.db", batch_size=2)
+    store["b"] = LibraryItem("Song B", "Artist", 3)
+    store["a"] = LibraryItem("Song A", "Artist", 5)
+
+    assert list(store) == ["b", "a"]  # Insertion order, like dict
+    assert len(store) == 2
+    assert "a" in store and "z" not in store
+    assert store["a"].info() == "Song A - Artist *****"
+    assert store.add_many([("a", LibraryItem("Other", "X")), ("c", LibraryItem("Song C", "Y"))]) == 1
+
+    del store["b"]
+    with pytest.raises(KeyError):
+        store["b"]
+    store.close()
+
+    with capsys.disabled():
+        print(" tested SqliteLibrary mapping behaviour successfully")
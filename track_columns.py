@@ -0,0 +1,131 @@
+from array import array
+from collections.abc import MutableMapping
+
+from library_item import LibraryItem
+
+
+# A lightweight view of one row in a ColumnarLibrary. Views are created on
+# demand by library[key] and read/write straight through to the columns.
+class TrackRow(LibraryItem):
+    __slots__ = ("_columns", "_row")
+
+    def __init__(self, columns, row):
+        self._columns = columns
+        self._row = row
+
+    @property
+    def name(self):
+        return self._columns.names[self._row]
+
+    @name.setter
+    def name(self, value):
+        self._columns.names[self._row] = value
+
+    @property
+    def artist(self):
+        return self._columns.artist_names[self._columns.artist_ids[self._row]]
+
+    @artist.setter
+    def artist(self, value):
+        self._columns.artist_ids[self._row] = self._columns.intern_artist(value)
+
+    @property
+    def rating(self):
+        return self._columns.ratings[self._row]
+
+    @rating.setter
+    def rating(self, value):
+        self._columns.ratings[self._row] = value
+
+    @property
+    def play_count(self):
+        return self._columns.play_counts[self._row]
+
+    @play_count.setter
+    def play_count(self, value):
+        self._columns.play_counts[self._row] = value
+
+
+# Dictionary-like track store that keeps each field in its own column instead of
+# one object per track. Ratings and play counts live in typed arrays and each
+# artist name is stored once, so a track costs a few dozen bytes rather than a
+# full object with its own __dict__. Usable as track_library.library.
+class ColumnarLibrary(MutableMapping):
+    def __init__(self, items=()):
+        self.rows = {}                   # key -> row number
+        self.keys_by_row = []            # row number -> key (None once deleted)
+        self.names = []
+        self.artist_ids = array("I")
+        self.artist_names = []           # artist id -> name
+        self._artist_lookup = {}         # name -> artist id
+        self.ratings = array("b")
+        self.play_counts = array("q")
+        self.free_rows = []              # Rows of deleted tracks, reused by the next tracks added
+        self.add_many(items)
+
+    def intern_artist(self, artist):
+        artist_id = self._artist_lookup.get(artist)
+        if artist_id is None:
+            artist_id = len(self.artist_names)
+            self.artist_names.append(artist)
+            self._artist_lookup[artist] = artist_id
+        return artist_id
+
+    def __getitem__(self, key):
+        return TrackRow(self, self.rows[key])
+
+    def __setitem__(self, key, item):
+        row = self.rows.get(key)
+        if row is None:
+            self._append(key, item)
+            return
+        self.names[row] = item.name
+        self.artist_ids[row] = self.intern_artist(item.artist)
+        self.ratings[row] = item.rating
+        self.play_counts[row] = item.play_count
+
+    def __delitem__(self, key):
+        # Leave a hole rather than shifting every later row; the next track added fills it
+        row = self.rows.pop(key)
+        self.keys_by_row[row] = None
+        self.names[row] = None
+        self.free_rows.append(row)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    # Insert (key, item) pairs whose key is not stored yet, returning how many were added
+    def add_many(self, items):
+        added = 0
+        for key, item in items:
+            if key not in self.rows:
+                self._append(key, item)
+                added += 1
+        return added
+
+    # Readers take no lock, so the columns are filled in before the row is
+    # published: a key found in `rows` always has all of its fields. A row freed
+    # by a deletion is used first, so a library with a lot of churn does not
+    # grow; a view of the deleted track kept from before then shows the new one.
+    def _append(self, key, item):
+        if self.free_rows:
+            row = self.free_rows.pop()
+            self.names[row] = item.name
+            self.artist_ids[row] = self.intern_artist(item.artist)
+            self.ratings[row] = item.rating
+            self.play_counts[row] = item.play_count
+            self.keys_by_row[row] = key
+        else:
+            row = len(self.keys_by_row)
+            self.names.append(item.name)
+            self.artist_ids.append(self.intern_artist(item.artist))
+            self.ratings.append(item.rating)
+            self.play_counts.append(item.play_count)
+            self.keys_by_row.append(key)
+        self.rows[key] = row
@@ -0,0 +1,89 @@
+import threading
+
+# Kinds of change published by track_library
+TRACKS_ADDED = "added"       # New tracks were inserted
+RATING_CHANGED = "rating"    # A track's rating was set
+PLAY_COUNTED = "played"      # A track was played
+LIBRARY_RESET = "reset"      # The whole library was replaced or changed behind our back
+
+
+# Publish/subscribe hub for library changes. Listeners are called as
+# listener(kind, keys) on the thread that made the change, after the library
+# has released its locks.
+class EventBus():
+    def __init__(self):
+        self._listeners = ()
+        self._lock = threading.Lock()
+
+    def subscribe(self, listener):
+        with self._lock:
+            self._listeners = self._listeners + (listener,)
+
+    def unsubscribe(self, listener):
+        with self._lock:
+            self._listeners = tuple(l for l in self._listeners if l != listener)
+
+    def publish(self, kind, keys=()):
+        for listener in self._listeners:  # A tuple, so (un)subscribing while publishing is safe
+            listener(kind, keys)
+
+
+# Everything that changed since a window last redrew
+class ChangeSet():
+    def __init__(self):
+        self.added = []       # Keys of new tracks, in insertion order
+        self.changed = set()  # Keys whose rating or play count changed
+        self.reset = False    # Reload everything
+
+    def add(self, kind, keys):
+        if kind == TRACKS_ADDED:
+            self.added.extend(keys)
+        elif kind == LIBRARY_RESET:
+            self.reset = True
+        else:
+            self.changed.update(keys)
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.reset)
+
+
+# Collects library events for one Tk window and hands them to `on_changes`
+# as a single ChangeSet once per idle cycle, however many events arrived.
+# Events from other threads are picked up by a short poll, since Tk may
+# only be touched from the main thread.
+class TkChangeListener():
+    def __init__(self, widget, on_changes, bus, poll_ms=100):
+        self.widget = widget
+        self.on_changes = on_changes
+        self.bus = bus
+        self.poll_ms = poll_ms
+        self._pending = ChangeSet()
+        self._scheduled = False   # An after_idle delivery is already queued
+        self._lock = threading.Lock()
+        bus.subscribe(self.event)
+        widget.bind("<Destroy>", self._destroyed, add="+")
+        self._poll_id = widget.after(poll_ms, self._poll)
+
+    def event(self, kind, keys):
+        with self._lock:
+            self._pending.add(kind, keys)
+            if self._scheduled or threading.current_thread() is not threading.main_thread():
+                return
+            self._scheduled = True
+        self.widget.after_idle(self.deliver)
+
+    def deliver(self):
+        with self._lock:
+            changes, self._pending = self._pending, ChangeSet()
+            self._scheduled = False
+        if changes:
+            self.on_changes(changes)
+
+    def _poll(self):
+        self.deliver()
+        self._poll_id = self.widget.after(self.poll_ms, self._poll)
+
+    def _destroyed(self, event):
+        if event.widget is self.widget:
+            self.bus.unsubscribe(self.event)
+            self.widget.after_cancel(self._poll_id)
@@ -0,0 +1,221 @@
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import struct
+import sys
+
+import track_library as lib
+import track_importer
+from playlist import Playlist
+
+BUFFER_SIZE = 1 << 20  # Bytes collected before each write to the file
+GZIP_MAGIC = b"\x1f\x8b"
+COMPRESS_LEVEL = 6     # gzip's own default; level 9 is several times slower for a few percent
+
+# File suffix of each export format. The CSV uses the importer's columns, so an
+# export can be loaded again with track_importer.import_csv(); JSON Lines uses
+# the same field names as track_server's answers.
+FORMATS = {"csv": ".csv", "jsonl": ".jsonl", "binary": ".jbx"}
+JSON_FIELDS = ("key", "name", "artist", "rating", "play_count")
+
+# Binary layout, little-endian: MAGIC, then per track a RECORD with the byte
+# lengths of key, name and artist, the rating and the play count, followed by
+# the three UTF-8 strings. Records are written as tracks are read, so the file
+# needs no count or index up front and can be streamed through gzip.
+MAGIC = b"JUKEROW\x01"
+RECORD = struct.Struct("<HHHbq")
+MAX_TEXT_BYTES = (1 << 16) - 1
+
+
+# Collects encoded rows and hands them to `out` in writes of about `size`
+# bytes, calling `on_flush()` after each one; the only buffer an export holds
+class ExportBuffer():
+    def __init__(self, out, size=BUFFER_SIZE, on_flush=None):
+        self.out = out
+        self.size = size
+        self.on_flush = on_flush
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+        if len(self.data) >= self.size:
+            self.flush()
+
+    def flush(self):
+        if self.data:
+            self.out.write(self.data)
+            self.data.clear()
+        if self.on_flush is not None:
+            self.on_flush()
+
+
+def csv_encoder():
+    text = io.StringIO()
+    writer = csv.writer(text)
+
+    def encode(row):
+        text.seek(0)
+        text.truncate()
+        writer.writerow(row)
+        return text.getvalue().encode("utf-8")
+    return ",".join(track_importer.CSV_FIELDS).encode("ascii") + b"\r\n", encode
+
+
+def jsonl_encoder():
+    def encode(row):
+        return (json.dumps(dict(zip(JSON_FIELDS, row)), ensure_ascii=False) + "\n").encode("utf-8")
+    return b"", encode
+
+
+def binary_encoder():
+    def encode(row):
+        key, name, artist = (text.encode("utf-8") for text in row[:3])
+        if max(len(key), len(name), len(artist)) > MAX_TEXT_BYTES:
+            raise ValueError(f"track {row[0]}: text longer than {MAX_TEXT_BYTES} bytes")
+        return RECORD.pack(len(key), len(name), len(artist), row[3], row[4]) + key + name + artist
+    return MAGIC, encode
+
+
+ENCODERS = {"csv": csv_encoder, "jsonl": jsonl_encoder, "binary": binary_encoder}
+
+
+# (format, compress) for `path`, filling in whichever was not given from its
+# suffix, e.g. "library.jsonl.gz" -> ("jsonl", True)
+def export_format(path, fmt=None, compress=None):
+    name = os.fspath(path).lower()
+    if compress is None:
+        compress = name.endswith(".gz")
+    if name.endswith(".gz"):
+        name = name[:-3]
+    if fmt is None:
+        fmt = next((candidate for candidate, suffix in FORMATS.items() if name.endswith(suffix)), "csv")
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}, expected one of {', '.join(FORMATS)}")
+    return fmt, compress
+
+
+# Write the tracks in `keys` (default: the whole library, in library order)
+# with their ratings and play counts to `path`. Tracks are read one at a time
+# from track_library.iter_rows() and encoded into a single buffer of
+# `buffer_size` bytes, so memory use does not grow with the library.
+# `on_progress(rows_written, total_rows)` is called after every buffer written;
+# total_rows is None if `keys` has no length. The file is replaced atomically.
+# Returns the number of tracks written.
+def export_tracks(path, fmt=None, keys=None, compress=None, on_progress=None, buffer_size=BUFFER_SIZE):
+    fmt, compress = export_format(path, fmt, compress)
+    header, encode = ENCODERS[fmt]()
+    if keys is None:
+        total = len(lib.library)
+    else:
+        total = len(keys) if hasattr(keys, "__len__") else None
+    written = 0
+
+    def report():
+        if on_progress is not None:
+            on_progress(written, total)
+
+    temp_path = f"{path}.tmp"
+    export_file = open(temp_path, "wb")
+    try:
+        with export_file:
+            # mtime=0 keeps the gzip header the same for the same tracks
+            out = export_file
+            if compress:
+                out = gzip.GzipFile(fileobj=export_file, mode="wb", compresslevel=COMPRESS_LEVEL, mtime=0,
+                                    filename="")
+            buffer = ExportBuffer(out, buffer_size, report)
+            buffer.write(header)
+            for row in lib.iter_rows(keys):
+                buffer.write(encode(row))
+                written += 1
+            buffer.flush()
+            if compress:
+                out.close()  # Writes the gzip trailer; export_file stays open
+            export_file.flush()
+            os.fsync(export_file.fileno())
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    os.replace(temp_path, path)
+    return written
+
+
+# Export the tracks of a playlist (a Playlist or any sequence of keys) in play
+# order. Keys that are no longer in the library are left out.
+def export_playlist(playlist, path, fmt=None, compress=None, on_progress=None, buffer_size=BUFFER_SIZE):
+    return export_tracks(path, fmt, playlist, compress, on_progress, buffer_size)
+
+
+def open_export(path):
+    export_file = open(path, "rb")
+    if export_file.read(2) == GZIP_MAGIC:
+        export_file.seek(0)
+        return gzip.GzipFile(fileobj=export_file, mode="rb")
+    export_file.seek(0)
+    return export_file
+
+
+# Read an export back as (key, name, artist, rating, play_count) tuples, one
+# at a time. Compression is detected from the file itself.
+def read_export(path, fmt=None):
+    fmt, _ = export_format(path, fmt)
+    with open_export(path) as export_file:
+        if fmt == "csv":
+            rows = csv.reader(io.TextIOWrapper(export_file, encoding="utf-8", newline=""))
+            next(rows, None)  # Header
+            for key, name, artist, rating, play_count in rows:
+                yield key, name, artist, int(rating), int(play_count)
+        elif fmt == "jsonl":
+            for line in export_file:
+                track = json.loads(line)
+                yield tuple(track[field] for field in JSON_FIELDS)
+        else:
+            if export_file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a binary track export")
+            while True:
+                record = export_file.read(RECORD.size)
+                if not record:
+                    return
+                if len(record) < RECORD.size:
+                    raise ValueError(f"{path} is truncated")
+                key_length, name_length, artist_length, rating, play_count = RECORD.unpack(record)
+                text = export_file.read(key_length + name_length + artist_length)
+                if len(text) < key_length + name_length + artist_length:
+                    raise ValueError(f"{path} is truncated")
+                yield (text[:key_length].decode("utf-8"),
+                       text[key_length:key_length + name_length].decode("utf-8"),
+                       text[key_length + name_length:].decode("utf-8"), rating, play_count)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the library or a playlist with ratings and play counts.")
+    parser.add_argument("path", help="file to write; .csv, .jsonl or .jbx, plus .gz to compress")
+    parser.add_argument("--format", choices=FORMATS, help="override the format given by the file suffix")
+    parser.add_argument("--playlist", help="export the tracks of this saved playlist instead of the library")
+    parser.add_argument("--db", help="SQLite library to export")
+    parser.add_argument("--snapshot", help="library snapshot to export")
+    parser.add_argument("--play-log", help="include plays still waiting in this play log")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        lib.use_database(args.db)
+    elif args.snapshot:
+        lib.use_snapshot(args.snapshot)
+    if args.play_log:
+        lib.use_play_log(args.play_log)
+    keys = Playlist.load(args.playlist) if args.playlist else None
+
+    def progress(written, total):
+        if total:
+            print(f"\r{written} of {total} tracks", end="", file=sys.stderr, flush=True)
+
+    written = export_tracks(args.path, args.format, keys, on_progress=progress)
+    print(f"\rExported {written} tracks to {args.path}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
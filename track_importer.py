@@ -0,0 +1,219 @@
+import csv
+import os
+import queue
+import re
+import threading
+
+from library_item import LibraryItem  # Custom class representing a music track
+import track_library as lib           # Custom module handling the track database (dictionary)
+
+CSV_FIELDS = ["track_key", "name", "artist", "rating", "play_count"]
+BATCH_SIZE = 1000  # Number of parsed rows handed to the library at a time
+_RATING_SEPARATOR = re.compile(r"\s*[,\t ]\s*")
+
+
+# A CSV row that could not be imported, with the line it came from
+class RowError():
+    def __init__(self, line, row, message):
+        self.line = line
+        self.row = row
+        self.message = message
+
+    def __str__(self):
+        return f"line {self.line}: {self.message}"
+
+
+# Summary of a finished (or cancelled) import
+class ImportResult():
+    def __init__(self):
+        self.rows = 0          # Data rows read from the file
+        self.added = 0         # Rows inserted into the library
+        self.duplicates = 0    # Rows skipped because the key already exists
+        self.errors = []       # RowError for every rejected row
+        self.cancelled = False
+        self.error = None      # Why the import stopped early (unreadable file, bad encoding), if it did
+
+    def summary(self):
+        text = f"Imported {self.added} of {self.rows} rows"
+        if self.duplicates:
+            text += f", {self.duplicates} already in library"
+        if self.errors:
+            text += f", {len(self.errors)} rejected"
+        if self.cancelled:
+            text += " (cancelled)"
+        if self.error is not None:
+            text += f"; stopped: {self.error}"
+        return text
+
+
+# Wraps a binary file so the CSV reader sees text lines while we count bytes for progress.
+# With `limit`, stops after that many bytes (which must end on a line boundary).
+class _ProgressReader():
+    def __init__(self, data_file, encoding="utf-8-sig", limit=None):
+        self.data_file = data_file
+        self.encoding = encoding
+        self.limit = limit
+        self.bytes_read = 0
+
+    def __iter__(self):
+        encoding = self.encoding
+        for raw in self.data_file:
+            if self.limit is not None and self.bytes_read >= self.limit:
+                return
+            self.bytes_read += len(raw)
+            yield raw.decode(encoding)
+            encoding = "utf-8"  # Only the first line can carry a byte order mark
+
+
+# Turn one CSV row into (key, LibraryItem), raising ValueError with a readable message
+def parse_row(row):
+    if len(row) != len(CSV_FIELDS):
+        raise ValueError(f"expected {len(CSV_FIELDS)} fields, got {len(row)}")
+
+    key, name, artist, rating, play_count = row
+    # A field starting with a space almost always means an unquoted comma split a name
+    for field, value in zip(CSV_FIELDS, row):
+        if value != value.lstrip():
+            raise ValueError(f"{field} {value!r} starts with a space (unquoted comma?)")
+    if not key:
+        raise ValueError("track_key is empty")
+    if not name or not artist:
+        raise ValueError("name and artist are required")
+
+    try:
+        rating = int(rating)
+        play_count = int(play_count)
+    except ValueError:
+        raise ValueError("rating and play_count must be whole numbers") from None
+    if not 0 <= rating <= 5:
+        raise ValueError(f"rating {rating} is not between 0 and 5")
+    if play_count < 0:
+        raise ValueError(f"play_count {play_count} is negative")
+
+    item = LibraryItem(name, artist, rating)
+    item.play_count = play_count
+    return key, item
+
+
+# Parse pasted or loaded "key rating" lines (comma, tab or space separated) for
+# track_library.set_ratings(). Returns ([(line, key, rating)], [RowError]);
+# blank lines and a "track_key,rating" header are skipped.
+def parse_rating_lines(lines):
+    ratings = []
+    errors = []
+    for line_number, line in enumerate(lines, 1):
+        fields = _RATING_SEPARATOR.split(line.strip())
+        if fields == [""] or (line_number == 1 and fields[0].lower() == "track_key"):
+            continue
+        if len(fields) != 2:
+            errors.append(RowError(line_number, fields, "expected a track number and a rating"))
+            continue
+        key, rating = fields
+        try:
+            ratings.append((line_number, key, int(rating)))
+        except ValueError:
+            errors.append(RowError(line_number, fields, f"rating {rating!r} is not a whole number"))
+    return ratings, errors
+
+
+# Stream a CSV file as batches of parsed rows.
+# Yields (batch, bytes_read, total_bytes); rejected rows go to on_error instead of the batch.
+# `start` and `stop` read only that byte range (starting after the header), where
+# `start` follows `first_line` lines, so errors still report the file's line numbers.
+def read_batches(path, batch_size=BATCH_SIZE, on_error=None, cancel_event=None, start=0, stop=None, first_line=0):
+    if stop is None:
+        stop = os.path.getsize(path)
+    total_bytes = stop - start
+    with open(path, "rb") as data_file:
+        data_file.seek(start)
+        reader = _ProgressReader(data_file, "utf-8-sig" if start == 0 else "utf-8", total_bytes)
+        data = csv.reader(reader)
+        if start == 0:
+            next(data, None)  # Skip the header row
+
+        batch = []
+        for row in data:
+            if not row:
+                continue  # Blank line
+            try:
+                batch.append(parse_row(row))
+            except ValueError as e:
+                if on_error is not None:
+                    on_error(RowError(first_line + data.line_num, row, str(e)))
+
+            if len(batch) >= batch_size:
+                yield batch, reader.bytes_read, total_bytes
+                batch = []
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+
+        if batch:
+            yield batch, reader.bytes_read, total_bytes
+
+
+# Import a CSV file (or the byte range start-stop of it, see read_batches)
+# straight into the library without any GUI involvement. A file that cannot
+# be read to the end is reported in result.error; rows before that are kept.
+def import_csv(path, batch_size=BATCH_SIZE, on_progress=None, cancel_event=None, start=0, stop=None,
+               first_line=0):
+    result = ImportResult()
+    try:
+        for batch, bytes_read, total_bytes in read_batches(path, batch_size, result.errors.append, cancel_event,
+                                                           start, stop, first_line):
+            apply_batch(batch, result)
+            if on_progress is not None:
+                on_progress(result, bytes_read, total_bytes)
+    except (OSError, ValueError, csv.Error) as e:  # UnicodeDecodeError is a ValueError
+        result.error = e
+    result.rows += len(result.errors)
+    result.cancelled = cancel_event is not None and cancel_event.is_set()
+    return result
+
+
+# Insert one batch of parsed rows into the library and update the running totals
+def apply_batch(batch, result):
+    added = lib.add_tracks(batch)
+    result.rows += len(batch)
+    result.added += added
+    result.duplicates += len(batch) - added
+
+
+# Background thread that parses a CSV file and posts batches to a queue.
+# The GUI drains the queue from its own thread (see TrackViewer.poll_import) so
+# the library is only ever modified on the Tk main thread.
+class CsvImportWorker(threading.Thread):
+    def __init__(self, path, batch_size=BATCH_SIZE, max_pending=8, start=0, stop=None, first_line=0):
+        super().__init__(daemon=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.byte_range = (start, stop, first_line)  # See read_batches
+        # Bounded so a slow UI applies back-pressure instead of buffering the whole file
+        self.messages = queue.Queue(maxsize=max_pending)
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _post(self, message):
+        # Keep retrying so a cancel request is noticed even while the queue is full
+        while True:
+            try:
+                self.messages.put(message, timeout=0.1)
+                return
+            except queue.Full:
+                if self.cancel_event.is_set() and message[0] != "done":
+                    return
+
+    def run(self):
+        error = None
+        try:
+            for batch, bytes_read, total_bytes in read_batches(
+                    self.path, self.batch_size, lambda e: self._post(("error", e)), self.cancel_event,
+                    *self.byte_range):
+                self._post(("batch", batch, bytes_read, total_bytes))
+                if self.cancel_event.is_set():
+                    break
+        except Exception as e:  # Bad encoding or CSV as well as I/O: the GUI must always hear "done"
+            error = e
+        finally:
+            self._post(("done", error))
@@ -0,0 +1,119 @@
+import bisect
+import threading
+
+import track_events
+
+
+# Artist names are matched without case or surrounding spaces ("adele " finds "Adele")
+def normalize_artist(artist):
+    return artist.strip().casefold()
+
+
+# Secondary indexes over a library: artist -> keys, rating -> keys, and
+# play count -> keys with the distinct counts kept sorted, so lookups and
+# top-N queries cost O(result) instead of a scan of every track.
+#
+# The indexes listen to track_library's change events and re-read the
+# changed tracks, so they stay current through set_rating(),
+# increment_play_count() and imports. They are built on the first query and
+# thrown away on a library reset, so a library nobody queries pays nothing.
+class TrackIndexes():
+    def __init__(self, lookup):
+        self.lookup = lookup        # key -> (artist, rating, play_count), or None if not in the library
+        self.by_artist = {}         # normalized artist -> {key: None}, an ordered set
+        self.by_rating = {}         # rating -> {key: None}
+        self.by_plays = {}          # play count -> {key: None}, in the order keys reached that count
+        self.play_counts = []       # Every count in self.by_plays, ascending
+        self.entries = {}           # key -> (normalized artist, rating, play_count) as indexed
+        self.built = False
+        self.lock = threading.RLock()
+
+    # track_events listener
+    def event(self, kind, keys):
+        if not self.built:
+            return
+        if kind == track_events.LIBRARY_RESET:
+            with self.lock:
+                self.clear()
+            return
+        with self.lock:
+            for key in keys:
+                self.refresh(key)
+
+    def clear(self):
+        self.by_artist = {}
+        self.by_rating = {}
+        self.by_plays = {}
+        self.play_counts = []
+        self.entries = {}
+        self.built = False
+
+    # Index every (key, artist, rating, play_count) row, replacing what was there.
+    # Marked built first, so changes made while the rows are read queue up on
+    # the lock and are applied afterwards instead of being missed.
+    def build(self, rows):
+        with self.lock:
+            self.clear()
+            self.built = True
+            for key, artist, rating, play_count in rows:
+                if key not in self.entries:
+                    self._insert(key, (normalize_artist(artist), rating, play_count))
+
+    # Re-read one track and move it to its current buckets
+    def refresh(self, key):
+        values = self.lookup(key)
+        entry = None if values is None else (normalize_artist(values[0]), values[1], values[2])
+        old = self.entries.get(key)
+        if entry == old:
+            return
+        if old is not None:
+            self._remove(key, old)
+        if entry is not None:
+            self._insert(key, entry)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _insert(self, key, entry):
+        artist, rating, play_count = entry
+        self.entries[key] = entry
+        self.by_artist.setdefault(artist, {})[key] = None
+        self.by_rating.setdefault(rating, {})[key] = None
+        keys = self.by_plays.get(play_count)
+        if keys is None:
+            keys = self.by_plays[play_count] = {}
+            bisect.insort(self.play_counts, play_count)
+        keys[key] = None
+
+    def _remove(self, key, entry):
+        artist, rating, play_count = entry
+        del self.entries[key]
+        for index, value in ((self.by_artist, artist), (self.by_rating, rating)):
+            keys = index[value]
+            del keys[key]
+            if not keys:
+                del index[value]
+        keys = self.by_plays[play_count]
+        del keys[key]
+        if not keys:
+            del self.by_plays[play_count]
+            del self.play_counts[bisect.bisect_left(self.play_counts, play_count)]
+
+    def keys_by_artist(self, artist):
+        with self.lock:
+            return sorted(self.by_artist.get(normalize_artist(artist), ()))
+
+    def keys_by_rating(self, rating):
+        with self.lock:
+            return sorted(self.by_rating.get(rating, ()))
+
+    # The `limit` most played keys, most played first; ties in the order the tracks reached that count
+    def most_played(self, limit):
+        result = []
+        with self.lock:
+            for play_count in reversed(self.play_counts):
+                for key in self.by_plays[play_count]:
+                    if len(result) == limit:
+                        return result
+                    result.append(key)
+        return result
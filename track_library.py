@@ -1,4 +1,14 @@
+import atexit
+import os
+import threading
+from collections import deque
+from contextlib import ExitStack
+
 from library_item import LibraryItem
+from striped_lock import StripedLock
+import track_events
+import track_indexes
+import track_search
 
 
 library = {}
@@ -12,12 +22,127 @@ library["07"] = LibraryItem("Smells Like Teen Spirit", "Nirvana", 4)
 library["08"] = LibraryItem("Rolling in the Deep", "Adele", 4)
 library["09"] = LibraryItem("Blinding Lights", "The Weeknd", 3)
 library["10"] = LibraryItem("Lose Yourself", "Eminem", 5)
+
+
+SORT_FIELDS = ("key", "name", "artist", "rating", "play_count")
+MIN_RATING = 1
+MAX_RATING = 5
+RECENT_PLAYS = 50  # Plays remembered by recently_played()
+search_index = None  # track_search.SearchIndex, built by the first search()
+play_log = None      # play_log.PlayLog, when plays are recorded through a log
+
+# Windows and background workers share the library, so:
+#  - structure_lock guards which tracks exist (inserts, the search index, switching backends)
+#  - key_locks guards read-modify-write updates of a single track
+#  - readers iterate an immutable snapshot of the keys, rebuilt after inserts
+structure_lock = threading.RLock()
+key_locks = StripedLock()
+events = track_events.EventBus()  # Change notifications, see subscribe()
+_key_snapshot = (None, ())  # (library the keys came from, tuple of keys)
+recent_plays = deque(maxlen=RECENT_PLAYS)  # Keys in the order they were played
+
+
+# Tuple of every key in insertion order; safe to iterate while other threads add tracks
+def snapshot_keys():
+    global _key_snapshot
+    source, keys = _key_snapshot
+    if source is not library:
+        with structure_lock:
+            if _key_snapshot[0] is not library:
+                _key_snapshot = (library, tuple(library))
+            keys = _key_snapshot[1]
+    return keys
+
+
+# Call after adding or removing tracks through `library` directly instead of add_tracks()
+def library_changed():
+    global _key_snapshot, search_index
+    with structure_lock:
+        _key_snapshot = (None, ())
+        search_index = None
+    events.publish(track_events.LIBRARY_RESET)
+
+
+# Call listener(kind, keys) after every change; kinds are defined in track_events
+def subscribe(listener):
+    events.subscribe(listener)
+
+
+def unsubscribe(listener):
+    events.unsubscribe(listener)
+
+
 def list_all():
-    output = ""
-    for key in library:
+    return "".join(f"{line}\n" for line in list_page())
+
+
+# Keys in display order: insertion order by default, or sorted by one of SORT_FIELDS
+def track_keys(sort_by=None, reverse=False):
+    keys = snapshot_keys()
+    if sort_by is None:
+        return list(reversed(keys)) if reverse else list(keys)
+    if sort_by == "key":
+        return sorted(keys, reverse=reverse)
+    if sort_by not in SORT_FIELDS:
+        raise ValueError(f"cannot sort tracks by {sort_by!r}")
+    if sort_by == "play_count":
+        return sorted(keys, key=get_play_count, reverse=reverse)  # Include logged plays
+    return sorted(keys, key=lambda key: getattr(library[key], sort_by), reverse=reverse)
+
+
+# Yield (key, item) pairs for one page of the library without building the whole listing
+def iter_tracks(offset=0, limit=None, sort_by=None, reverse=False):
+    stop = None if limit is None else offset + limit
+    if sort_by is None and not reverse:
+        keys = snapshot_keys()[offset:stop]
+    else:
+        keys = track_keys(sort_by, reverse)[offset:stop]
+    for key in keys:
+        try:
+            item = library[key]
+        except KeyError:
+            continue  # Removed since the snapshot was taken
+        yield key, item
+
+
+# One line per track, as shown by list_all()
+def list_page(offset=0, limit=None, sort_by=None, reverse=False):
+    return [f"{key} {item.info()}" for key, item in iter_tracks(offset, limit, sort_by, reverse)]
+
+
+# Yield (key, name, artist, rating, play_count) tuples for `keys` (default:
+# every track, in library order) one at a time, so callers such as the
+# exporters never hold more than one track. Keys not in the library are skipped.
+def iter_rows(keys=None):
+    rows = getattr(library, "iter_rows", None)  # Storage backends may read whole pages at once
+    if keys is None and rows is not None:
+        rows = rows()
+    else:
+        rows = _item_rows(snapshot_keys() if keys is None else keys)
+    if play_log is None:
+        yield from rows
+        return
+    for row in rows:
+        play_count = get_play_count(row[0])  # Stored count plus plays still in the log, read together
+        if play_count >= 0:
+            yield row[:4] + (play_count,)
+
+
+def _item_rows(keys):
+    for key in keys:
+        try:
+            item = library[key]
+        except KeyError:
+            continue
+        yield key, item.name, item.artist, item.rating, item.play_count
+
+
+def describe(key):
+    try:
         item = library[key]
-        output += f"{key} {item.info()}\n"
-    return output
+        return f"{key} {item.info()}"
+    except KeyError:
+        return None
 
 
 def get_name(key):
@@ -36,6 +161,15 @@ def get_artist(key):
         return None
 
 
+# (name, artist, rating, play_count) of a track in one lookup, or None
+def get_track(key):
+    try:
+        item = library[key]
+    except KeyError:
+        return None
+    return item.name, item.artist, item.rating, get_play_count(key)
+
+
 def get_rating(key):
     try:
         item = library[key]
@@ -45,24 +179,284 @@ def get_rating(key):
 
 
 def set_rating(key, rating):
-    try:
-        item = library[key]
-        item.rating = rating
-    except KeyError:
-        return
+    with key_locks.lock_for(key):
+        try:
+            item = library[key]
+            item.rating = rating
+        except KeyError:
+            return
+    events.publish(track_events.RATING_CHANGED, (key,))
+
+
+# Atomically replace a track's rating with change(old_rating).
+# Returns the new rating, or None if the track does not exist.
+def update_rating(key, change):
+    with key_locks.lock_for(key):
+        try:
+            item = library[key]
+        except KeyError:
+            return None
+        item.rating = rating = change(item.rating)
+    events.publish(track_events.RATING_CHANGED, (key,))
+    return rating
+
+
+# Set many ratings at once from (key, rating) pairs. Every pair is checked
+# first, then the valid ones are applied while holding the locks of all the
+# keys involved, so no other rating update of those keys interleaves with the
+# batch. Readers take no lock and may see part of a batch while it is applied.
+# Backends with set_ratings() store the batch in one transaction, so it is
+# saved completely or not at all.
+# With all_or_nothing, a single bad pair means nothing is changed.
+# Returns (position, key, message) for every pair that was rejected.
+def set_ratings(pairs, all_or_nothing=False):
+    pairs = list(pairs)
+    failures = []
+    updates = {}  # key -> (item, rating); a later pair for the same key wins
+    with ExitStack() as stack:
+        for lock in key_locks.locks_for(key for key, _ in pairs):
+            stack.enter_context(lock)
+        for position, (key, rating) in enumerate(pairs):
+            if not isinstance(rating, int) or isinstance(rating, bool):
+                failures.append((position, key, f"rating {rating!r} is not a whole number"))
+            elif not MIN_RATING <= rating <= MAX_RATING:
+                failures.append((position, key, f"rating {rating} is not between {MIN_RATING} and {MAX_RATING}"))
+            else:
+                try:
+                    updates[key] = (library[key], rating)
+                except KeyError:
+                    failures.append((position, key, f"track {key} not found"))
+        if failures and all_or_nothing:
+            return failures
+        store_ratings = getattr(library, "set_ratings", None)
+        if store_ratings is not None:
+            store_ratings({key: rating for key, (_, rating) in updates.items()})
+        else:
+            for item, rating in updates.values():
+                item.rating = rating
+    if updates:
+        events.publish(track_events.RATING_CHANGED, tuple(updates))  # One redraw for the whole batch
+    return failures
 
 
 def get_play_count(key):
     try:
         item = library[key]
-        return item.play_count
     except KeyError:
         return -1
+    if play_log is None:
+        return item.play_count
+    with play_log.lock:  # Not mid-way through folding the log into the stored count
+        return item.play_count + play_log.pending_plays(key)
+
+
+# `source` names the window (or other client) the play came from; it is only
+# kept when plays go through the play log
+def increment_play_count(key, source=None):
+    if play_log is not None:
+        if key not in library:
+            return
+        play_log.record(key, source)
+    elif not (hasattr(library, "increment") and library.increment(key)):
+        # Not counted in shared memory, which includes tracks without a shared slot
+        with key_locks.lock_for(key):
+            try:
+                item = library[key]
+                item.play_count += 1
+            except KeyError:
+                return
+    recent_plays.append(key)
+    events.publish(track_events.PLAY_COUNTED, (key,))
+
+
+# Keys of the last RECENT_PLAYS plays, most recent first (a key repeats if it was played again)
+def recently_played():
+    return list(reversed(recent_plays))
+
+
+def add_track(key, item):
+    return add_tracks([(key, item)]) == 1
 
 
-def increment_play_count(key):
+# Insert (key, item) pairs whose key is not in the library yet, returning how many were added
+def add_tracks(items):
+    global _key_snapshot
+    with structure_lock:  # Check-then-insert as one step
+        new_items = {}
+        for key, item in items:
+            if key not in new_items and key not in library:
+                new_items[key] = item
+        if not new_items:
+            return 0
+        add_many = getattr(library, "add_many", None)  # Storage backends may insert in bulk
+        if add_many is not None:
+            add_many(new_items.items())
+        else:
+            library.update(new_items)
+        _key_snapshot = (None, ())
+        if search_index is not None:
+            for key, item in new_items.items():
+                search_index.add(key, item.name, item.artist)
+    events.publish(track_events.TRACKS_ADDED, tuple(new_items))
+    return len(new_items)
+
+
+# What the secondary indexes store for one track, or None if it is not in the library
+def _index_values(key):
     try:
         item = library[key]
-        item.play_count += 1
     except KeyError:
+        return None
+    return item.artist, item.rating, get_play_count(key)
+
+
+# Artist, rating and play-count indexes, built by the first query below and kept
+# current by the change events, so they are only paid for once someone asks
+indexes = track_indexes.TrackIndexes(_index_values)
+events.subscribe(indexes.event)
+
+
+def _built_indexes():
+    with indexes.lock:
+        if not indexes.built:
+            values = ((key, _index_values(key)) for key in snapshot_keys())
+            indexes.build((key,) + row for key, row in values if row is not None)
+    return indexes
+
+
+# Keys of every track by `artist` (ignoring case and surrounding spaces), in key order
+def keys_by_artist(artist):
+    return _built_indexes().keys_by_artist(artist)
+
+
+# Keys of every track with exactly this rating, in key order
+def keys_by_rating(rating):
+    return _built_indexes().keys_by_rating(rating)
+
+
+# Keys of the `limit` most played tracks, most played first
+def most_played(limit=50):
+    return _built_indexes().most_played(limit)
+
+
+# Keys of the tracks whose name or artist best match `query`, best first.
+# The index is built on first use and kept up to date by add_tracks().
+def search(query, limit=20):
+    global search_index
+    with structure_lock:
+        if search_index is None:
+            index = track_search.SearchIndex()
+            for key in library:
+                item = library[key]
+                index.add(key, item.name, item.artist)
+            search_index = index
+        return search_index.search(query, limit)
+
+
+# Switch the library to a persistent SQLite database at `path`.
+# A new database is seeded with the tracks currently in memory.
+def use_database(path):
+    global library, search_index
+    import track_store
+    store = track_store.SqliteLibrary(path)
+    with structure_lock:
+        if len(store) == 0:
+            store.add_many(library.items())
+            store.flush()
+        library = store
+        search_index = None
+    events.publish(track_events.LIBRARY_RESET)
+    atexit.register(store.close)
+    return store
+
+
+# Switch the library to a memory-mapped snapshot at `path`, written from the
+# tracks currently in memory if it does not exist yet. Edits are kept in memory
+# and written to a new snapshot by save() or at exit; flush() keeps them in a
+# delta file next to the snapshot meanwhile.
+def use_snapshot(path):
+    global library, search_index
+    import track_snapshot
+    with structure_lock:
+        if not os.path.exists(path):
+            track_snapshot.write_snapshot(path, library.items())
+        store = track_snapshot.SnapshotLibrary(path)
+        library = store
+        search_index = None
+    events.publish(track_events.LIBRARY_RESET)
+    atexit.register(store.close)
+    return store
+
+
+# Switch the in-memory library to the compact column-per-field layout
+def use_columnar_storage():
+    global library, search_index
+    import track_columns
+    with structure_lock:
+        library = track_columns.ColumnarLibrary(library.items())
+        search_index = None
+    events.publish(track_events.LIBRARY_RESET)
+    return library
+
+
+# Keep ratings and play counts in the shared memory segment `name`, so jukebox
+# processes on this host see each other's plays as they happen. Every process
+# runs its own `zone`, by default the first one free; see shared_counts.py.
+# Call poll_shared_counts() regularly to hear about changes made by the other processes.
+def use_shared_counts(name, zone=None, **options):
+    global library
+    import shared_counts
+    if play_log is not None:
+        raise ValueError("shared counts cannot be combined with a play log: "
+                         "other processes would only see plays when the log is compacted")
+    with structure_lock:
+        library = shared_counts.SharedCountsLibrary(library, name, zone, **options)
+    events.publish(track_events.LIBRARY_RESET)
+    atexit.register(library.close)
+    return library
+
+
+# Publish the plays and rating changes other processes made through shared counts
+def poll_shared_counts():
+    poll_changes = getattr(library, "poll_changes", None)
+    if poll_changes is None:
         return
+    played, rated, overflowed = poll_changes()
+    if overflowed:
+        events.publish(track_events.LIBRARY_RESET)
+        return
+    if played:
+        events.publish(track_events.PLAY_COUNTED, tuple(played))
+    if rated:
+        events.publish(track_events.RATING_CHANGED, tuple(rated))
+
+
+# Record plays in an append-only log at `path` instead of updating each track.
+# Logged plays are folded into the stored play counts when the log is compacted.
+def use_play_log(path, **options):
+    global play_log
+    import play_log as play_log_module
+    if hasattr(library, "poll_changes"):
+        raise ValueError("a play log cannot be combined with shared counts: "
+                         "other processes would only see plays when the log is compacted")
+    if play_log is not None:
+        play_log.close()
+    play_log = play_log_module.PlayLog(path, fold_play_counts, **options)
+    atexit.register(play_log.close)
+    events.publish(track_events.LIBRARY_RESET)  # Replayed plays change the counts
+    return play_log
+
+
+# Add {key: plays} to the stored play counts. Returns whether the library
+# keeps them once this process exits, as its flush() reports; if not, the play
+# log must keep the plays.
+def fold_play_counts(counts):
+    for key, plays in counts.items():
+        with key_locks.lock_for(key):
+            try:
+                item = library[key]
+                item.play_count += plays
+            except KeyError:
+                continue
+    flush = getattr(library, "flush", None)  # Persistent backends commit the new counts
+    return flush is not None and flush() is True
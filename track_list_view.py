@@ -0,0 +1,143 @@
+import tkinter as tk
+
+import track_library as lib  # Custom module handling the track database (dictionary)
+
+
+# Scrollable list of tracks that only ever holds the rows currently on screen.
+# The scrollbar is driven by hand against the full key list, so showing a
+# library of any size costs one page of lookups per scroll step.
+class TrackListView(tk.Frame):
+    def __init__(self, parent, width=48, height=12, empty_text="", on_select=None):
+        super().__init__(parent)
+        self.rows = height               # Number of visible rows
+        self.keys = []                   # Keys of the whole listing, in display order
+        self.first = 0                   # Index in self.keys of the top visible row
+        self.sort_by = None
+        self.reverse = False
+        self.showing_library = False     # True when self.keys is the whole library, not search results
+        self.empty_text = empty_text     # Shown after refresh() when the library is empty
+        self.on_select = on_select       # Called with the key of a clicked row
+
+        self.listbox = tk.Listbox(self, width=width, height=height, font="TkFixedFont",
+                                  activestyle="none", exportselection=False)
+        self.listbox.grid(row=0, column=0, sticky="NSEW")
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.scroll)
+        self.scrollbar.grid(row=0, column=1, sticky="NS")
+
+        self.listbox.bind("<MouseWheel>", self.mouse_wheel)
+        self.listbox.bind("<Button-4>", lambda event: self.scroll("scroll", -3, "units"))
+        self.listbox.bind("<Button-5>", lambda event: self.scroll("scroll", 3, "units"))
+        self.listbox.bind("<<ListboxSelect>>", self.row_selected)
+
+    # Reload the key list from the library and redraw the visible rows
+    def refresh(self):
+        self.keys = lib.track_keys(self.sort_by, self.reverse)
+        self.showing_library = True
+        self.show_rows(self.first)
+
+    # Show just the given keys, e.g. search results, until the next refresh()
+    def show_keys(self, keys):
+        self.keys = list(keys)
+        self.showing_library = False
+        self.show_rows(0)
+
+    # Patch the list after library changes (a track_events.ChangeSet) instead of
+    # reloading it: new tracks are appended and only visible rows are redrawn
+    def apply_changes(self, changes):
+        if changes.reset or (changes.added and self.showing_library and self.sort_by is not None):
+            if self.showing_library:
+                self.refresh()  # New tracks have to be sorted into place
+            return
+        if changes.added and self.showing_library:
+            if self.reverse:
+                self.keys[0:0] = reversed(changes.added)
+            else:
+                self.keys.extend(changes.added)
+            self.show_rows(self.first)
+            return
+        visible = self.keys[self.first:self.first + self.rows]
+        if any(key in changes.changed for key in visible):
+            self.show_rows(self.first)
+
+    def set_sort(self, sort_by, reverse=False):
+        self.sort_by = sort_by
+        self.reverse = reverse
+        self.first = 0
+        self.refresh()
+
+    # Scroll so the given key is visible
+    def see(self, key):
+        try:
+            index = self.keys.index(key)
+        except ValueError:
+            return
+        if not self.first <= index < self.first + self.rows:
+            self.show_rows(index)
+
+    # Scrollbar command: ("moveto", fraction) or ("scroll", count, "units"/"pages")
+    def scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            first = int(float(amount) * len(self.keys))
+        elif unit == "pages":
+            first = self.first + int(amount) * self.rows
+        else:
+            first = self.first + int(amount)
+        self.show_rows(first)
+
+    def mouse_wheel(self, event):
+        self.scroll("scroll", -3 if event.delta > 0 else 3, "units")
+
+    def row_selected(self, event):
+        selection = self.listbox.curselection()
+        index = self.first + selection[0] if selection else len(self.keys)
+        if self.on_select is not None and index < len(self.keys):
+            self.on_select(self.keys[index])
+
+    # Fill the listbox with the rows starting at `first`
+    def show_rows(self, first):
+        total = len(self.keys)
+        self.first = max(0, min(first, total - self.rows))
+        self.listbox.delete(0, tk.END)
+        if not total:
+            if self.empty_text:
+                self.listbox.insert(tk.END, self.empty_text)
+            self.scrollbar.set(0, 1)
+            return
+
+        for key in self.keys[self.first:self.first + self.rows]:
+            line = lib.describe(key)
+            if line is not None:
+                self.listbox.insert(tk.END, line)
+        self.scrollbar.set(self.first / total, min(1, (self.first + self.rows) / total))
+
+
+# Entry box that searches the library as you type.
+# on_results is called with (query, keys); an empty query gives an empty key list.
+class SearchBar(tk.Frame):
+    def __init__(self, parent, on_results, width=30, limit=200, delay=150):
+        super().__init__(parent)
+        self.on_results = on_results
+        self.limit = limit        # Most results to return
+        self.delay = delay        # Milliseconds of typing pause before searching
+        self._pending = None      # after() id of the scheduled search
+
+        search_lbl = tk.Label(self, text="Search:")
+        search_lbl.grid(row=0, column=0, padx=(0, 5))
+        self.entry = tk.Entry(self, width=width)
+        self.entry.grid(row=0, column=1)
+        self.entry.bind("<KeyRelease>", self.schedule_search)
+        self.entry.bind("<Return>", lambda event: self.search())
+
+    # Wait for a pause in typing instead of searching on every key
+    def schedule_search(self, event=None):
+        if self._pending is not None:
+            self.after_cancel(self._pending)
+        self._pending = self.after(self.delay, self.search)
+
+    def search(self):
+        if self._pending is not None:
+            self.after_cancel(self._pending)
+            self._pending = None
+        query = self.entry.get().strip()
+        keys = lib.search(query, self.limit) if query else []
+        self.on_results(query, keys)
@@ -1,24 +1,84 @@
+import importlib
+import os
+import time
 import tkinter as tk
 
 import font_manager as fonts                 # Module to configure font settings
-from view_tracks import TrackViewer         # Module to view existing tracks
-from create_track_list import TrackPlaylist # Module to create playlists
-from update_track import UpdateTrack        # Module to update track ratings
+import track_library as lib                  # Shared track library
+
+# Sub-windows by name: (module, class). Each module (and PIL, which the viewer
+# needs) is only imported when its window is first opened, so the main window
+# appears without paying for them.
+SUB_WINDOWS = {
+    "view": ("view_tracks", "TrackViewer"),           # Module to view existing tracks
+    "playlist": ("create_track_list", "TrackPlaylist"),  # Module to create playlists
+    "update": ("update_track", "UpdateTrack"),        # Module to update track ratings
+}
+open_windows = {}  # name -> Toplevel that has already been built
+
+# Show a sub-window, building it on first use and reusing it afterwards
+def show_sub_window(name):
+    toplevel = open_windows.get(name)
+    if toplevel is not None and toplevel.winfo_exists():
+        toplevel.deiconify()  # Bring back the hidden window with its state intact
+        toplevel.lift()
+        return
+    module_name, class_name = SUB_WINDOWS[name]
+    window_class = getattr(importlib.import_module(module_name), class_name)
+    toplevel = tk.Toplevel(window)
+    window_class(toplevel)
+    toplevel.protocol("WM_DELETE_WINDOW", toplevel.withdraw)  # Hide instead of destroying
+    open_windows[name] = toplevel
 
 # Function triggered when the "View Tracks" button is clicked
 def view_tracks_clicked():
     status_lbl.configure(text="View Tracks button was clicked!")  # Update status label
-    TrackViewer(tk.Toplevel(window))  # Open a new child window with the TrackViewer GUI
+    show_sub_window("view")  # Open (or bring back) the TrackViewer window
 
 # Function triggered when the "Create Track List" button is clicked
 def create_track_list():
     status_lbl.configure(text="Create Track button was clicked!")  # Update status label
-    TrackPlaylist(tk.Toplevel(window))  # Open a new child window with the playlist creation interface
+    show_sub_window("playlist")  # Open (or bring back) the playlist creation window
 
 # Function triggered when the "Update Tracks" button is clicked
 def update_tracks():
     status_lbl.configure(text="Update Track button was clicked!")  # Update status label
-    UpdateTrack(tk.Toplevel(window))  # Open a new child window with the track update interface
+    show_sub_window("update")  # Open (or bring back) the track update window
+
+# Keep ratings and play counts between runs when JUKEBOX_DB names a database file
+if os.environ.get("JUKEBOX_DB"):
+    lib.use_database(os.environ["JUKEBOX_DB"])
+
+# Open the library from a memory-mapped snapshot when JUKEBOX_SNAPSHOT names one
+elif os.environ.get("JUKEBOX_SNAPSHOT"):
+    lib.use_snapshot(os.environ["JUKEBOX_SNAPSHOT"])
+
+# Record plays in an append-only log when JUKEBOX_PLAY_LOG names a log file
+if os.environ.get("JUKEBOX_PLAY_LOG"):
+    lib.use_play_log(os.environ["JUKEBOX_PLAY_LOG"])
+
+# Share ratings and play counts with the other jukeboxes on this host when
+# JUKEBOX_SHARED_COUNTS names a segment. Each one runs the zone in JUKEBOX_ZONE,
+# or the first zone no other jukebox holds. Not possible with JUKEBOX_PLAY_LOG.
+if os.environ.get("JUKEBOX_SHARED_COUNTS"):
+    zone = os.environ.get("JUKEBOX_ZONE")
+    lib.use_shared_counts(os.environ["JUKEBOX_SHARED_COUNTS"], int(zone) if zone else None)
+
+# Redraw tracks played or rated by the other jukeboxes
+def poll_shared_counts():
+    lib.poll_shared_counts()
+    window.after(500, poll_shared_counts)
+
+# Write buffered play events to disk even when nothing else is being played
+def flush_play_log():
+    lib.play_log.flush()
+    window.after(1000, flush_play_log)
+
+# Time library calls and UI callbacks when JUKEBOX_METRICS names a file to write them to
+if os.environ.get("JUKEBOX_METRICS"):
+    import instrumentation
+    instrumentation.enable(float(os.environ.get("JUKEBOX_STALL_MS", "200")) / 1000,
+                           os.environ["JUKEBOX_METRICS"])
 
 # Initialize the main application window
 window = tk.Tk()
@@ -68,6 +128,22 @@ status_lbl = tk.Label(
 )
 status_lbl.grid(row=2, column=0, columnspan=3, padx=10, pady=10)
 
+if lib.play_log is not None:
+    window.after(1000, flush_play_log)
+if os.environ.get("JUKEBOX_SHARED_COUNTS"):
+    window.after(500, poll_shared_counts)
+
+# F12 opens the live performance stats when instrumentation is on
+if os.environ.get("JUKEBOX_METRICS"):
+    window.bind("<F12>", lambda event: instrumentation.show_stats_window(window))
+
+# Report time-to-first-frame to bench_startup.py once the main window has been drawn
+if os.environ.get("JUKEBOX_REPORT_FIRST_FRAME"):
+    def report_first_frame():
+        window.update_idletasks()
+        print(f"first-frame {time.time()}", flush=True)
+    window.after_idle(report_first_frame)
+
 # Start the main application loop
 window.mainloop()
 
@@ -0,0 +1,151 @@
+import bisect
+import heapq
+import re
+import unicodedata
+from collections import Counter
+
+# Scores for how a query word matched a word in a track
+EXACT_MATCH = 3.0
+PREFIX_MATCH = 2.0
+MIN_SIMILARITY = 0.4  # Trigram overlap needed for a fuzzy match (0-1)
+MIN_FUZZY_LENGTH = 3  # Shorter query words only match exactly or as a prefix
+
+_ASCII_WORD = re.compile(r"[a-z0-9]+")
+_WORD = re.compile(r"[^\W_]+")  # Letters and digits of any script
+
+
+# Lower-case, accent-free words of a name or artist ("Beyoncé's" -> ["beyonce", "s"],
+# "Группа крови" -> ["группа", "крови"])
+def tokenize(text):
+    if text.isascii():  # Most names are plain ASCII and need no accent stripping
+        return _ASCII_WORD.findall(text.lower())
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _WORD.findall(text.casefold())
+
+
+def trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Inverted index from normalized words to track keys.
+# Words are kept in a sorted vocabulary for prefix lookups, and each word's
+# trigrams point back to it so misspelled queries find close words without
+# scanning every track.
+class SearchIndex():
+    def __init__(self):
+        self.postings = {}       # word -> set of keys
+        self.vocabulary = []     # Every word in self.postings, sorted on demand
+        self._vocabulary_sorted = True
+        self.word_trigrams = {}  # trigram -> set of words
+        self.trigram_counts = {}  # word -> number of distinct trigrams in it
+        self.track_words = {}    # key -> words indexed for that track
+
+    def __len__(self):
+        return len(self.track_words)
+
+    # Index (or re-index) one track
+    def add(self, key, name, artist):
+        if key in self.track_words:
+            self.remove(key)
+        words = tuple(set(tokenize(name)) | set(tokenize(artist)))
+        self.track_words[key] = words
+        for word in words:
+            keys = self.postings.get(word)
+            if keys is None:
+                keys = self.postings[word] = set()
+                self.vocabulary.append(word)  # Sorted lazily; bulk loads stay linear
+                self._vocabulary_sorted = False
+                grams = trigrams(word)
+                self.trigram_counts[word] = len(grams)
+                for gram in grams:
+                    self.word_trigrams.setdefault(gram, set()).add(word)
+            keys.add(key)
+
+    def remove(self, key):
+        for word in self.track_words.pop(key, ()):
+            keys = self.postings[word]
+            keys.discard(key)
+            if not keys:
+                del self.postings[word]
+                vocabulary = self.sorted_vocabulary()
+                del vocabulary[bisect.bisect_left(vocabulary, word)]
+                del self.trigram_counts[word]
+                for gram in trigrams(word):
+                    self.word_trigrams[gram].discard(word)
+
+    def sorted_vocabulary(self):
+        if not self._vocabulary_sorted:
+            self.vocabulary.sort()  # Cheap: everything but the newly added tail is in order
+            self._vocabulary_sorted = True
+        return self.vocabulary
+
+    # Words starting with `prefix`, found by binary search in the vocabulary
+    def prefix_words(self, prefix):
+        vocabulary = self.sorted_vocabulary()
+        start = bisect.bisect_left(vocabulary, prefix)
+        stop = bisect.bisect_left(vocabulary, prefix + "\uffff")
+        return vocabulary[start:stop]
+
+    # Words sharing enough trigrams with `word`, with their similarity
+    def similar_words(self, word):
+        grams = trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.word_trigrams.get(gram, ()))  # Counted in C
+        similar = {}
+        trigram_counts = self.trigram_counts
+        for candidate, count in shared.items():
+            similarity = count / (len(grams) + trigram_counts[candidate] - count)
+            if similarity >= MIN_SIMILARITY:
+                similar[candidate] = similarity
+        return similar
+
+    # Keys matching one query word, grouped by how well they match, best first:
+    # [(score, keys), ...] for the exact word, then prefixes, then close spellings
+    def word_matches(self, word):
+        groups = []
+        if word in self.postings:
+            groups.append((EXACT_MATCH, self.postings[word]))
+        prefixed = [self.postings[candidate] for candidate in self.prefix_words(word) if candidate != word]
+        if prefixed:
+            groups.append((PREFIX_MATCH, set().union(*prefixed)))
+        by_similarity = {}
+        similar = self.similar_words(word) if len(word) >= MIN_FUZZY_LENGTH else {}
+        for candidate, similarity in similar.items():
+            if not candidate.startswith(word):
+                by_similarity.setdefault(round(similarity, 2), []).append(self.postings[candidate])
+        for similarity in sorted(by_similarity, reverse=True):
+            groups.append((similarity, set().union(*by_similarity[similarity])))
+        return groups
+
+    # Keys of the tracks matching every word of `query`, best first.
+    # Set operations do the heavy lifting, so the cost depends on the
+    # number of matching tracks rather than the size of the library.
+    def search(self, query, limit=20):
+        words = list(dict.fromkeys(tokenize(query)))  # Drop repeated words
+        matches = [self.word_matches(word) for word in words]
+        if not matches or not all(matches):
+            return []
+        if len(matches) == 1:
+            return _best_keys(matches[0], limit)
+
+        candidates = set.intersection(*(set().union(*(keys for _, keys in groups)) for groups in matches))
+        scores = {}
+        for key in candidates:
+            scores[key] = sum(next(score for score, keys in groups if key in keys) for groups in matches)
+        ranked = heapq.nsmallest(limit, scores.items(), key=lambda entry: (-entry[1], entry[0]))
+        return [key for key, _ in ranked]
+
+
+# Take keys from the best groups first, ordered by key within a group
+def _best_keys(groups, limit):
+    results = []
+    seen = set()
+    for score, keys in groups:
+        results.extend(heapq.nsmallest(limit - len(results), keys - seen))
+        if len(results) >= limit:
+            break
+        seen |= keys
+    return results
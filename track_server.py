@@ -0,0 +1,245 @@
+import argparse
+import asyncio
+import json
+import sys
+
+import track_library as lib
+
+DEFAULT_PORT = 8765
+MAX_LINE = 1 << 20          # Longest request line accepted, in bytes
+MAX_IN_FLIGHT = 256         # Requests being handled at once, across all clients
+PIPELINE_DEPTH = 64         # Requests one client may have queued before we stop reading from it
+MAX_BULK_KEYS = 10000       # Keys accepted by one bulk get or increment
+# Run on a worker thread so they never hold up other clients: they walk the
+# library, build an index on first use or look up or count thousands of keys
+SLOW_OPS = {"search", "list", "by_artist", "by_rating", "top", "get", "increment"}
+
+
+# A request the server understood but could not carry out
+class RequestError(Exception):
+    pass
+
+
+def track_record(key):
+    try:
+        item = lib.library[key]
+    except KeyError:
+        return None
+    return {"key": key, "name": item.name, "artist": item.artist, "rating": item.rating,
+            "play_count": lib.get_play_count(key)}
+
+
+def keys_argument(request):
+    keys = request.get("keys")
+    if keys is None and "key" in request:
+        keys = [request["key"]]
+    if not isinstance(keys, list) or not all(isinstance(key, str) for key in keys):
+        raise RequestError("keys must be a list of track keys")
+    if len(keys) > MAX_BULK_KEYS:
+        raise RequestError(f"at most {MAX_BULK_KEYS} keys per request")
+    return keys
+
+
+def int_argument(request, name, default=None):
+    value = request.get(name, default)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise RequestError(f"{name} must be a whole number")
+    return value
+
+
+def op_get(request):
+    return [track_record(key) for key in keys_argument(request)]
+
+
+# Register one play of every key (repeat a key to count it several times); returns the new counts
+def op_increment(request):
+    source = request.get("source")
+    counts = []
+    for key in keys_argument(request):
+        lib.increment_play_count(key, source)
+        counts.append(lib.get_play_count(key))
+    return counts
+
+
+# Rate every key in one batch; returns the ratings afterwards (unknown keys are left out of the batch)
+def op_set_rating(request):
+    rating = int_argument(request, "rating")
+    if not lib.MIN_RATING <= rating <= lib.MAX_RATING:
+        raise RequestError(f"rating must be between {lib.MIN_RATING} and {lib.MAX_RATING}")
+    keys = keys_argument(request)
+    lib.set_ratings((key, rating) for key in keys)
+    return [lib.get_rating(key) for key in keys]
+
+
+def op_search(request):
+    return lib.search(str(request.get("query", "")), int_argument(request, "limit", 20))
+
+
+def op_list(request):
+    sort_by = request.get("sort_by")
+    if sort_by is not None and sort_by not in lib.SORT_FIELDS:
+        raise RequestError(f"sort_by must be one of {', '.join(lib.SORT_FIELDS)}")
+    keys = lib.track_keys(sort_by, bool(request.get("reverse", False)))
+    offset = int_argument(request, "offset", 0)
+    return keys[offset:offset + int_argument(request, "limit", 50)]
+
+
+def op_by_artist(request):
+    return lib.keys_by_artist(str(request.get("artist", "")))
+
+
+def op_by_rating(request):
+    return lib.keys_by_rating(int_argument(request, "rating"))
+
+
+def op_top(request):
+    return lib.most_played(int_argument(request, "limit", 50))
+
+
+def op_count(request):
+    return len(lib.library)
+
+
+OPS = {
+    "get": op_get,
+    "increment": op_increment,
+    "set_rating": op_set_rating,
+    "search": op_search,
+    "list": op_list,
+    "by_artist": op_by_artist,
+    "by_rating": op_by_rating,
+    "top": op_top,
+    "count": op_count,
+}
+
+
+# Serves track_library over TCP to many clients at once.
+#
+# Protocol: one JSON object per line each way. A request names an "op" from
+# OPS plus its arguments, and may carry an "id" that is echoed back, e.g.
+#   {"id": 1, "op": "get", "keys": ["01", "02"]}
+#   {"id": 1, "result": [{"key": "01", "name": ...}, ...]}
+# Failed requests get {"id": ..., "error": "..."} instead of a result.
+#
+# Clients may pipeline: send many requests without waiting. Each connection
+# reads ahead up to PIPELINE_DEPTH requests and answers them in the order they
+# were sent, while at most MAX_IN_FLIGHT requests run at once server-wide.
+class TrackServer():
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, max_in_flight=MAX_IN_FLIGHT,
+                 pipeline_depth=PIPELINE_DEPTH):
+        self.host = host
+        self.port = port
+        self.pipeline_depth = pipeline_depth
+        self.max_in_flight = max_in_flight
+        self.requests = 0
+        self.server = None
+
+    async def start(self):
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port, limit=MAX_LINE)
+        self.port = self.server.sockets[0].getsockname()[1]  # The real port when started on port 0
+        return self
+
+    async def serve_forever(self):
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle_client(self, reader, writer):
+        responses = asyncio.Queue(self.pipeline_depth)
+        sender = asyncio.create_task(self.send_responses(responses, writer))
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    await responses.put(self.ready_response({"error": f"request longer than {MAX_LINE} bytes"}))
+                    break
+                except ConnectionError:
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    await responses.put(asyncio.create_task(self.answer(line)))
+        finally:
+            await responses.put(None)
+            await sender
+
+    async def send_responses(self, responses, writer):
+        try:
+            while True:
+                pending = await responses.get()
+                if pending is None:
+                    break
+                writer.write(await pending)
+                if responses.empty() or writer.transport.get_write_buffer_size() > 1 << 16:
+                    await writer.drain()  # Pipelined answers go out together, like the requests came in
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # An already answered response, for errors found before a request could be parsed
+    def ready_response(self, response):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(json.dumps(response).encode("utf-8") + b"\n")
+        return future
+
+    async def answer(self, line):
+        request_id = None
+        async with self._slots:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise RequestError("a request must be a JSON object")
+                request_id = request.get("id")
+                op = OPS.get(request.get("op"))
+                if op is None:
+                    raise RequestError(f"unknown op {request.get('op')!r}")
+                if request["op"] in SLOW_OPS:
+                    result = await asyncio.to_thread(op, request)
+                else:
+                    result = op(request)  # Microseconds; cheaper than a thread hand-off
+                response = {"id": request_id, "result": result}
+            except (ValueError, TypeError, RequestError) as e:  # Bad JSON or arguments
+                response = {"id": request_id, "error": str(e)}
+            except Exception as e:  # A failing op must not cost the client its other answers
+                response = {"id": request_id, "error": f"{type(e).__name__}: {e}"}
+            self.requests += 1
+        return json.dumps(response).encode("utf-8") + b"\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the jukebox library to other screens over TCP.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to listen on (default: %(default)s)")
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT, help="requests handled at once")
+    parser.add_argument("--db", help="SQLite library file to serve")
+    parser.add_argument("--snapshot", help="library snapshot file to serve")
+    parser.add_argument("--play-log", help="record plays in this append-only log")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        lib.use_database(args.db)
+    elif args.snapshot:
+        lib.use_snapshot(args.snapshot)
+    if args.play_log:
+        lib.use_play_log(args.play_log)
+
+    async def serve():
+        server = await TrackServer(args.host, args.port, args.max_in_flight).start()
+        print(f"Serving {len(lib.library)} tracks on {server.host}:{server.port}")
+        await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
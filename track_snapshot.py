@@ -0,0 +1,334 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from library_item import LibraryItem
+
+# File layout, all little-endian:
+#   header   magic, track count and the offsets of the three sections below
+#   records  one fixed-width record per track, in library order
+#   index    row numbers sorted by key, for binary search
+#   strings  UTF-8 text the records point into; repeated names and artists are stored once
+MAGIC = b"JUKEBOX\x01"
+HEADER = struct.Struct("<8sIQQQ")    # magic, count, records offset, index offset, strings offset
+RECORD = struct.Struct("<IHIHIHbq")  # key, name and artist as (offset, length), rating, play_count
+INDEX_ENTRY = struct.Struct("<I")
+FIELDS = ("name", "artist", "rating", "play_count")
+MAX_TEXT_BYTES = (1 << 16) - 1  # Longest key, name or artist a RECORD can point to
+ROW_CACHE_SIZE = 4096           # Recently looked up keys whose row is remembered
+
+
+# Write `items` ((key, item) pairs) to a snapshot file at `path`
+def _write_file(path, items):
+    strings = bytearray()
+    offsets = {}  # text -> (offset, length) of text already in `strings`
+    records = bytearray()
+    keys = []
+
+    def add_string(text, key, shared=True):
+        location = offsets.get(text) if shared else None
+        if location is None:
+            data = text.encode("utf-8")
+            if len(data) > MAX_TEXT_BYTES:
+                raise ValueError(f"track {key}: text longer than {MAX_TEXT_BYTES} bytes")
+            location = (len(strings), len(data))
+            strings.extend(data)
+            if shared:
+                offsets[text] = location
+        return location
+
+    for row, (key, item) in enumerate(items):
+        key_location = add_string(key, key, shared=False)  # Keys are unique, nothing to share
+        records += RECORD.pack(*key_location, *add_string(item.name, key), *add_string(item.artist, key),
+                               item.rating, item.play_count)
+        keys.append((key.encode("utf-8"), row))
+    keys.sort()
+    index = array("I", (row for _, row in keys))
+    if sys.byteorder == "big":
+        index.byteswap()
+
+    records_offset = HEADER.size
+    index_offset = records_offset + len(records)
+    strings_offset = index_offset + len(index) * INDEX_ENTRY.size
+    with open(path, "wb") as snapshot_file:
+        snapshot_file.write(HEADER.pack(MAGIC, len(keys), records_offset, index_offset, strings_offset))
+        snapshot_file.write(records)
+        snapshot_file.write(index.tobytes())
+        snapshot_file.write(strings)
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+
+
+# Write a snapshot of `items` to `path`, replacing any old file atomically
+def write_snapshot(path, items):
+    temp_path = f"{path}.tmp"
+    _write_file(temp_path, items)
+    os.replace(temp_path, path)
+
+
+# Unsaved changes to the snapshot at `path` are kept next to it, as JSON:
+# {"tracks": {key: [name, artist, rating, play_count]}, "deleted": [key, ...]}
+def delta_path(path):
+    return f"{path}.delta"
+
+
+# A track read from a snapshot. Fields are read from the mapped file when
+# asked for; assigning one copies the track into a LibraryItem that holds the
+# edit until the snapshot is saved again.
+class SnapshotTrack(LibraryItem):
+    __slots__ = ("_store", "_key")
+
+    def __init__(self, store, key):
+        self._store = store
+        self._key = key
+
+    @property
+    def name(self):
+        return self._store._field(self._key, 0)
+
+    @name.setter
+    def name(self, value):
+        self._store._edit(self._key).name = value
+
+    @property
+    def artist(self):
+        return self._store._field(self._key, 1)
+
+    @artist.setter
+    def artist(self, value):
+        self._store._edit(self._key).artist = value
+
+    @property
+    def rating(self):
+        return self._store._field(self._key, 2)
+
+    @rating.setter
+    def rating(self, value):
+        self._store._edit(self._key).rating = value
+
+    @property
+    def play_count(self):
+        return self._store._field(self._key, 3)
+
+    @play_count.setter
+    def play_count(self, value):
+        self._store._edit(self._key).play_count = value
+
+
+# Dictionary-like track store backed by a memory-mapped snapshot file.
+# Opening one only reads the header, so start-up time does not grow with the
+# library; tracks are looked up by binary search over the key index and their
+# fields decoded on demand. Edits, new tracks and deletions are kept in memory
+# until save() or close() writes a new snapshot; flush() only writes them to
+# the small delta file, which is read back when the snapshot is opened again.
+# Usable as track_library.library.
+class SnapshotLibrary(MutableMapping):
+    def __init__(self, path):
+        self.path = path
+        self.edited = {}     # key -> LibraryItem for snapshot tracks that were changed
+        self.added = {}      # key -> LibraryItem for tracks not in the snapshot
+        self.deleted = set()  # Snapshot keys that were removed
+        self.lock = threading.RLock()  # save() swaps the mapping under readers
+        self._map()
+        self._load_delta()
+
+    def _map(self):
+        with open(self.path, "rb") as snapshot_file:
+            self._mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self._records, self._index, self._strings = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{self.path} is not a jukebox snapshot")
+        self._rows = OrderedDict()  # key -> row of the last ROW_CACHE_SIZE keys looked up
+
+    def _unmap(self):
+        self._mmap.close()
+
+    # Apply the changes a flush() wrote after the snapshot was last saved. Keys
+    # are routed through __setitem__ and __delitem__, so a delta left behind
+    # by a save() that was cut short is harmless.
+    def _load_delta(self):
+        try:
+            with open(delta_path(self.path), encoding="utf-8") as delta_file:
+                delta = json.load(delta_file)
+        except FileNotFoundError:
+            return
+        for key, (name, artist, rating, play_count) in delta["tracks"].items():
+            item = LibraryItem(name, artist, rating)
+            item.play_count = play_count
+            self[key] = item
+        for key in delta["deleted"]:
+            if key in self:
+                del self[key]
+
+    def _record(self, row):
+        return RECORD.unpack_from(self._mmap, self._records + row * RECORD.size)
+
+    def _string(self, offset, length):
+        start = self._strings + offset
+        return self._mmap[start:start + length].decode("utf-8")
+
+    def _key_at(self, row):
+        offset, length = RECORD.unpack_from(self._mmap, self._records + row * RECORD.size)[:2]
+        start = self._strings + offset
+        return self._mmap[start:start + length]
+
+    # Row of a snapshot key, or None
+    def _find(self, key):
+        wanted = key.encode("utf-8")
+        with self.lock:
+            row = self._rows.get(key)
+            if row is not None:
+                self._rows.move_to_end(key)
+                return row
+            low, high = 0, self.count
+            while low < high:
+                middle = (low + high) // 2
+                row = INDEX_ENTRY.unpack_from(self._mmap, self._index + middle * INDEX_ENTRY.size)[0]
+                found = self._key_at(row)
+                if found < wanted:
+                    low = middle + 1
+                elif found > wanted:
+                    high = middle
+                else:
+                    self._rows[key] = row
+                    if len(self._rows) > ROW_CACHE_SIZE:
+                        self._rows.popitem(last=False)
+                    return row
+        return None
+
+    # Row of a snapshot track that has not been deleted; KeyError otherwise
+    def _row(self, key):
+        row = None if key in self.deleted else self._find(key)
+        if row is None:
+            raise KeyError(key)
+        return row
+
+    # One field of a snapshot track (0 name, 1 artist, 2 rating, 3 play_count)
+    def _field(self, key, field):
+        item = self.edited.get(key)
+        if item is not None:
+            return getattr(item, FIELDS[field])
+        with self.lock:
+            record = self._record(self._row(key))
+            if field < 2:
+                return self._string(*record[2 + field * 2:4 + field * 2])
+            return record[4 + field]
+
+    # The LibraryItem holding edits to a snapshot track, copied from the file on first edit
+    def _edit(self, key):
+        item = self.edited.get(key)
+        if item is None:
+            with self.lock:
+                record = self._record(self._row(key))
+                item = LibraryItem(self._string(*record[2:4]), self._string(*record[4:6]), record[6])
+                item.play_count = record[7]
+            item = self.edited.setdefault(key, item)
+        return item
+
+    def __getitem__(self, key):
+        item = self.added.get(key)
+        if item is not None:
+            return item
+        if key in self.deleted:
+            raise KeyError(key)
+        item = self.edited.get(key)
+        if item is not None:
+            return item
+        if self._find(key) is None:
+            raise KeyError(key)
+        return SnapshotTrack(self, key)
+
+    def __setitem__(self, key, item):
+        if key in self.added or self._find(key) is None:
+            self.added[key] = item
+        else:
+            self.deleted.discard(key)
+            self.edited[key] = item
+
+    def __delitem__(self, key):
+        if key in self.added:
+            del self.added[key]
+        elif key not in self.deleted and self._find(key) is not None:
+            self.deleted.add(key)
+            self.edited.pop(key, None)
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.added or (key not in self.deleted and self._find(key) is not None)
+
+    def __iter__(self):
+        with self.lock:
+            count = self.count
+        for row in range(count):
+            with self.lock:
+                if row >= self.count:  # Saved with fewer tracks meanwhile
+                    break
+                key = self._key_at(row).decode("utf-8")
+            if key not in self.deleted:
+                yield key
+        yield from list(self.added)
+
+    def __len__(self):
+        return self.count - len(self.deleted) + len(self.added)
+
+    # Insert (key, item) pairs whose key is not stored yet, returning how many were added
+    def add_many(self, items):
+        added = 0
+        for key, item in items:
+            if key not in self:
+                self[key] = item
+                added += 1
+        return added
+
+    def dirty(self):
+        return bool(self.edited or self.added or self.deleted)
+
+    # Write every track, edits included, to a new snapshot and map that instead
+    def save(self):
+        with self.lock:
+            temp_path = f"{self.path}.tmp"
+            _write_file(temp_path, ((key, self[key]) for key in list(self)))
+            self._unmap()  # Windows cannot replace a file that is still mapped
+            os.replace(temp_path, self.path)
+            self._map()
+            self.edited = {}
+            self.added = {}
+            self.deleted = set()
+            try:
+                os.remove(delta_path(self.path))
+            except FileNotFoundError:
+                pass
+
+    # Make the unsaved changes durable without rewriting the snapshot: they
+    # replace the delta file, so its size follows the edits, not the library.
+    # Called by track_library after folding play counts; returns True as the
+    # changes are on disk.
+    def flush(self):
+        with self.lock:
+            if not self.dirty():
+                return True
+            tracks = {key: [item.name, item.artist, item.rating, item.play_count]
+                      for key, item in (*self.edited.items(), *self.added.items())}
+            temp_path = f"{delta_path(self.path)}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as delta_file:
+                json.dump({"tracks": tracks, "deleted": sorted(self.deleted)}, delta_file, ensure_ascii=False)
+                delta_file.flush()
+                os.fsync(delta_file.fileno())
+            os.replace(temp_path, delta_path(self.path))
+        return True
+
+    def close(self):
+        with self.lock:
+            if self._mmap.closed:
+                return
+            if self.dirty():
+                self.save()
+            self._unmap()
@@ -0,0 +1,193 @@
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+
+from library_item import LibraryItem
+
+# SQL is kept in constants so sqlite3's per-connection statement cache
+# prepares each statement once and reuses it for every call.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    key        TEXT PRIMARY KEY,
+    name       TEXT NOT NULL,
+    artist     TEXT NOT NULL,
+    rating     INTEGER NOT NULL DEFAULT 0,
+    play_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_tracks_artist ON tracks (artist);
+CREATE INDEX IF NOT EXISTS idx_tracks_rating ON tracks (rating);
+"""
+SELECT_TRACK = "SELECT name, artist, rating, play_count FROM tracks WHERE key = ?"
+SELECT_KEYS = "SELECT rowid, key FROM tracks WHERE rowid > ? ORDER BY rowid LIMIT ?"
+SELECT_ROWS = ("SELECT rowid, key, name, artist, rating, play_count FROM tracks "
+               "WHERE rowid > ? ORDER BY rowid LIMIT ?")
+COUNT_TRACKS = "SELECT COUNT(*) FROM tracks"
+HAS_TRACK = "SELECT 1 FROM tracks WHERE key = ?"
+INSERT_TRACK = "INSERT OR IGNORE INTO tracks (key, name, artist, rating, play_count) VALUES (?, ?, ?, ?, ?)"
+UPSERT_TRACK = ("INSERT INTO tracks (key, name, artist, rating, play_count) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET name = excluded.name, artist = excluded.artist, "
+                "rating = excluded.rating, play_count = excluded.play_count")
+DELETE_TRACK = "DELETE FROM tracks WHERE key = ?"
+UPDATE_NAME = "UPDATE tracks SET name = ? WHERE key = ?"
+UPDATE_ARTIST = "UPDATE tracks SET artist = ? WHERE key = ?"
+UPDATE_RATING = "UPDATE tracks SET rating = ? WHERE key = ?"
+UPDATE_PLAY_COUNT = "UPDATE tracks SET play_count = ? WHERE key = ?"
+
+
+# A track read from the database. Behaves like a LibraryItem, but assigning
+# name, artist, rating or play_count writes the change back to the store.
+class StoredTrack(LibraryItem):
+    def __init__(self, store, key, name, artist, rating, play_count):
+        self._store = store
+        self._key = key
+        self._name = name
+        self._artist = artist
+        self._rating = rating
+        self._play_count = play_count
+
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, value):
+        self._store._write(UPDATE_NAME, (value, self._key))
+        self._name = value
+
+    @property
+    def artist(self):
+        return self._artist
+
+    @artist.setter
+    def artist(self, value):
+        self._store._write(UPDATE_ARTIST, (value, self._key))
+        self._artist = value
+
+    @property
+    def rating(self):
+        return self._rating
+
+    @rating.setter
+    def rating(self, value):
+        self._store._write(UPDATE_RATING, (value, self._key))
+        self._rating = value
+
+    @property
+    def play_count(self):
+        return self._play_count
+
+    @play_count.setter
+    def play_count(self, value):
+        self._store._write(UPDATE_PLAY_COUNT, (value, self._key))
+        self._play_count = value
+
+
+# Dictionary-like view of a SQLite database of tracks, usable as track_library.library.
+# Rows are fetched on demand, so opening a library of millions of tracks costs
+# nothing up front. Writes go into an open transaction that is committed every
+# `batch_size` changes, and on flush()/close().
+# One connection is shared by every thread; each statement runs under a lock.
+class SqliteLibrary(MutableMapping):
+    def __init__(self, path, batch_size=500, page_size=1000):
+        self.path = path
+        self.batch_size = batch_size
+        self.page_size = page_size  # Keys fetched per query while iterating
+        self._pending = 0  # Writes since the last commit
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL, far fewer fsyncs
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def __getitem__(self, key):
+        rows = self._query(SELECT_TRACK, (key,))
+        if not rows:
+            raise KeyError(key)
+        return StoredTrack(self, key, *rows[0])
+
+    def __setitem__(self, key, item):
+        self._write(UPSERT_TRACK, (key, item.name, item.artist, item.rating, item.play_count))
+
+    def __delitem__(self, key):
+        with self._lock:
+            if self._conn.execute(DELETE_TRACK, (key,)).rowcount == 0:
+                raise KeyError(key)
+            self._wrote(1)
+
+    def __contains__(self, key):
+        return bool(self._query(HAS_TRACK, (key,)))
+
+    def __iter__(self):
+        # Page through the keys so neither memory nor the lock is held for the whole table
+        last_rowid = 0
+        while True:
+            rows = self._query(SELECT_KEYS, (last_rowid, self.page_size))
+            for last_rowid, key in rows:
+                yield key
+            if len(rows) < self.page_size:
+                return
+
+    def __len__(self):
+        return self._query(COUNT_TRACKS)[0][0]
+
+    # Yield (key, name, artist, rating, play_count) for every track, a page per
+    # query, instead of one query per track through __getitem__
+    def iter_rows(self):
+        last_rowid = 0
+        while True:
+            rows = self._query(SELECT_ROWS, (last_rowid, self.page_size))
+            for last_rowid, *row in rows:
+                yield tuple(row)
+            if len(rows) < self.page_size:
+                return
+
+    # Insert (key, item) pairs whose key is not stored yet, returning how many were added
+    def add_many(self, items):
+        rows = [(key, item.name, item.artist, item.rating, item.play_count) for key, item in items]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(INSERT_TRACK, rows)
+            self._wrote(len(rows))
+            return self._conn.total_changes - before
+
+    # Apply {key: rating} in a transaction of its own, so the batch is stored
+    # completely or not at all
+    def set_ratings(self, ratings):
+        with self._lock:
+            self.flush()  # Earlier writes are not rolled back with the batch
+            try:
+                self._conn.executemany(UPDATE_RATING, [(rating, key) for key, rating in ratings.items()])
+            except sqlite3.Error:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+
+    def _write(self, sql, params):
+        with self._lock:
+            self._conn.execute(sql, params)
+            self._wrote(1)
+
+    def _wrote(self, count):
+        self._pending += count
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    # Commit any pending writes. Returns True: committed writes outlive the process.
+    def flush(self):
+        with self._lock:
+            if self._pending:
+                self._conn.commit()
+                self._pending = 0
+        return True
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self.flush()
+                self._conn.close()
+                self._conn = None
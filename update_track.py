@@ -1,8 +1,13 @@
+import sqlite3
 import tkinter as tk
+import tkinter.filedialog as filedialog
 import tkinter.scrolledtext as tkst
 
 import track_library as lib          # Custom module handling track data (library)
+from track_importer import parse_rating_lines  # Reads pasted "track rating" lists
 import font_manager as fonts         # Module to configure application fonts
+from track_list_view import SearchBar  # Search box over the track library
+from track_events import TkChangeListener  # Delivers library changes once per idle cycle
 
 # Utility function to update the content of a text widget
 def set_text(text_area, content):
@@ -14,7 +19,7 @@ class UpdateTrack():
     def __init__(self, window):
         self.window = window
         window.title("Update_Track")         # Set the window title
-        window.geometry("650x500")           # Set the window size
+        window.geometry("650x750")           # Set the window size
 
         # Label prompting user to enter a track number
         enter_lbl = tk.Label(window, text="Enter Track Number")
@@ -40,32 +45,119 @@ class UpdateTrack():
         self.status_lbl = tk.Label(window, text="", font=("Helvetica", 10))
         self.status_lbl.grid(row=2, column=0, columnspan=4, sticky="W", padx=10, pady=10)
 
+        # Search box to look up track numbers by name or artist
+        search_bar = SearchBar(window, on_results=self.search_results)
+        search_bar.grid(row=3, column=0, columnspan=4, sticky="W", padx=10, pady=10)
+
+        # Bulk mode: paste or load "track rating" lines and apply them in one go
+        bulk_lbl = tk.Label(window, text="Bulk ratings, one \"track rating\" per line")
+        bulk_lbl.grid(row=4, column=0, columnspan=4, sticky="W", padx=10)
+        self.bulk_txt = tkst.ScrolledText(window, width=50, height=8, wrap="none")
+        self.bulk_txt.grid(row=5, column=0, columnspan=4, sticky="W", padx=10, pady=10)
+        load_ratings_btn = tk.Button(window, text="Load File", command=self.load_ratings_clicked)
+        load_ratings_btn.grid(row=6, column=0, sticky="W", padx=10, pady=10)
+        apply_ratings_btn = tk.Button(window, text="Apply Ratings", command=self.apply_ratings_clicked)
+        apply_ratings_btn.grid(row=6, column=1, sticky="W", padx=10, pady=10)
+        self.all_or_nothing = tk.BooleanVar(value=False)
+        all_or_nothing_chk = tk.Checkbutton(window, text="Only if every line is valid",
+                                            variable=self.all_or_nothing)
+        all_or_nothing_chk.grid(row=6, column=2, columnspan=2, sticky="W", padx=10, pady=10)
+
+        self.shown_key = None  # Track whose details are in list_txt
+        TkChangeListener(window, self.library_changed, lib.events)
+
     # Callback function when the "Update Track Rating" button is clicked
     def update_track_click(self):
-        key = self.input_txt.get()                    # Get the entered track number
-        new_rating = int(self.input_rating_txt.get()) # Get the new rating
-        name = lib.get_name(key)                      # Try to find the track by key
-
-        if name is not None:
-            if 1 <= new_rating <= 5:
-                lib.set_rating(key, new_rating)       # Update the rating in the library
-                artist = lib.get_artist(key)
-                rating = lib.get_rating(key)
-                play_count = lib.get_play_count(key)
-
-                # Format and display updated track information
-                track_details = f"{name}\n{artist}\nrating: {rating}\nplays: {play_count}"
-                set_text(self.list_txt, track_details)
-            else:
-                # Show error if rating is out of valid range
-                set_text(self.list_txt, f"Rating should be between 1 and 5")
+        key = self.input_txt.get().strip()            # Get the entered track number
+        try:
+            new_rating = int(self.input_rating_txt.get())  # Get the new rating
+        except ValueError:
+            set_text(self.list_txt, f"Rating should be a number between {lib.MIN_RATING} and {lib.MAX_RATING}")
+            self.shown_key = None
+            return
+
+        try:
+            failures = lib.set_ratings([(key, new_rating)])  # Checks the track and rating too
+        except sqlite3.Error as e:                         # The database refused the write
+            failures = [(0, key, f"Rating not saved: {e}")]
+        if failures:
+            set_text(self.list_txt, failures[0][2])      # Show why the rating was not changed
+            self.shown_key = None
         else:
-            # Show error if track does not exist
-            set_text(self.list_txt, f"Track {key} not found")
+            self.show_track_details(key)
 
         # Update the status label to confirm button was pressed
         self.status_lbl.configure(text="Update Track button was clicked!")
 
+    # Format and display the current track information
+    def show_track_details(self, key):
+        track = lib.get_track(key)
+        if track is None:
+            set_text(self.list_txt, f"Track {key} not found")
+            self.shown_key = None
+            return
+        name, artist, rating, play_count = track
+        set_text(self.list_txt, f"{name}\n{artist}\nrating: {rating}\nplays: {play_count}")
+        self.shown_key = key
+
+    # Put the contents of a ratings file chosen by the user into the bulk box
+    def load_ratings_clicked(self):
+        path = filedialog.askopenfilename(parent=self.window, filetypes=[("Rating lists", "*.csv *.txt"),
+                                                                         ("All files", "*")])
+        if not path:
+            return
+        try:
+            with open(path, encoding="utf-8-sig") as ratings_file:
+                set_text(self.bulk_txt, ratings_file.read())
+        except (OSError, UnicodeDecodeError) as e:
+            set_text(self.list_txt, f"Could not read {path}: {e}")
+            self.shown_key = None
+
+    # Apply every line of the bulk box in one batch and list the lines that failed
+    def apply_ratings_clicked(self):
+        ratings, errors = parse_rating_lines(self.bulk_txt.get("1.0", tk.END).splitlines())
+        all_or_nothing = self.all_or_nothing.get()
+        if errors and all_or_nothing:
+            failures = []
+        else:
+            try:
+                failures = lib.set_ratings([(key, rating) for _, key, rating in ratings], all_or_nothing)
+            except sqlite3.Error as e:  # The whole batch was rolled back
+                set_text(self.list_txt, f"No ratings changed: {e}")
+                self.shown_key = None
+                self.status_lbl.configure(text="No ratings changed")
+                return
+        failed = {position for position, _, _ in failures}
+        updated = {key for position, (_, key, _) in enumerate(ratings) if position not in failed}
+        problems = [(error.line, error.message) for error in errors]
+        problems += [(ratings[position][0], message) for position, _, message in failures]
+        problems.sort()
+
+        if problems and all_or_nothing:
+            summary = f"No ratings changed: {len(problems)} invalid lines"
+        else:
+            summary = f"Updated {len(updated)} tracks"
+            if problems:
+                summary += f", {len(problems)} lines rejected"
+        lines = [summary] + [f"line {line}: {message}" for line, message in problems]
+        set_text(self.list_txt, "\n".join(lines))
+        self.shown_key = None
+        self.status_lbl.configure(text=summary)
+
+    # Keep the shown details current when another window rates or plays the track
+    def library_changed(self, changes):
+        if self.shown_key is not None and (changes.reset or self.shown_key in changes.changed):
+            self.show_track_details(self.shown_key)
+
+    # List matching tracks so their numbers can be typed into the entry field
+    def search_results(self, query, keys):
+        self.shown_key = None
+        if not query:
+            set_text(self.list_txt, "")
+            return
+        lines = [line for line in map(lib.describe, keys) if line is not None]  # None: deleted since the search
+        set_text(self.list_txt, "\n".join(lines) if lines else f"No tracks match \"{query}\"")
+
 # Launch the application
 if __name__ == "__main__":
     window = tk.Tk()            # Create the main window
@@ -1,10 +1,40 @@
 import tkinter as tk
-import tkinter.scrolledtext as tkst
-import csv
-from library_item import LibraryItem  # Custom class representing a music track
+import queue
 import track_library as lib           # Custom module handling the track database (dictionary)
+import track_importer                 # Background CSV import pipeline
+import catalog_tail                   # Checkpoints, so only rows appended to the CSV are imported
+from track_list_view import TrackListView, SearchBar  # Virtualized track list and search box
+from track_events import TkChangeListener  # Delivers library changes once per idle cycle
 import font_manager as fonts          # Module to configure custom fonts
-from PIL import Image, ImageTk        # Used to handle and display album cover images
+from cover_cache import CoverCache, neighbour_cover_paths  # Cache of decoded album covers
+from cover_atlas import CoverAtlas    # Pre-built thumbnails, see cover_atlas.py
+
+# Labels for the sort drop-down, mapped to (sort_by, reverse) for track_library.track_keys
+SORT_CHOICES = {
+    "Library order": (None, False),
+    "Name": ("name", False),
+    "Artist": ("artist", False),
+    "Top rated": ("rating", True),
+    "Most played": ("play_count", True),
+}
+
+CATALOG_CSV = "new_tracks.csv"
+
+# Album covers shared by every TrackViewer window
+covers = CoverCache()
+atlas = None  # CoverAtlas of photos/, opened on first use and remapped after a rebuild
+
+# Cover of `key` from the thumbnail atlas, or None if it has not been built for this cover
+def atlas_photo(key):
+    global atlas
+    if atlas is None:
+        atlas = CoverAtlas("photos")
+    else:
+        atlas.refresh()
+    data = atlas.ppm(f"{key}.jpg")
+    if data is None:
+        return None
+    return tk.PhotoImage(data=data)  # Raw PPM pixels: no JPEG decode and no PIL needed
 
 # Utility function: replaces the content of a text area with new content
 def set_text(text_area, content):
@@ -14,6 +44,13 @@ def set_text(text_area, content):
 # Class to manage and display the track viewer GUI
 class TrackViewer():
     def __init__(self, window):
+        self.window = window
+        self.import_worker = None         # Running CsvImportWorker, if any
+        self.import_result = None
+        self.import_plan = None           # catalog_tail.IngestPlan of the running import
+        self.watcher = None               # catalog_tail.CsvWatcher while "Watch CSV" is ticked
+        self.watch_results = queue.Queue()  # Summaries from the watcher thread
+        self.shown_key = None             # Track whose details are in track_txt
         window.geometry("850x350")       # Set window size
         window.title("View Tracks")      # Set window title
 
@@ -34,12 +71,17 @@ class TrackViewer():
         check_track_btn.grid(row=0, column=3, padx=10, pady=10)
 
         # Button to load additional songs from a CSV file
-        load_csv_btn = tk.Button(window, text="Load More Songs from CSV", command=self.load_csv_clicked)
-        load_csv_btn.grid(row=0, column=4, padx=10, pady=10)
+        self.load_csv_btn = tk.Button(window, text="Load More Songs from CSV", command=self.load_csv_clicked)
+        self.load_csv_btn.grid(row=0, column=4, padx=10, pady=10)
+
+        # Tick box to import new rows automatically as they are appended to the CSV
+        self.watch_var = tk.BooleanVar(window, value=False)
+        watch_box = tk.Checkbutton(window, text="Watch CSV", variable=self.watch_var, command=self.watch_toggled)
+        watch_box.grid(row=3, column=4, padx=10, pady=(0, 10))
 
-        # Scrollable text box to display the full track list
-        self.list_txt = tkst.ScrolledText(window, width=48, height=12, wrap="none")
-        self.list_txt.grid(row=1, column=0, columnspan=3, sticky="W", padx=10, pady=10)
+        # Scrollable list of tracks; only the visible rows are ever drawn
+        self.list_view = TrackListView(window, width=48, height=12, on_select=self.track_selected)
+        self.list_view.grid(row=1, column=0, columnspan=3, sticky="W", padx=10, pady=10)
 
         # Text box to show details of a selected track
         self.track_txt = tk.Text(window, width=24, height=8, wrap="none")
@@ -53,29 +95,46 @@ class TrackViewer():
         self.cover_img_label = tk.Label(window)
         self.cover_img_label.grid(row=1, column=4, padx=10, pady=10)
 
+        # Drop-down to choose the order of the track list
+        self.sort_var = tk.StringVar(window, value="Library order")
+        sort_menu = tk.OptionMenu(window, self.sort_var, *SORT_CHOICES, command=self.sort_changed)
+        sort_menu.grid(row=2, column=4, padx=10, pady=10)
+
+        # Search box that filters the track list by name or artist
+        search_bar = SearchBar(window, on_results=self.search_results)
+        search_bar.grid(row=3, column=0, columnspan=3, sticky="W", padx=10, pady=(0, 10))
+
+        # Redraw only what changed when tracks are added, rated or played elsewhere
+        TkChangeListener(window, self.library_changed, lib.events)
+
         # Optional: Automatically load the track list when the window opens
         # self.list_tracks_clicked()
 
-        # Clear the track list area on startup
-        set_text(self.list_txt, "")
-
     # Callback function for the "View Track" button
     def view_tracks_clicked(self):
         key = self.input_txt.get()            # Get the track number entered by the user
-        name = lib.get_name(key)              # Try to get the name of the track from the library
-
-        image_path = f"photos/{key}.jpg"      # Path to the corresponding album cover image
-        try:
-            img = Image.open(image_path)      # Try to open the image file
-            img = img.resize((200, 200))      # Resize the image for display
-            photo = ImageTk.PhotoImage(img)   # Convert image for Tkinter
+        photo = atlas_photo(key)              # Thumbnail packed by cover_atlas.py, if it is up to date
+        if photo is None:
+            image_path = f"photos/{key}.jpg"  # Path to the corresponding album cover image
+            img = covers.get(image_path)      # Decoded and resized cover, cached between clicks
+            if img is not None:
+                from PIL import ImageTk       # Imported on first use to keep the window quick to open
+                photo = ImageTk.PhotoImage(img)  # Convert image for Tkinter
+            covers.prefetch(neighbour_cover_paths(key))  # Decode nearby covers in the background
+        if photo is not None:
             self.cover_img_label.config(image=photo)
             self.cover_img_label.image = photo  # Keep a reference to avoid garbage collection
-        except FileNotFoundError:
+        else:
             # If no image is found, clear the image display
             self.cover_img_label.config(image="")
             self.cover_img_label.image = None
 
+        self.show_track_details(key)
+        self.status_lbl.configure(text="View Track button was clicked!")  # Update status message
+
+    # Show name, artist, rating and plays of a track in the details box
+    def show_track_details(self, key):
+        name = lib.get_name(key)              # Try to get the name of the track from the library
         if name is not None:
             # If the track exists, retrieve and display full information
             artist = lib.get_artist(key)
@@ -84,39 +143,150 @@ class TrackViewer():
 
             track_details = f"{name}\n{artist}\nrating: {rating}\nplays: {play_count}"
             set_text(self.track_txt, track_details)  # Display track details
+            self.shown_key = key
         else:
             # If the track is not found, show an error message
             set_text(self.track_txt, f"Track {key} not found")
+            self.shown_key = None
 
-        self.status_lbl.configure(text="View Track button was clicked!")  # Update status message
+    # Called once per idle cycle with the library changes made since the last call
+    def library_changed(self, changes):
+        self.list_view.apply_changes(changes)
+        if self.shown_key is not None and (changes.reset or self.shown_key in changes.changed):
+            self.show_track_details(self.shown_key)
 
     # Callback function for the "List All Tracks" button
     def list_tracks_clicked(self):
-        track_list = lib.list_all()  # Get the full list of tracks from the library
-        set_text(self.list_txt, track_list)  # Display the track list in the scrollable text area
+        self.list_view.refresh()  # Re-read the library and redraw the visible rows
         self.status_lbl.configure(text="List Tracks button was clicked!")  # Update status message
 
-    # Callback function for the "Load More Songs from CSV" button
-    def load_csv_clicked(self):        
-        with open("new_tracks.csv", newline='') as data_file:
-            data = csv.reader(data_file)
-            next(data)  # Skip the header row
-
-            for row in data:                     
-                key = row[0]
-                # Only add the track if it doesn't already exist in the library
-                if lib.get_name(key) is None:
-                    name = row[1]
-                    artist = row[2]
-                    rating = int(row[3])
-                    play_count = int(row[4])
-
-                    # Create a new LibraryItem and add it to the dictionary
-                    new_item = LibraryItem(name, artist, rating)
-                    new_item.play_count = play_count
-                    lib.library[key] = new_item
+    # Show search results in the track list, or the whole library for an empty search
+    def search_results(self, query, keys):
+        if not query:
+            self.list_view.refresh()
+            self.status_lbl.configure(text="")
+            return
+        self.list_view.show_keys(keys)
+        self.status_lbl.configure(text=f"{len(keys)} tracks match \"{query}\"")
+
+    # Called when a sort order is picked from the drop-down
+    def sort_changed(self, choice):
+        sort_by, reverse = SORT_CHOICES[choice]
+        self.list_view.set_sort(sort_by, reverse)
+
+    # Clicking a row in the list fills in its track number and shows it
+    def track_selected(self, key):
+        self.input_txt.delete(0, tk.END)
+        self.input_txt.insert(0, key)
+        self.view_tracks_clicked()
+
+    # Callback function for the "Load More Songs from CSV" button.
+    # Starts a background import, or cancels the one that is already running.
+    def load_csv_clicked(self):
+        if self.import_worker is not None:
+            self.import_worker.cancel()
+            self.status_lbl.configure(text="Cancelling import...")
+            return
+        if self.watcher is not None:
+            self.status_lbl.configure(text=f"Watching {CATALOG_CSV}: new songs are added as they arrive")
+            return
+
+        try:
+            plan = catalog_tail.plan_ingest(CATALOG_CSV)  # Only the rows added since the last import
+        except OSError as e:
+            self.status_lbl.configure(text=f"Import failed: {e}")
+            return
+        if plan.is_empty():
+            self.status_lbl.configure(text=f"No new songs in {CATALOG_CSV}")
+            return
+
+        self.import_result = track_importer.ImportResult()
+        self.import_plan = plan
+        self.import_worker = track_importer.CsvImportWorker(CATALOG_CSV, start=plan.start, stop=plan.end,
+                                                            first_line=plan.first_line)
+        self.import_worker.start()
+        self.load_csv_btn.configure(text="Cancel Import")
+        set_text(self.track_txt, "")  # Row errors are listed here during the import
+        self.shown_key = None
+        self.status_lbl.configure(text=f"Importing {CATALOG_CSV}...")
+        self.window.after(50, self.poll_import)
+
+    # Apply whatever the import worker has produced so far without blocking the event loop
+    def poll_import(self):
+        worker = self.import_worker
+        result = self.import_result
+        for _ in range(20):  # Handle a few batches per tick so the UI stays responsive
+            try:
+                message = worker.messages.get_nowait()
+            except queue.Empty:
+                break
+
+            kind = message[0]
+            if kind == "batch":
+                batch, bytes_read, total_bytes = message[1:]
+                track_importer.apply_batch(batch, result)
+                percent = 100 * bytes_read // total_bytes if total_bytes else 100
+                self.status_lbl.configure(text=f"Importing... {percent}% ({result.added} added)")
+            elif kind == "error":
+                result.rows += 1
+                result.errors.append(message[1])
+                self.track_txt.insert(tk.END, f"{message[1]}\n")
+            elif kind == "done":
+                self.finish_import(message[1])
+                return
+
+        self.window.after(50, self.poll_import)
+
+    # Called once the worker has stopped, whether it finished, failed or was cancelled
+    def finish_import(self, error):
+        result = self.import_result
+        result.cancelled = self.import_worker.cancel_event.is_set()
+        self.import_worker = None
+        self.load_csv_btn.configure(text="Load More Songs from CSV")
 
         self.list_tracks_clicked()  # Refresh the track list after loading new songs
+        if error is not None:
+            self.status_lbl.configure(text=f"Import failed: {error} ({result.added} songs added before it)")
+        else:
+            if not result.cancelled:  # Every row was applied, so the next import starts after them
+                catalog_tail.save_checkpoint(CATALOG_CSV, self.import_plan.checkpoint())
+            self.status_lbl.configure(text=result.summary())
+        self.import_plan = None
+
+    # Callback for the "Watch CSV" tick box: start or stop importing new rows automatically
+    def watch_toggled(self):
+        if self.watch_var.get():
+            if self.import_worker is not None:
+                self.watch_var.set(False)
+                self.status_lbl.configure(text="Wait for the import to finish first")
+                return
+            self.watcher = catalog_tail.CsvWatcher(CATALOG_CSV, on_result=self.watched_import,
+                                                   on_error=self.watched_import)
+            self.watcher.start()
+            self.status_lbl.configure(text=f"Watching {CATALOG_CSV} for new songs")
+            self.window.after(500, self.poll_watcher)
+        elif self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+            self.status_lbl.configure(text="")
+
+    # Runs on the watcher thread, so only hands the outcome over to poll_watcher
+    def watched_import(self, result, plan=None):
+        if isinstance(result, Exception):
+            self.watch_results.put(f"Cannot read {CATALOG_CSV}: {result}")
+        else:
+            self.watch_results.put(result.summary())
+
+    # Show what the watcher imported; the new tracks reach the list through library_changed
+    def poll_watcher(self):
+        if self.watcher is None:
+            return
+        try:
+            while True:
+                self.status_lbl.configure(text=self.watch_results.get_nowait())
+        except queue.Empty:
+            pass
+        self.window.after(500, self.poll_watcher)
 
 # Run the GUI application
 if __name__ == "__main__":